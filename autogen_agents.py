@@ -1,32 +1,166 @@
-import autogen
-from typing import Dict, Any, List
-from liquidity_pool import LiquidityPool
-import pandas as pd
-import inspect
+from typing import Dict, Any, List, Iterator, Set, Tuple, TYPE_CHECKING
+import numpy as np
+from liquidity_pool import LiquidityPool, create_pool
+from journal import TransactionJournal
+from progress import Reporter, create_reporter
+from profiling import create_profiler
+from metrics import MetricsSink
+from checkpoint import save_checkpoint
+from scheduler import Scheduler
+from randomness import RandomStreams
+from sketches import DistributionStats
+from fast_forward import FastForward
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+def load_autogen():
+    """Import pyautogen on demand.
+
+    The simulation engine only needs NumPy; pyautogen is loaded when
+    LLM-driven agents are actually requested.
+    """
+    import autogen
+    return autogen
 
 class BaseAutoAgent:
+    agent_type = None  # Config key of the agent type, set by subclasses
+    sells_pie_share = False  # Whether pie shares are sold into the pool on receipt
+
     def __init__(self, name: str, initial_ddt: float, initial_xdai: float, **kwargs):
         self.name = name
-        self.ddt = initial_ddt
-        self.xdai = initial_xdai
+        self.registry = None  # Set by AgentRegistry.add
+        self.journal = None  # Set by TransactionJournal.register
+        self.agent_id = None
+        self.scheduler = None  # Set by Scheduler.add when scheduler='event'
+        self.schedule_index = None
+        self.exit_queue = None  # Set by DataDAOGroupChat when exit_rule='exhausted'
+        self.stats = None  # Set by AgentRegistry.add when distribution_stats is on
+        self._ddt = initial_ddt
+        self._xdai = initial_xdai
         self.ddt_spent = 0
-        self.transaction_history = []
+    
+    @property
+    def ddt(self) -> float:
+        return self._ddt
+    
+    @ddt.setter
+    def ddt(self, value: float):
+        if self.stats is not None:
+            self.stats.move('ddt', self.agent_type, self._ddt, value)
+        self._ddt = value
+    
+    @property
+    def xdai(self) -> float:
+        return self._xdai
+    
+    @xdai.setter
+    def xdai(self, value: float):
+        # Keep the registry's running per-type sum and sketches in step with the balance
+        if self.registry is not None:
+            self.registry.xdai_sums[self.agent_type] += value - self._xdai
+        if self.stats is not None:
+            self.stats.move('xdai', self.agent_type, self._xdai, value)
+        self._xdai = value
+    
+    def settle_pie_sale(self, amount: float, xdai_received: float):
+        """Book the proceeds of selling a pie share"""
+        if xdai_received > 0:
+            self.xdai += xdai_received
+            self.record_transaction('sell_pie_share', amount, xdai_received)
     
     def record_transaction(self, action: str, ddt: float, xdai: float):
-        self.transaction_history.append({
-            'agent': self.name,
-            'action': action,
-            'ddt': ddt,
-            'xdai': xdai,
-            'ddt_balance': self.ddt,
-            'xdai_balance': self.xdai
-        })
+        if self.journal is not None:
+            self.journal.record(self.agent_id, action, ddt, xdai, self._ddt, self._xdai)
+    
+    # Scheduling hints; they do nothing unless an event scheduler is in use
+    
+    def sleep(self):
+        """Skip this agent's steps until it is woken"""
+        if self.scheduler is not None:
+            self.scheduler.sleep(self.schedule_index)
+    
+    def sleep_until(self, step: int):
+        """Skip this agent's steps until the given step"""
+        if self.scheduler is not None:
+            self.scheduler.sleep_until(self.schedule_index, step)
+    
+    def sleep_until_price(self, price: float):
+        """Skip this agent's steps until the dDT price is at or below price"""
+        if self.scheduler is not None:
+            self.scheduler.sleep_until_price(self.schedule_index, price)
+    
+    def sleep_until_fees(self):
+        """Skip this agent's steps until the pool accrues new fees"""
+        if self.scheduler is not None:
+            self.scheduler.sleep_until_fees(self.schedule_index)
+    
+    def wake(self):
+        if self.scheduler is not None:
+            self.scheduler.wake(self.schedule_index)
+    
+    def exit(self):
+        """Leave the simulation at the end of this step; does nothing unless exits are on"""
+        if self.exit_queue is not None:
+            self.exit_queue.append(self)
+
+class AgentRegistry:
+    """Agents indexed by type, with running xDAI sums per type.
+
+    Membership lists are updated when agents are added and the xDAI sums
+    whenever an agent's balance changes, so per-type statistics cost
+    O(types) instead of a scan over every agent. With stats, the per-type
+    balance sketches are kept current the same way.
+    """
+    def __init__(self, agent_types: List[str], stats: DistributionStats = None):
+        self.members = {agent_type: [] for agent_type in agent_types}
+        self.xdai_sums = {agent_type: 0.0 for agent_type in agent_types}
+        self.stats = stats
+    
+    def add(self, agent: BaseAutoAgent):
+        self.members[agent.agent_type].append(agent)
+        self.xdai_sums[agent.agent_type] += agent.xdai
+        agent.registry = self
+        if self.stats is not None:
+            self.stats.add('ddt', agent.agent_type, agent.ddt)
+            self.stats.add('xdai', agent.agent_type, agent.xdai)
+            agent.stats = self.stats
+    
+    def discard(self, agents: List[BaseAutoAgent]):
+        """Drop agents that left; the running sums of their types are recomputed"""
+        gone = {id(agent) for agent in agents}
+        for agent_type in {agent.agent_type for agent in agents}:
+            members = [agent for agent in self.members[agent_type] if id(agent) not in gone]
+            self.members[agent_type] = members
+            self.xdai_sums[agent_type] = sum(agent.xdai for agent in members)
+        for agent in agents:
+            agent.registry = None
+            if agent.stats is not None:
+                self.stats.add('ddt', agent.agent_type, agent.ddt, -1)
+                self.stats.add('xdai', agent.agent_type, agent.xdai, -1)
+                agent.stats = None
+    
+    def count(self, agent_type: str) -> int:
+        return len(self.members[agent_type])
+    
+    def average_xdai(self, agent_type: str) -> float:
+        count = len(self.members[agent_type])
+        return self.xdai_sums[agent_type] / count if count else 0
 
 class ThePie:
-    """The Pie accumulates all spent dDT from the ecosystem"""
-    def __init__(self):
+    """The Pie accumulates all spent dDT from the ecosystem
+
+    With settlement='sequential' every seller's pie share is its own swap
+    against the pool. settlement='batched' settles each seller group in one
+    closed-form pass (LiquidityPool.sell_ddt_many); the sequential path is
+    the exact reference.
+    """
+    def __init__(self, settlement: str = 'sequential'):
+        if settlement not in ('sequential', 'batched'):
+            raise ValueError(f"Unknown pie settlement mode: {settlement}")
+        self.settlement = settlement
         self.total_ddt = 0
-        self.transactions = []
+        self.journal = None
         self.distribution_ratios = {
             'casual_user': 0.2,   # 20% of 70% distributed
             'active_user': 0.4,   # 40% of 70% distributed
@@ -35,13 +169,11 @@ class ThePie:
         
     def receive_ddt(self, amount: float, from_agent: str):
         self.total_ddt += amount
-        self.transactions.append({
-            'from': from_agent,
-            'amount': amount,
-            'total_after': self.total_ddt
-        })
+        if self.journal is not None:
+            self.journal.record(self.journal.agent_ids[from_agent], 'pie_receive_ddt',
+                                amount, 0, self.total_ddt, 0)
     
-    def distribute_rewards(self, agents):
+    def distribute_rewards(self, registry: AgentRegistry, liquidity_pool: 'LiquidityPool' = None):
         if self.total_ddt == 0:
             return
             
@@ -49,28 +181,24 @@ class ThePie:
         total_distribution = self.total_ddt * 0.7
         self.total_ddt -= total_distribution
         
-        # Group agents by type
-        agent_groups = {
-            'casual_user': [],
-            'active_user': [],
-            'power_user': []
-        }
-        
-        for agent in agents:
-            agent_type = agent.name.split('_')[0]
-            if agent_type in agent_groups:
-                agent_groups[agent_type].append(agent)
-        
         # Distribute to each group according to ratios
         for agent_type, ratio in self.distribution_ratios.items():
-            if agent_groups[agent_type]:
+            group = registry.members[agent_type]
+            if group:
                 group_share = total_distribution * ratio
-                per_agent_share = group_share / len(agent_groups[agent_type])
+                per_agent_share = group_share / len(group)
                 
-                for agent in agent_groups[agent_type]:
-                    agent.receive_pie_share(per_agent_share)
+                if self.settlement == 'batched' and group[0].sells_pie_share:
+                    proceeds = liquidity_pool.sell_ddt_many(per_agent_share, len(group))
+                    for agent, xdai_received in zip(group, proceeds.tolist()):
+                        agent.settle_pie_sale(per_agent_share, xdai_received)
+                else:
+                    for agent in group:
+                        agent.receive_pie_share(per_agent_share)
 
 class DegenAgent(BaseAutoAgent):
+    agent_type = 'degen_user'
+
     def __init__(self, name: str, liquidity_pool: LiquidityPool, the_pie: ThePie, config: Dict[str, Any]):
         super().__init__(name=name,
                         initial_ddt=config['initial_ddt'],
@@ -78,13 +206,15 @@ class DegenAgent(BaseAutoAgent):
         self.liquidity_pool = liquidity_pool
         self.the_pie = the_pie
         self.reinvest_rate = config['reinvest_rate']
+        self.provided_liquidity = False
         
     async def step(self):
         # If this is our first step, provide liquidity and sell remaining dDT
-        if not self.transaction_history:
+        if not self.provided_liquidity:
             # Provide initial liquidity (10 dDT and 10 xDAI)
             if self.ddt >= 10 and self.xdai >= 10:
-                self.liquidity_pool.add_liquidity(10, 10)
+                self.liquidity_pool.add_liquidity(10, 10, self.name)
+                self.provided_liquidity = True
                 self.ddt -= 10
                 self.xdai -= 10
                 self.record_transaction('provide_liquidity', 10, 10)
@@ -102,13 +232,18 @@ class DegenAgent(BaseAutoAgent):
             # Reinvest 50% of fees into liquidity pool
             reinvest_amount = fees * self.reinvest_rate
             if reinvest_amount > 0:
-                self.liquidity_pool.add_liquidity(reinvest_amount, reinvest_amount)
+                self.liquidity_pool.add_liquidity(reinvest_amount, reinvest_amount, self.name)
                 self.record_transaction('reinvest_fees', reinvest_amount, reinvest_amount)
             
             # Keep remaining 50% as xDAI profit
             self.xdai += fees * (1 - self.reinvest_rate)
+        else:
+            # Nothing to do until swaps accrue more fees
+            self.sleep_until_fees()
 
 class OrganizationAgent(BaseAutoAgent):
+    agent_type = 'organization'
+
     def __init__(self, name: str, liquidity_pool: LiquidityPool, the_pie: ThePie, config: Dict[str, Any]):
         super().__init__(name=name,
                         initial_ddt=0,  # Start with no dDT
@@ -119,18 +254,23 @@ class OrganizationAgent(BaseAutoAgent):
     
     async def step(self):
         # Organizations always try to buy their daily amount and spend it immediately
-        current_price = self.liquidity_pool.get_price()
-        xdai_needed = self.daily_ddt_buy * current_price
+        xdai_needed = self.liquidity_pool.quote(self.daily_ddt_buy, 'buy_exact')
         
         if self.xdai >= xdai_needed:
-            ddt_received = self.liquidity_pool.buy_ddt(xdai_needed)
-            if ddt_received > 0:
-                self.xdai -= xdai_needed
-                # Immediately spend the bought dDT
-                self.the_pie.receive_ddt(ddt_received, self.name)
-                self.record_transaction('buy_and_spend_ddt', ddt_received, xdai_needed)
+            xdai_paid = self.liquidity_pool.buy_exact_ddt(self.daily_ddt_buy)
+            self.xdai -= xdai_paid
+            # Immediately spend the bought dDT
+            self.the_pie.receive_ddt(self.daily_ddt_buy, self.name)
+            self.record_transaction('buy_and_spend_ddt', self.daily_ddt_buy, xdai_paid)
+        else:
+            # xDAI never grows and the cost is at least the spot price, so
+            # only a lower price can make the buy affordable
+            self.sleep_until_price(self.xdai / self.daily_ddt_buy)
 
 class PowerUserAgent(BaseAutoAgent):
+    agent_type = 'power_user'
+    max_price = 2.0  # Maximum price willing to pay per dDT
+
     def __init__(self, name: str, liquidity_pool: LiquidityPool, the_pie: ThePie, config: Dict[str, Any]):
         super().__init__(name=name,
                         initial_ddt=config['initial_ddt'],
@@ -138,12 +278,12 @@ class PowerUserAgent(BaseAutoAgent):
         self.liquidity_pool = liquidity_pool
         self.the_pie = the_pie
         self.daily_spend = config['daily_spend']
-        self.max_price = 2.0  # Maximum price willing to pay per dDT
     
     def receive_pie_share(self, amount: float):
         # Power users keep their pie share for service usage
         self.ddt += amount
         self.record_transaction('receive_pie_share', amount, 0)
+        self.wake()
     
     async def step(self):
         # Always try to spend daily_spend amount of dDT
@@ -156,20 +296,29 @@ class PowerUserAgent(BaseAutoAgent):
             # Need to buy dDT from market
             current_price = self.liquidity_pool.get_price()
             if current_price <= self.max_price:
-                xdai_needed = self.daily_spend * current_price
+                # Buy exactly what is spent, so the balance never goes negative
+                xdai_needed = self.liquidity_pool.quote(self.daily_spend, 'buy_exact')
                 if self.xdai >= xdai_needed:
-                    ddt_received = self.liquidity_pool.buy_ddt(xdai_needed)
-                    if ddt_received > 0:
-                        self.xdai -= xdai_needed
-                        self.ddt += ddt_received
-                        self.record_transaction('buy_ddt', ddt_received, xdai_needed)
-                        
-                        # Spend the bought dDT
-                        self.ddt -= self.daily_spend
-                        self.the_pie.receive_ddt(self.daily_spend, self.name)
-                        self.record_transaction('spend_ddt', self.daily_spend, 0)
+                    xdai_paid = self.liquidity_pool.buy_exact_ddt(self.daily_spend)
+                    self.xdai -= xdai_paid
+                    self.ddt += self.daily_spend
+                    self.record_transaction('buy_ddt', self.daily_spend, xdai_paid)
+                    
+                    # Spend the bought dDT
+                    self.ddt -= self.daily_spend
+                    self.the_pie.receive_ddt(self.daily_spend, self.name)
+                    self.record_transaction('spend_ddt', self.daily_spend, 0)
+                else:
+                    # Wait for a pie share or a price it can afford
+                    self.sleep_until_price(self.xdai / self.daily_spend)
+            else:
+                # Wait for a pie share or an acceptable price
+                self.sleep_until_price(self.max_price)
 
 class ActiveUserAgent(BaseAutoAgent):
+    agent_type = 'active_user'
+    sells_pie_share = True
+
     def __init__(self, name: str, liquidity_pool: LiquidityPool, the_pie: ThePie, config: Dict[str, Any]):
         super().__init__(name=name,
                         initial_ddt=config['initial_ddt'],
@@ -180,10 +329,7 @@ class ActiveUserAgent(BaseAutoAgent):
     
     def receive_pie_share(self, amount: float):
         # Active users immediately sell their pie share
-        xdai_received = self.liquidity_pool.sell_ddt(amount)
-        if xdai_received > 0:
-            self.xdai += xdai_received
-            self.record_transaction('sell_pie_share', amount, xdai_received)
+        self.settle_pie_sale(amount, self.liquidity_pool.sell_ddt(amount))
     
     async def step(self):
         # Only spend dDT if we have enough
@@ -191,8 +337,15 @@ class ActiveUserAgent(BaseAutoAgent):
             self.ddt -= self.daily_spend
             self.the_pie.receive_ddt(self.daily_spend, self.name)
             self.record_transaction('spend_ddt', self.daily_spend, 0)
+        if self.ddt < self.daily_spend:
+            # Pie shares are sold on receipt, so dDT never grows again
+            self.sleep()
+            self.exit()
 
 class CasualUserAgent(BaseAutoAgent):
+    agent_type = 'casual_user'
+    sells_pie_share = True
+
     def __init__(self, name: str, liquidity_pool: LiquidityPool, the_pie: ThePie, config: Dict[str, Any]):
         super().__init__(name=name,
                         initial_ddt=config['initial_ddt'],
@@ -200,13 +353,11 @@ class CasualUserAgent(BaseAutoAgent):
         self.liquidity_pool = liquidity_pool
         self.the_pie = the_pie
         self.daily_spend = config['daily_spend']  # 0.1 dDT per day
+        self.sell_threshold = config.get('sell_threshold', 0)  # dDT held before spending that triggers a sale
     
     def receive_pie_share(self, amount: float):
         # Casual users immediately sell their pie share
-        xdai_received = self.liquidity_pool.sell_ddt(amount)
-        if xdai_received > 0:
-            self.xdai += xdai_received
-            self.record_transaction('sell_pie_share', amount, xdai_received)
+        self.settle_pie_sale(amount, self.liquidity_pool.sell_ddt(amount))
     
     async def step(self):
         # First spend daily dDT for compute
@@ -217,24 +368,73 @@ class CasualUserAgent(BaseAutoAgent):
             
             # Immediately sell excess dDT (0.9)
             excess_ddt = self.daily_spend * 9  # 0.9 = 0.1 * 9
-            if self.ddt >= excess_ddt:
+            if self.ddt >= excess_ddt and self.ddt >= self.sell_threshold - self.daily_spend:
                 xdai_received = self.liquidity_pool.sell_ddt(excess_ddt)
                 if xdai_received > 0:
                     self.ddt -= excess_ddt
                     self.xdai += xdai_received
                     self.record_transaction('sell_excess_ddt', excess_ddt, xdai_received)
+        if self.ddt < self.daily_spend:
+            # Pie shares are sold on receipt, so dDT never grows again
+            self.sleep()
+            self.exit()
+
+# Agent config keys drawn per agent, and the SIM_CONFIG key of their spread
+PARAMETER_SPREADS = {
+    'daily_spend': 'spend_spread',
+    'daily_ddt_buy': 'spend_spread',
+    'sell_threshold': 'sell_threshold_spread'
+}
 
 class DataDAOGroupChat:
+    STEP_MODES = ('sequential',)  # SIM_CONFIG['step_mode'] values this engine supports
+    PROFILED_METHODS = {}  # Engine methods timed per agent type by detailed profiling; here agents' step()
+    FAST_FORWARD = False  # Whether SIM_CONFIG['fast_forward'] is supported
+
     def __init__(self, config: Dict[str, Any]):
         self.config = config
-        self.liquidity_pool = LiquidityPool(
-            fee_rate=config['SIM_CONFIG']['fee_rate'],
-            initial_ddt=0,  # Start with empty pool
-            initial_xdai=0
-        )
-        self.the_pie = ThePie()
+        self.liquidity_pool = create_pool(config['SIM_CONFIG'])  # Starts empty
+        self.the_pie = ThePie(settlement=config['SIM_CONFIG'].get('pie_settlement', 'sequential'))
         self.agents = []
         
+        # Step every agent every step, or only the awake ones
+        scheduling = config['SIM_CONFIG'].get('scheduler', 'every_step')
+        if scheduling not in ('every_step', 'event'):
+            raise ValueError(f"Unknown scheduler: {scheduling}")
+        self.scheduler = Scheduler(self.liquidity_pool) if scheduling == 'event' else None
+        
+        # Swap every order as it comes, or clear each step as one batch auction
+        self.step_mode = config['SIM_CONFIG'].get('step_mode', 'sequential')
+        if self.step_mode not in self.STEP_MODES:
+            raise ValueError(f"Step mode {self.step_mode!r} is not supported by {type(self).__name__}")
+        
+        # Seeded streams for stochastic agent parameters and entry waves
+        self.random = RandomStreams(config['SIM_CONFIG'].get('seed', 0))
+        self.entry_arrivals = config['SIM_CONFIG'].get('entry_arrivals', 'fixed')
+        if self.entry_arrivals not in ('fixed', 'poisson'):
+            raise ValueError(f"Unknown entry arrivals: {self.entry_arrivals}")
+        
+        # Agents that can no longer act leave, and others churn at random
+        self.exit_rule = config['SIM_CONFIG'].get('exit_rule', 'never')
+        if self.exit_rule not in ('never', 'exhausted'):
+            raise ValueError(f"Unknown exit rule: {self.exit_rule}")
+        self.churn_rate = config['SIM_CONFIG'].get('churn_rate', 0.0)
+        if not 0 <= self.churn_rate <= 1:
+            raise ValueError(f"churn_rate must be between 0 and 1, got {self.churn_rate}")
+        self.exiting = []  # Agents that called exit() this step
+        
+        # Optionally jump over quasi-steady stretches instead of stepping them
+        self.fast_forward = None
+        if config['SIM_CONFIG'].get('fast_forward', False):
+            if not self.FAST_FORWARD:
+                raise ValueError(f"fast_forward is not supported by {type(self).__name__}")
+            if self.exit_rule != 'never' or self.churn_rate:
+                raise ValueError("fast_forward needs a population that only grows; set exit_rule='never', churn_rate=0")
+            for spread_key in sorted(set(PARAMETER_SPREADS.values())):
+                if config['SIM_CONFIG'].get(spread_key, 0):
+                    raise ValueError(f"fast_forward moves agents by entry wave; {spread_key} must be 0")
+            self.fast_forward = FastForward(config['SIM_CONFIG'])
+        
         # Entry configuration
         self.entry_steps = config['SIM_CONFIG']['entry_steps']
         self.agents_per_entry = config['SIM_CONFIG']['agents_per_entry']
@@ -248,6 +448,31 @@ class DataDAOGroupChat:
             'active_user': 0,
             'casual_user': 0
         }
+        self.exited = dict.fromkeys(self.total_agents, 0)  # Agents that left, by type
+        
+        # Optional timing of step phases, agent types and pool trades
+        self.profiler = create_profiler(config['SIM_CONFIG'], list(self.total_agents))
+        self.profiler.instrument(self)
+        if self.scheduler is not None and self.profiler.times_agents:
+            self.scheduler.profiler = self.profiler
+        
+        # Optional per-type balance distributions, kept current as balances change
+        self.stats = None
+        if config['SIM_CONFIG'].get('distribution_stats', False):
+            accuracy = config['SIM_CONFIG'].get('sketch_accuracy', 0.01)
+            self.stats = DistributionStats(list(self.total_agents), accuracy)
+        self.registry = AgentRegistry(list(self.total_agents), self.stats)
+        
+        # Central transaction journal for agents and ThePie
+        self.journal = TransactionJournal(
+            retention=config['SIM_CONFIG'].get('journal_retention', 'full'),
+            capacity=config['SIM_CONFIG'].get('journal_capacity', 1_000_000)
+        )
+        self.the_pie.journal = self.journal
+        self.reporter = create_reporter(config['SIM_CONFIG'])
+        self.current_step = 0
+        self.checkpoint_every = config['SIM_CONFIG'].get('checkpoint_every', 0)
+        self.checkpoint_path = config['SIM_CONFIG'].get('checkpoint_path', 'checkpoints/step_{step}.ckpt')
         
         # Add initial agents based on config
         for agent_type, config in config['AGENT_CONFIGS'].items():
@@ -255,11 +480,36 @@ class DataDAOGroupChat:
                 self._add_agents(agent_type, config['count'])
         
         # Store simulation data
-        self.price_history = []
-        self.lp_ddt_reserve_history = []
-        self.lp_xdai_reserve_history = []
-        self.xdai_balances_history = {agent_type: [] for agent_type in self.total_agents.keys()}
-        self.agents_history = {agent_type: [] for agent_type in self.total_agents.keys()}
+        sim_config = self.config['SIM_CONFIG']
+        columns = {'price': 'f8', 'lp_dDT_reserve': 'f8', 'lp_xDAI_reserve': 'f8'}
+        for agent_type in self.total_agents.keys():
+            columns[f'active_{agent_type}s'] = 'i8'
+            columns[f'xdai_{agent_type}'] = 'f8'
+        if self.stats is not None:
+            columns.update(dict.fromkeys(self.stats.columns(), 'f8'))
+        self.metrics = MetricsSink(
+            columns,
+            path=sim_config.get('metrics_path'),
+            format=sim_config.get('metrics_format', 'csv'),
+            chunk_size=sim_config.get('metrics_chunk_size', 10000)
+        )
+        
+        # Final balances of every agent that left, per member for cohorts
+        self.exits = MetricsSink(
+            {'step': 'i8', 'agent': 'i8', 'members': 'i8', 'ddt': 'f8', 'xdai': 'f8'},
+            chunk_size=sim_config.get('metrics_chunk_size', 10000)
+        )
+        
+        # Optional per-agent balances every agent_metrics_every steps
+        self.agent_metrics_every = sim_config.get('agent_metrics_every', 0)
+        self.agent_metrics = None
+        if self.agent_metrics_every:
+            self.agent_metrics = MetricsSink(
+                {'step': 'i8', 'agent': 'i8', 'ddt': 'f8', 'xdai': 'f8'},
+                path=sim_config.get('agent_metrics_path'),
+                format=sim_config.get('metrics_format', 'csv'),
+                chunk_size=sim_config.get('metrics_chunk_size', 10000)
+            )
 
     def _add_agents(self, agent_type: str, count: int):
         """Add specified number of agents of given type"""
@@ -275,183 +525,297 @@ class DataDAOGroupChat:
             'casual_user': CasualUserAgent
         }
         
+        parameters = self._draw_parameters(agent_type, count)
         for i in range(count):
             agent_class = agent_classes[agent_type]
             agent = agent_class(
                 f"{agent_type}_{self.total_agents[agent_type]}",
                 self.liquidity_pool,
                 self.the_pie,
-                config
+                {**config, **{key: float(values[i]) for key, values in parameters.items()}}
             )
             self.agents.append(agent)
+            self.registry.add(agent)
+            self.journal.register(agent)
+            if self.scheduler is not None:
+                self.scheduler.add(agent)
+            if self.exit_rule == 'exhausted':
+                agent.exit_queue = self.exiting
             self.total_agents[agent_type] += 1
 
-    async def simulate(self, steps: int):
-        """Run the simulation for specified number of steps"""
-        for step in range(steps):
-            print(f"Step {step + 1}/{steps}")
+    async def simulate(self, steps: int, reporter: Reporter = None):
+        """Run the simulation for specified number of steps
+        
+        Continues from current_step, so a simulation restored from a
+        checkpoint picks up exactly where the snapshot was taken.
+        """
+        reporter = reporter or self.reporter
+        profiler = self.profiler
+        end = self.current_step + steps
+        reporter.start(self, end)
+        profiler.start(self)
+        step = self.current_step
+        while step < end:
+            if self.fast_forward is not None and self.fast_forward.ready(self, end):
+                # Jump over a quasi-steady stretch, reported as its last step. What is
+                # reported and profiled from here on waits for the jump's check.
+                reporter.hold()
+                profiler.hold()
+                profiler.begin_step()
+                with profiler.phase('fast_forward'):
+                    averages = self.fast_forward.jump(self, end)
+                reporter.step(self, self.current_step - 1, end, averages)
+                profiler.end_step(step)
+                step = self.current_step
+                continue
+            
+            self.journal.step = step
+            profiler.begin_step()
             
             # Add new agents every entry_steps
             if step % self.entry_steps == 0:
-                # Calculate new total after adding agents_per_entry
-                current_total = sum(self.total_agents.values())
-                new_total = current_total + self.agents_per_entry
-                
-                # Calculate target numbers for each type
-                targets = {
-                    agent_type: round(new_total * prop)
-                    for agent_type, prop in self.proportions.items()
-                }
-                
-                # Add agents to reach targets
-                for agent_type, target in targets.items():
-                    to_add = max(0, target - self.total_agents[agent_type])
-                    if to_add > 0:
-                        self._add_agents(agent_type, to_add)
+                with profiler.phase('entry'):
+                    self._enter_agents()
             
             # Execute step for each agent
-            for agent in self.agents:
-                await agent.step()
+            with profiler.phase('agents'):
+                await self._step_agents()
             
             # Distribute pie rewards every step
-            self.the_pie.distribute_rewards(self.agents)
+            with profiler.phase('pie'):
+                self._distribute_rewards()
             
-            # Store simulation data
-            self.price_history.append(self.liquidity_pool.get_price())
-            self.lp_ddt_reserve_history.append(self.liquidity_pool.ddt_reserve)
-            self.lp_xdai_reserve_history.append(self.liquidity_pool.xdai_reserve)
+            # Remove agents leaving this step, keeping their final balances
+            with profiler.phase('exits'):
+                self._retire_agents()
             
-            # Store average xDAI balances for each agent type
-            for agent_type in self.total_agents.keys():
-                agents_of_type = [agent for agent in self.agents if agent.name.startswith(agent_type)]
-                if agents_of_type:
-                    avg_xdai = sum(agent.xdai for agent in agents_of_type) / len(agents_of_type)
-                    self.xdai_balances_history[agent_type].append(avg_xdai)
-                else:
-                    self.xdai_balances_history[agent_type].append(0)
-            
-            for agent_type in self.total_agents:
-                self.agents_history[agent_type].append(self.total_agents[agent_type])
-            
-            # Print status every 10 steps
-            if (step + 1) % 10 == 0:
-                total = sum(self.total_agents.values())
-                print(f"\nStep {step + 1} Summary:")
-                print(f"Current token price: ${self.liquidity_pool.get_price():.2f}")
-                
-                print("\nAgent Distribution:")
-                for agent_type, count in self.total_agents.items():
-                    percentage = (count / total * 100) if total > 0 else 0
-                    target_percentage = self.proportions[agent_type] * 100
-                    diff = percentage - target_percentage
-                    print(f"Active {agent_type}s: {count} ({percentage:.1f}% vs target {target_percentage:.1f}%, diff: {diff:+.1f}%)")
-                
-                # Print average xDAI holdings for each agent type
-                print("\nAverage xDAI Holdings per Agent:")
-                for agent_type in self.total_agents.keys():
-                    agents_of_type = [agent for agent in self.agents if agent.name.startswith(agent_type)]
-                    if agents_of_type:
-                        avg_xdai = sum(agent.xdai for agent in agents_of_type) / len(agents_of_type)
-                        print(f"{agent_type}: {avg_xdai:.2f} xDAI")
-                    else:
-                        print(f"{agent_type}: 0.00 xDAI")
-                print("")
-
-    def get_simulation_data(self) -> pd.DataFrame:
-        data = {
-            'price': self.price_history,
-            'lp_dDT_reserve': self.lp_ddt_reserve_history,
-            'lp_xDAI_reserve': self.lp_xdai_reserve_history,
-        }
-        # Add agent counts
-        for agent_type in self.total_agents.keys():
-            data[f'active_{agent_type}s'] = self.agents_history[agent_type]
-            data[f'xdai_{agent_type}'] = self.xdai_balances_history[agent_type]
-        
-        return pd.DataFrame(data)
-
-class LiquidityPool:
-    def __init__(self, fee_rate: float, initial_ddt: float = 0, initial_xdai: float = 0):
-        self.ddt_reserve = initial_ddt
-        self.xdai_reserve = initial_xdai
-        self.fee_rate = fee_rate
-        self.total_fees = 0
-        self.lp_shares = {}  # Track LP shares by provider
-        self.fees_collected = {}  # Track collected fees by provider
-        
-    def get_price(self) -> float:
-        if self.ddt_reserve == 0:
-            return 1.0  # Default price when pool is empty
-        return self.xdai_reserve / self.ddt_reserve
-        
-    def add_liquidity(self, ddt_amount: float, xdai_amount: float) -> float:
-        """Add liquidity to the pool and return LP shares"""
-        if self.ddt_reserve == 0:  # First liquidity provider
-            shares = ddt_amount
-        else:
-            shares = ddt_amount * (self.get_total_shares() / self.ddt_reserve)
+            # Store simulation data
+            with profiler.phase('metrics'):
+                averages = self._average_xdai_by_type()
+                self._record_step(step, averages)
             
-        self.ddt_reserve += ddt_amount
-        self.xdai_reserve += xdai_amount
-        
-        provider = inspect.stack()[1].frame.f_locals.get('self').name
-        self.lp_shares[provider] = self.lp_shares.get(provider, 0) + shares
-        self.fees_collected[provider] = 0
-        
-        return shares
-        
-    def get_total_shares(self) -> float:
-        return sum(self.lp_shares.values())
-        
-    def collect_fees(self, provider: str) -> float:
-        """Collect accumulated fees for a liquidity provider"""
-        if provider not in self.lp_shares:
-            return 0
+            # Report progress, reusing this step's statistics
+            with profiler.phase('report'):
+                reporter.step(self, step, end, averages)
+            self.current_step = step + 1
             
-        provider_share = self.lp_shares[provider] / self.get_total_shares()
-        fees = self.total_fees * provider_share
-        self.fees_collected[provider] = self.fees_collected.get(provider, 0) + fees
-        self.total_fees = 0
-        return fees
-        
-    def buy_ddt(self, xdai_amount: float) -> float:
-        """Buy dDT with xDAI using constant product formula"""
-        if self.ddt_reserve == 0 or xdai_amount == 0:
-            return 0
+            checked = None
+            if self.fast_forward is not None:
+                with profiler.phase('fast_forward'):
+                    checked = self.fast_forward.observe(self, averages)
             
-        # Calculate dDT received after fees
-        fee = xdai_amount * self.fee_rate
-        xdai_with_fee = xdai_amount - fee
+            # After a failed check current_step is back where a checkpoint was already due
+            if checked is not False and self.checkpoint_every and self.current_step % self.checkpoint_every == 0:
+                with profiler.phase('checkpoint'):
+                    save_checkpoint(self, self.checkpoint_path.format(step=self.current_step))
+            profiler.end_step(step)
+            if checked is not None:
+                reporter.release(checked)
+                profiler.release(checked)
+            # A failed fast-forward check rewinds current_step to before its jump
+            step = self.current_step
         
-        # Update reserves
-        k = self.ddt_reserve * self.xdai_reserve
-        new_xdai_reserve = self.xdai_reserve + xdai_with_fee
-        new_ddt_reserve = k / new_xdai_reserve
-        ddt_out = self.ddt_reserve - new_ddt_reserve
+        # A jump still awaiting its check keeps what was reported
+        reporter.release(True)
+        profiler.release(True)
+        self.metrics.flush()
+        if self.agent_metrics is not None:
+            self.agent_metrics.flush()
+        profiler.finish(self)
+        reporter.finish(self)
+
+    def __getstate__(self):
+        # Reporters may hold open streams; rebuild them from config on restore
+        state = self.__dict__.copy()
+        del state['reporter']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.reporter = create_reporter(self.config['SIM_CONFIG'])
+
+    def _draw_parameters(self, agent_type: str, count: int) -> Dict[str, Any]:
+        """Per-agent parameter arrays for count new agents of agent_type
         
-        self.ddt_reserve = new_ddt_reserve
-        self.xdai_reserve = new_xdai_reserve
-        self.total_fees += fee
+        Each parameter in PARAMETER_SPREADS is scaled by mean-1 lognormal
+        factors, drawn in one batch per entry wave. Empty when no spread is
+        set, so every agent uses its type's config as is.
+        """
+        config = self.config['AGENT_CONFIGS'][agent_type]
+        wave = (list(self.total_agents).index(agent_type), self.total_agents[agent_type])
+        parameters = {}
+        for k, (key, spread_key) in enumerate(PARAMETER_SPREADS.items()):
+            sigma = self.config['SIM_CONFIG'].get(spread_key, 0)
+            if sigma and key in config:
+                parameters[key] = config[key] * self.random.spread(sigma, count, *wave, k)
+        return parameters
+
+    def _enter_agents(self):
+        """Add agents so each type tracks its target proportion"""
+        # Calculate new total after adding this wave's arrivals
+        arrivals = self.agents_per_entry
+        if self.entry_arrivals == 'poisson':
+            arrivals = int(self.random.generator('arrivals', self.current_step).poisson(arrivals))
+        current_total = sum(self.total_agents.values())
+        new_total = current_total + arrivals
         
-        return ddt_out
+        # Calculate target numbers for each type
+        targets = {
+            agent_type: round(new_total * prop)
+            for agent_type, prop in self.proportions.items()
+        }
         
-    def sell_ddt(self, ddt_amount: float) -> float:
-        """Sell dDT for xDAI using constant product formula"""
-        if self.xdai_reserve == 0 or ddt_amount == 0:
-            return 0
-            
-        # Calculate xDAI received after fees
-        k = self.ddt_reserve * self.xdai_reserve
-        new_ddt_reserve = self.ddt_reserve + ddt_amount
-        new_xdai_reserve = k / new_ddt_reserve
-        xdai_out = self.xdai_reserve - new_xdai_reserve
+        # Add agents to reach targets
+        for agent_type, target in targets.items():
+            to_add = max(0, target - self.total_agents[agent_type])
+            if to_add > 0:
+                self._add_agents(agent_type, to_add)
+
+    async def _step_agents(self):
+        """Step every agent in the order it joined"""
+        if self.scheduler is not None:
+            await self.scheduler.run(self.agents)
+            return
+        if self.profiler.times_agents:
+            await self.profiler.step_agents(self.agents)
+            return
+        for agent in self.agents:
+            await agent.step()
+
+    def _distribute_rewards(self):
+        self.the_pie.distribute_rewards(self.registry, self.liquidity_pool)
+        if self.scheduler is not None:
+            self.scheduler.check_pool()
+
+    def _retire_agents(self):
+        """Record and remove the agents that exited or churned this step
         
-        # Apply fee
-        fee = xdai_out * self.fee_rate
-        xdai_out -= fee
+        Churn draws one number per live agent in join order from the 'churn'
+        stream; degens never churn, as their liquidity stays in the pool.
+        Leaving agents' final balances go to the exits sink, and the agent
+        list, registry and scheduler are compacted so later steps only pay
+        for the live population.
+        """
+        gone = {id(agent) for agent in self.exiting}
+        self.exiting.clear()
+        if self.churn_rate:
+            draws = self.random.generator('churn', self.current_step).random(len(self.agents))
+            gone.update(id(agent) for agent, draw in zip(self.agents, draws.tolist())
+                        if draw < self.churn_rate and agent.agent_type != 'degen_user')
+        if gone:
+            self._remove_agents(gone)
+
+    def _remove_agents(self, gone: Set[int]) -> List[BaseAutoAgent]:
+        """Record and remove the agents whose id() is in gone; returns them in join order"""
+        kept, leaving = [], []
+        for index, agent in enumerate(self.agents):
+            if id(agent) in gone:
+                leaving.append(agent)
+            else:
+                kept.append(index)
+        self.exits.record_many({
+            'step': self.current_step,
+            'agent': [agent.agent_id for agent in leaving],
+            'members': 1,
+            'ddt': [agent.ddt for agent in leaving],
+            'xdai': [agent.xdai for agent in leaving]
+        })
+        for agent in leaving:
+            self.exited[agent.agent_type] += 1
+            agent.scheduler = agent.exit_queue = None
+        self.registry.discard(leaving)
+        self.agents = [self.agents[index] for index in kept]
+        if self.scheduler is not None:
+            self.scheduler.compact(kept, self.agents)
+        return leaving
+
+    def _migration_draws(self, agent_type: str) -> np.random.Generator:
+        return self.random.generator('migration', self.current_step, list(self.total_agents).index(agent_type))
+
+    def emigrate(self, agent_type: str, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Remove up to count randomly chosen agents of agent_type moving to another DAO
         
-        self.ddt_reserve = new_ddt_reserve
-        self.xdai_reserve = new_xdai_reserve
-        self.total_fees += fee
+        They are recorded as exits. Returns the dDT and xDAI balances they
+        take with them, one entry per agent.
+        """
+        members = self.registry.members[agent_type]
+        count = min(count, len(members))
+        if count == 0:
+            return np.zeros(0), np.zeros(0)
+        picks = self._migration_draws(agent_type).choice(len(members), count, replace=False)
+        leaving = self._remove_agents({id(members[i]) for i in picks.tolist()})
+        return np.array([agent.ddt for agent in leaving]), np.array([agent.xdai for agent in leaving])
+
+    def immigrate(self, agent_type: str, ddt: np.ndarray, xdai: np.ndarray):
+        """Add agents arriving from another DAO with the given balances"""
+        count = len(ddt)
+        self._add_agents(agent_type, count)
+        new_agents = self.agents[len(self.agents) - count:]
+        for agent, agent_ddt, agent_xdai in zip(new_agents, ddt.tolist(), xdai.tolist()):
+            agent.ddt = agent_ddt
+            agent.xdai = agent_xdai
+
+    def active_agents(self) -> Dict[str, int]:
+        """Agents of each type still in the simulation"""
+        return {agent_type: self.total_agents[agent_type] - self.exited[agent_type]
+                for agent_type in self.total_agents}
+
+    def _average_xdai_by_type(self) -> Dict[str, float]:
+        """Average xDAI holdings per agent for each agent type"""
+        return {
+            agent_type: self.registry.average_xdai(agent_type)
+            for agent_type in self.total_agents.keys()
+        }
+
+    def _record_step(self, step: int, averages: Dict[str, float]):
+        self.metrics.record(*self._metrics_row(averages))
         
-        return xdai_out
+        if self.agent_metrics is not None and (step + 1) % self.agent_metrics_every == 0:
+            self._record_agent_metrics(step)
+
+    def _metrics_row(self, averages: Dict[str, float]) -> List[float]:
+        """This step's simulation data row, in metrics column order"""
+        row = [self.liquidity_pool.get_price(), self.liquidity_pool.ddt_reserve, self.liquidity_pool.xdai_reserve]
+        active = self.active_agents()
+        for agent_type in self.total_agents.keys():
+            row.append(active[agent_type])
+            row.append(averages[agent_type])
+        if self.stats is not None:
+            self._refresh_stats()
+            row.extend(self.stats.row())
+        return row
+
+    def _refresh_stats(self):
+        """Bring the balance sketches up to date; agents' setters already do"""
+
+    def _record_agent_metrics(self, step: int):
+        self.agent_metrics.record_many({
+            'step': step,
+            'agent': [agent.agent_id for agent in self.agents],
+            'ddt': [agent.ddt for agent in self.agents],
+            'xdai': [agent.xdai for agent in self.agents]
+        })
+
+    def get_simulation_data(self, every: int = 1) -> 'pd.DataFrame':
+        """Per-step metrics, or every n-th step for a downsampled view"""
+        return self.metrics.read(every)
+
+    def iter_simulation_data(self, every: int = 1) -> Iterator['pd.DataFrame']:
+        """Lazily read the per-step metrics back one chunk at a time"""
+        return self.metrics.iter_chunks(every)
+
+    def get_exit_data(self) -> 'pd.DataFrame':
+        """Step, journal id, members and final balances of every agent that left"""
+        return self.exits.read()
+
+    def get_fast_forward_data(self) -> 'pd.DataFrame':
+        """First step, length and checked relative error of every fast-forward jump"""
+        if self.fast_forward is None:
+            raise ValueError("Fast-forward is off; set SIM_CONFIG['fast_forward']")
+        return self.fast_forward.get_jump_data()
+
+    def get_agent_data(self, every: int = 1) -> 'pd.DataFrame':
+        """Per-agent balances recorded every agent_metrics_every steps"""
+        if self.agent_metrics is None:
+            raise ValueError("Per-agent metrics are off; set SIM_CONFIG['agent_metrics_every']")
+        return self.agent_metrics.read(every)
@@ -0,0 +1,51 @@
+from typing import List, Tuple
+import numpy as np
+
+# (action, agent ids, dDT amount per id)
+Order = Tuple[str, np.ndarray, np.ndarray]
+
+
+class BatchAuction:
+    """One step's buy and sell orders, cleared with a single pool swap.
+
+    Every order is for an exact amount of dDT. Buys and sells are netted
+    against each other and only the imbalance is swapped against the
+    pool, once. The average price of that swap is the uniform clearing
+    price of every order, so matched volume pays no pool fee and no
+    order can be front-run within the step.
+    """
+    def __init__(self):
+        self.buys: List[Order] = []
+        self.sells: List[Order] = []
+
+    def buy(self, action: str, ids: np.ndarray, ddt_amounts: np.ndarray):
+        """Queue orders buying exactly ddt_amounts dDT"""
+        if len(ids):
+            self.buys.append((action, ids, np.broadcast_to(ddt_amounts, len(ids))))
+
+    def sell(self, action: str, ids: np.ndarray, ddt_amounts: np.ndarray):
+        """Queue orders selling ddt_amounts dDT"""
+        if len(ids):
+            self.sells.append((action, ids, np.broadcast_to(ddt_amounts, len(ids))))
+
+    @staticmethod
+    def volume(orders: List[Order]) -> float:
+        return float(sum(amounts.sum() for _, _, amounts in orders))
+
+    def clear(self, liquidity_pool) -> Tuple[float, List[Order], List[Order]]:
+        """Swap the net imbalance and return (price, buys, sells).
+
+        The price is in xDAI per dDT: buyers pay price * amount and sellers
+        receive it. A price of 0 means the pool could not take the
+        imbalance and nothing filled. The order book is emptied.
+        """
+        buys, sells = self.buys, self.sells
+        self.buys, self.sells = [], []
+        net = self.volume(sells) - self.volume(buys)
+        if net > 0:
+            price = liquidity_pool.sell_ddt(net) / net
+        elif net < 0:
+            price = liquidity_pool.buy_exact_ddt(-net) / -net
+        else:
+            price = liquidity_pool.get_price()
+        return price, buys, sells
@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import copy
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+from autogen_agents import DataDAOGroupChat
+from liquidity_pool import LiquidityPool, create_pool
+from config import CONFIG
+from engines import create_simulation
+
+BASELINE_PATH = 'benchmarks_baseline.json'
+IMPORT_BUDGET = 0.5  # Seconds allowed for importing the engine in a fresh process
+HEAVY_MODULES = ('pandas', 'matplotlib', 'autogen', 'numba')
+
+
+def quiet_config(**sim_overrides) -> Dict:
+    config = copy.deepcopy(CONFIG)
+    config['SIM_CONFIG'].update(reporter='silent', journal_retention='aggregates', **sim_overrides)
+    return config
+
+
+def populated(population: int, **sim_overrides) -> DataDAOGroupChat:
+    """A simulation grown to at least `population` agents without stepping"""
+    sim = create_simulation(quiet_config(**sim_overrides))
+    while sum(sim.total_agents.values()) < population:
+        sim._enter_agents()
+    return sim
+
+
+# Each bench_* returns a setup function, which builds the scenario's state
+# untimed and returns the callable that is timed.
+
+def bench_pool_swaps(swaps: int = 100_000, amm: str = 'constant_product') -> Callable[[], Callable[[], None]]:
+    def setup():
+        pool = create_pool({'fee_rate': 0.003, 'amm': amm})
+        for i in range(100):
+            pool.add_liquidity(10, 10, f"lp_{i}")
+
+        def run():
+            for _ in range(swaps // 2):
+                pool.buy_ddt(0.5)
+                pool.sell_ddt(0.5)
+        return run
+    return setup
+
+
+def bench_pool_add_liquidity(adds: int = 100_000, providers: int = 1000) -> Callable[[], Callable[[], None]]:
+    def setup():
+        pool = LiquidityPool(fee_rate=0.003)
+        names = [f"lp_{i}" for i in range(providers)]
+
+        def run():
+            for i in range(adds):
+                pool.add_liquidity(1, 1, names[i % providers])
+                if i % 10 == 0:
+                    pool.collect_fees(names[i % providers])
+        return run
+    return setup
+
+
+def bench_pie_distribution(population: int, settlement: str, rounds: int = 5) -> Callable[[], Callable[[], None]]:
+    def setup():
+        sim = populated(population, pie_settlement=settlement)
+        sim.liquidity_pool.add_liquidity(10_000, 10_000, 'bench_lp')
+
+        def run():
+            for _ in range(rounds):
+                sim.the_pie.total_ddt = 100
+                sim._distribute_rewards()
+        return run
+    return setup
+
+
+def bench_step_latency(population: int, engine: str, steps: int = 5, **sim_overrides) -> Callable[[], Callable[[], None]]:
+    def setup():
+        sim = populated(population, engine=engine, **sim_overrides)
+        # First step has every degen providing liquidity; time the steady state
+        asyncio.run(sim.simulate(1))
+        return lambda: asyncio.run(sim.simulate(steps))
+    return setup
+
+
+def bench_end_to_end(steps: int, **sim_overrides) -> Callable[[], Callable[[], None]]:
+    def setup():
+        sim = create_simulation(quiet_config(**sim_overrides))
+
+        def run():
+            asyncio.run(sim.simulate(steps))
+            sim.get_simulation_data()
+        return run
+    return setup
+
+
+def bench_step_statistics(populations: List[int], repeats: int = 200) -> Dict[int, float]:
+    """Time the per-step statistics and pie grouping against population size.
+
+    Returns microseconds per step for each population.
+    """
+    results = {}
+    for population in populations:
+        sim = populated(population)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            sim._average_xdai_by_type()
+            [sim.registry.members[agent_type] for agent_type in sim.the_pie.distribution_ratios]
+        results[population] = (time.perf_counter() - start) / repeats * 1e6
+    return results
+
+
+def bench_import_time() -> Dict[str, Any]:
+    """Time importing the simulation engine in a fresh interpreter.
+
+    Also reports which heavy optional dependencies the import pulled in;
+    the engine itself should only need NumPy.
+    """
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import engines\n"
+        "print(time.perf_counter() - start)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.splitlines()
+    return {'seconds': float(output[0]), 'heavy_modules': [m for m in output[1].split(',') if m]}
+
+
+def scenarios(long: bool = False) -> Dict[str, Callable[[], Callable[[], None]]]:
+    """Benchmark scenarios by name; long adds the 10k and 100k step runs"""
+    suite = {
+        'pool_swaps_100k': bench_pool_swaps(),
+        'pool_swaps_100k_stableswap': bench_pool_swaps(amm='stableswap'),
+        'pool_swaps_100k_concentrated': bench_pool_swaps(amm='concentrated'),
+        'pool_add_liquidity_100k': bench_pool_add_liquidity(),
+    }
+    for population in (1_000, 10_000):
+        for settlement in ('sequential', 'batched'):
+            suite[f'pie_distribute_{population}_{settlement}'] = bench_pie_distribution(population, settlement)
+        for engine in ('object', 'vectorized', 'cohort', 'compiled'):
+            suite[f'step_latency_{population}_{engine}'] = bench_step_latency(population, engine)
+    suite['step_latency_10000_object_event'] = bench_step_latency(10_000, 'object', scheduler='event')
+    suite['step_latency_10000_vectorized_batch_auction'] = bench_step_latency(10_000, 'vectorized',
+                                                                              step_mode='batch_auction')
+    suite['end_to_end_1k'] = bench_end_to_end(1_000)
+    suite['end_to_end_2k_compiled'] = bench_end_to_end(2_000, engine='compiled')
+    suite['end_to_end_1k_event'] = bench_end_to_end(1_000, scheduler='event')
+    if long:
+        suite['end_to_end_10k'] = bench_end_to_end(10_000, engine='vectorized', pie_settlement='batched')
+        suite['end_to_end_100k'] = bench_end_to_end(100_000, engine='vectorized', pie_settlement='batched')
+    return suite
+
+
+def measure(setup: Callable[[], Callable[[], None]], repeats: int) -> Dict[str, float]:
+    """Best wall time over repeats, then peak traced memory from one more run"""
+    best = float('inf')
+    for _ in range(repeats):
+        run = setup()
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+
+    run = setup()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': best, 'peak_mib': peak / 2**20}
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[str]:
+    """Names of scenarios more than threshold percent slower than baseline"""
+    regressions = []
+    for name, result in results.items():
+        if name in baseline:
+            slowdown = (result['seconds'] / baseline[name]['seconds'] - 1) * 100
+            if slowdown > threshold:
+                regressions.append(name)
+    return regressions
+
+
+def speedups(results: Dict[str, Dict[str, float]]) -> Dict[str, float]:
+    """Each engine's step latency speedup over the object engine at the same population"""
+    ratios = {}
+    for name, result in results.items():
+        population, _, engine = name[len('step_latency_'):].partition('_')
+        reference = results.get(f'step_latency_{population}_object')
+        if name.startswith('step_latency_') and engine != 'object' and reference:
+            ratios[name] = reference['seconds'] / result['seconds']
+    return ratios
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulation hot paths")
+    parser.add_argument('--only', nargs='+', help="Run only these scenarios")
+    parser.add_argument('--long', action='store_true', help="Include the 10k and 100k step end-to-end runs")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help="Write the results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help="Flag scenarios more than this percent slower than baseline")
+    parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET,
+                        help="Seconds allowed for importing the engine")
+    args = parser.parse_args()
+
+    startup = bench_import_time()
+    print(f"{'import engines':<36} {startup['seconds']:9.4f} s (budget {args.import_budget:.2f} s)")
+    if startup['heavy_modules']:
+        print(f"  pulled in heavy dependencies: {', '.join(startup['heavy_modules'])}")
+    startup_ok = startup['seconds'] <= args.import_budget and not startup['heavy_modules']
+
+    suite = scenarios(args.long)
+    if args.only:
+        suite = {name: suite[name] for name in args.only}
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    for name, setup in suite.items():
+        results[name] = measure(setup, args.repeats)
+        line = f"{name:<36} {results[name]['seconds']:9.4f} s {results[name]['peak_mib']:9.1f} MiB"
+        if name in baseline:
+            line += f" {(results[name]['seconds'] / baseline[name]['seconds'] - 1) * 100:+7.1f}% vs baseline"
+        print(line)
+
+    ratios = speedups(results)
+    if ratios:
+        print("\nStep latency speedup over the object engine:")
+        for name, ratio in ratios.items():
+            print(f"{name:<36} {ratio:9.2f}x")
+
+    print("\nPer-step statistics and pie grouping:")
+    for population, micros in bench_step_statistics([100, 1000, 10000, 100000]).items():
+        print(f"{population:>8} agents: {micros:8.2f} us/step")
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'results': {**baseline, **results}
+            }, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+
+    regressions = compare(results, baseline, args.threshold)
+    if not startup_ok:
+        regressions.append('import engines')
+    if regressions:
+        print(f"\nRegressions (> {args.threshold:.0f}% slower): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+from typing import Dict, Any, List
+import numpy as np
+from autogen_agents import PowerUserAgent, PARAMETER_SPREADS
+from vectorized_engine import (VectorizedDataDAOGroupChat, compare_engines, AGENT_TYPES, TYPE_CODES,
+                               DEGEN, ORGANIZATION, POWER)
+
+# Largest relative difference from the object engine accepted by the parity check
+TOLERANCE = 1e-3
+
+
+class CohortDataDAOGroupChat(VectorizedDataDAOGroupChat):
+    """Population-scale version of DataDAOGroupChat.
+
+    Agents of one type that join in the same entry wave behave identically,
+    so each wave of a type is stored as one cohort: a member count plus
+    per-member dDT and xDAI balances. Memory and per-step cost scale with
+    the number of cohorts, not agents.
+
+    A cohort trades against the pool as one swap. For equal-size sells and
+    buys this is exact, because constant-product swaps with a fixed k
+    compose, so exact-output buys by organizations and power users settle
+    as one order. Members of a cohort share its average cost. Degens'
+    first-step fee collection is approximated. compare_engines reports
+    the difference from the object engine, which stays within TOLERANCE.
+    Journal rows and per-agent metrics are recorded per cohort, with
+    amounts summed over its members and balances per member. Churned
+    members leave their cohort, which shrinks, and are recorded as one
+    exit row per cohort and step.
+    """
+    ARRAYS = VectorizedDataDAOGroupChat.ARRAYS + ('count',)
+
+    def __init__(self, config: Dict[str, Any]):
+        for spread_key in sorted(set(PARAMETER_SPREADS.values())):
+            if config['SIM_CONFIG'].get(spread_key, 0):
+                raise ValueError(f"Cohort members share their parameters; {spread_key} must be 0")
+        self.count = np.zeros(0, dtype=np.int64)  # Members per cohort
+        super().__init__(config)
+
+    def _members(self, ids: np.ndarray) -> np.ndarray:
+        return self.count[ids]
+
+    def _add_agents(self, agent_type: str, count: int):
+        """Add one cohort of count agents of given type"""
+        if count <= 0:
+            return
+
+        config = self.config['AGENT_CONFIGS'][agent_type]
+        code = TYPE_CODES[agent_type]
+        i = self.size
+        self._grow(i + 1)
+
+        # Mirror the starting balances the agent classes set up
+        self.type_code[i] = code
+        self.joined[i] = self.current_step
+        self.ddt[i] = config['initial_ddt'] if code != ORGANIZATION else 0
+        self.xdai[i] = config['initial_xdai'] if code in (DEGEN, ORGANIZATION, POWER) else 0
+        self.spend[i] = config['daily_ddt_buy'] if code == ORGANIZATION else config.get('daily_spend', 0)
+        self.reinvest_rate[i] = config.get('reinvest_rate', 0)
+        self.needs_liquidity[i] = code == DEGEN
+        self.sell_threshold[i] = config.get('sell_threshold', 0)
+        self.ddt_key[i] = self.xdai_key[i] = -1
+        self.count[i] = count
+
+        # Named after the agent numbers it stands for, e.g. degen_user_4-7
+        first = self.total_agents[agent_type]
+        name = f"{agent_type}_{first}-{first + count - 1}"
+        self.names.append(name)
+        self.agent_id[i] = self.journal.register_name(name)
+        self.total_agents[agent_type] += count
+        self.type_members[agent_type] = np.append(self.type_members[agent_type], i)
+        self.size = i + 1
+
+    def _step_degen(self, i: int):
+        pool = self.liquidity_pool
+        ddt, xdai = self.ddt_rows, self.xdai_rows
+        members = self.member_rows[i]
+        if self.needs_rows[i] and ddt[i] >= 10 and xdai[i] >= 10:
+            self.needs_rows[i] = False
+            # Members provide liquidity and sell one after another, settled
+            # in one pass, so the cohort ends up with the LP shares its
+            # members would hold
+            sells = ddt[i] >= 100
+            xdai_received = pool.provide_and_sell_many(10, 10, 90 if sells else 0, members, self.names[i])
+            ddt[i] -= 10
+            xdai[i] -= 10
+            self._record(i, 'provide_liquidity', 10 * members, 10 * members)
+            if sells:
+                ddt[i] -= 90
+                xdai[i] += xdai_received / members
+                self._record(i, 'sell_ddt', 90 * members, xdai_received)
+
+        # Equal-ratio adds compose, so one reinvestment covers every member
+        self._collect_fees(i)
+
+    def _step_organizations(self, ids: List[int]):
+        for i in ids:
+            self._step_organization(i)
+
+    def _step_organization(self, i: int):
+        # Members' exact-output buys compose into one order; each member
+        # is charged the average cost
+        members = self.member_rows[i]
+        order = self.spend_rows[i] * members
+        xdai_needed = self.liquidity_pool.quote(order, 'buy_exact')
+        if self.xdai_rows[i] * members >= xdai_needed:
+            xdai_paid = self.liquidity_pool.buy_exact_ddt(order)
+            self.xdai_rows[i] -= xdai_paid / members
+            self._pie_receive(i, order)
+            self._record(i, 'buy_and_spend_ddt', order, xdai_paid)
+
+    def _step_power_buyer(self, i: int):
+        current_price = self.liquidity_pool.get_price()
+        if current_price <= PowerUserAgent.max_price:
+            members = self.member_rows[i]
+            order = self.spend_rows[i] * members
+            xdai_needed = self.liquidity_pool.quote(order, 'buy_exact')
+            if self.xdai_rows[i] * members >= xdai_needed:
+                xdai_paid = self.liquidity_pool.buy_exact_ddt(order)
+                self.xdai_rows[i] -= xdai_paid / members
+                self._record(i, 'buy_ddt', order, xdai_paid)
+                self._pie_receive(i, order)
+                self._record(i, 'spend_ddt', order, 0)
+
+    def _step_casual_seller(self, i: int):
+        members = self.member_rows[i]
+        excess_ddt = self.spend_rows[i] * 9
+        xdai_received = self.liquidity_pool.sell_ddt(excess_ddt * members)
+        if xdai_received > 0:
+            self.ddt_rows[i] -= excess_ddt
+            self.xdai_rows[i] += xdai_received / members
+            self._record(i, 'sell_excess_ddt', excess_ddt * members, xdai_received)
+
+    def _churn(self, members: np.ndarray) -> np.ndarray:
+        # Members churn independently, so the number leaving is binomial
+        return self.random.generator('churn', self.current_step).binomial(members, self.churn_rate)
+
+    def _remove_members(self, rows: np.ndarray, leaving: np.ndarray) -> np.ndarray:
+        # Members share their balances, so the cohort just shrinks
+        self.count[rows] -= leaving
+        return self.count[rows]
+
+    def _pick_members(self, members: np.ndarray, count: int, draws: np.random.Generator) -> np.ndarray:
+        return draws.multivariate_hypergeometric(members, count)
+
+    def immigrate(self, agent_type: str, ddt: np.ndarray, xdai: np.ndarray):
+        # One cohort, whose members share the arrivals' average balances
+        start = self.size
+        self._add_agents(agent_type, len(ddt))
+        self.ddt[start:self.size] = ddt.mean()
+        self.xdai[start:self.size] = xdai.mean()
+
+    def _share_pie(self):
+        pie = self.the_pie
+        if pie.total_ddt == 0:
+            return
+
+        total_distribution = pie.total_ddt * 0.7
+        pie.total_ddt -= total_distribution
+
+        for agent_type, ratio in pie.distribution_ratios.items():
+            cohorts = self.type_members[agent_type]
+            if not len(cohorts):
+                continue
+            members = self.count[cohorts]
+            per_agent_share = total_distribution * ratio / members.sum()
+            if agent_type == 'power_user':
+                # Power users keep their pie share for service usage
+                self.ddt[cohorts] += per_agent_share
+                self._record_many(cohorts, 'receive_pie_share', per_agent_share * members, 0,
+                                  self.ddt[cohorts], self.xdai[cohorts])
+            elif self.auction is not None:
+                self.auction.sell('sell_pie_share', cohorts, per_agent_share * members)
+            else:
+                # Every member sells its share; settled per cohort in closed form
+                proceeds = self.liquidity_pool.sell_ddt_runs(per_agent_share, members)
+                sold = proceeds > 0
+                sellers = cohorts[sold]
+                self.xdai[sellers] += proceeds[sold] / members[sold]
+                self._record_many(sellers, 'sell_pie_share', per_agent_share * members[sold],
+                                  proceeds[sold], self.ddt[sellers], self.xdai[sellers])
+
+    def _average_xdai_by_type(self) -> Dict[str, float]:
+        types = self.type_code[:self.size]
+        count = self.count[:self.size]
+        counts = np.bincount(types, weights=count, minlength=len(AGENT_TYPES))
+        sums = np.bincount(types, weights=self.xdai[:self.size] * count, minlength=len(AGENT_TYPES))
+        return {
+            agent_type: float(sums[TYPE_CODES[agent_type]] / counts[TYPE_CODES[agent_type]])
+            if counts[TYPE_CODES[agent_type]] else 0
+            for agent_type in self.total_agents.keys()
+        }
+
+
+if __name__ == "__main__":
+    from config import CONFIG
+
+    steps = 300
+    diffs = compare_engines(CONFIG, steps, CohortDataDAOGroupChat)
+    for column, diff in diffs.items():
+        print(f"{column}: max relative difference {diff:.2e}")
+    worst = max(diffs.values())
+    print(f"Parity over {steps} steps: {'OK' if worst < TOLERANCE else 'FAILED'} "
+          f"({worst:.2e}, tolerance {TOLERANCE:.0e})")
@@ -5,6 +5,38 @@ CONFIG = {
         'entry_steps': 5,  # Add agents every 5 steps
         'agents_per_entry': 10,  # Total agents to add per entry
         'fee_rate': 0.003,
+        'amm': 'constant_product',  # 'constant_product', 'stableswap' or 'concentrated'
+        'amm_amplification': 100,  # StableSwap amplification (A)
+        'amm_price_range': (0.01, 100.0),  # Concentrated liquidity price range in xDAI per dDT
+        'engine': 'object',  # 'object' (reference), 'vectorized', 'cohort' or 'compiled'
+        'pie_settlement': 'sequential',  # 'sequential' (reference) or 'batched'
+        'scheduler': 'every_step',  # 'every_step' (reference) or 'event' (skip idle agents)
+        'step_mode': 'sequential',  # 'sequential' (reference) or 'batch_auction' (vectorized/cohort engines)
+        'seed': 0,  # Seeds every random draw below; sweeps set it per run
+        'spend_spread': 0.0,  # Per-agent daily_spend/daily_ddt_buy scaled by a mean-1 lognormal with this sigma
+        'sell_threshold_spread': 0.0,  # Same for casual users' sell_threshold (0 = identical agents)
+        'entry_arrivals': 'fixed',  # 'fixed' (agents_per_entry per wave) or 'poisson'
+        'exit_rule': 'never',  # 'never' (reference) or 'exhausted' (users that can no longer spend leave)
+        'churn_rate': 0.0,  # Per-step probability that each non-degen agent leaves
+        'distribution_stats': False,  # Per-type dDT/xDAI p10/p50/p90 and Gini columns from mergeable sketches
+        'sketch_accuracy': 0.01,  # Relative accuracy of those quantiles
+        'fast_forward': False,  # Jump over quasi-steady stretches by extrapolation (array engines; approximate)
+        'fast_forward_tolerance': 0.01,  # Relative error allowed in a jump's trend, checked after every jump
+        'fast_forward_warmup': 500,  # Exact steps before the first jump and after a failed check
+        'fast_forward_max_steps': 100000,  # Longest single jump
+        'journal_retention': 'full',  # 'full', 'ring' or 'aggregates'
+        'journal_capacity': 1000000,  # Rows kept in 'ring' mode
+        'profile': None,  # None, 'phases' (time each step's phases) or 'detail' (also agent types and pool trades)
+        'profile_python': None,  # None, 'cprofile' or 'tracemalloc' around each simulate() call
+        'profile_path': None,  # Write <path>.trace.json, .pstats or .allocations.txt instead of printing
+        'reporter': 'print',  # 'print', 'silent', 'throttled' or 'jsonl'
+        'metrics_path': None,  # Flush metrics to this file/directory instead of keeping them in memory
+        'metrics_format': 'csv',  # 'csv' or 'parquet'
+        'metrics_chunk_size': 10000,  # Rows buffered before each flush
+        'agent_metrics_every': 0,  # Record every agent's balances every N steps (0 = off)
+        'agent_metrics_path': None,
+        'checkpoint_every': 0,  # Snapshot full state every N steps (0 = off)
+        'checkpoint_path': 'checkpoints/step_{step}.ckpt',
         'proportions': {
             'degen_user': 0.40,    # 40% degens
             'organization': 0.05,   # 5% orgs
@@ -44,7 +76,33 @@ CONFIG = {
             'initial_ddt': 100,
             'initial_xdai': 0,
             'daily_spend': 0.1,
-            'sell_threshold': 1.0
+            'sell_threshold': 1.0  # Sell the excess only when holding this much dDT before spending
         }
     }
 }
+
+# Several DAOs simulated side by side by multi_dao.py
+MULTI_DAO_CONFIG = {
+    'daos': {  # DAO name -> dotted-path overrides of CONFIG, as in sweep.py
+        'alpha': {},
+        'beta': {'SIM_CONFIG.fee_rate': 0.01},
+        'gamma': {'AGENT_CONFIGS.organization.daily_ddt_buy': 4}
+    },
+    'bridges': [],  # Direct dDT/dDT pools as (base DAO, quote DAO, base reserve, quote reserve)
+    'bridge_fee_rate': 0.003,
+    'max_hops': 3,  # Longest route the swap router considers
+    'sync_every': 10,  # Steps the DAOs run independently between migrations
+    'migration_rate': 0.01,  # Chance each organization and user moves to another DAO at a sync
+    'parallel': 'process',  # 'serial', 'thread' (one per DAO) or 'process' (one per DAO)
+    'seed': 0,
+    'steps': 500
+}
+
+# Local simulation service with a result cache, run by service.py
+SERVICE_CONFIG = {
+    'host': '127.0.0.1',  # Only serve this machine by default
+    'port': 8765,
+    'workers': None,  # Worker processes (None = one per core)
+    'cache_dir': 'sim_cache',
+    'cache_max_bytes': 2 * 1024 ** 3  # Least recently used runs are evicted beyond this
+}
@@ -0,0 +1,19 @@
+from typing import Dict, Any
+from autogen_agents import DataDAOGroupChat
+from vectorized_engine import VectorizedDataDAOGroupChat
+from cohort_engine import CohortDataDAOGroupChat
+from kernel_engine import CompiledDataDAOGroupChat
+
+ENGINES = {
+    'object': DataDAOGroupChat,
+    'vectorized': VectorizedDataDAOGroupChat,
+    'cohort': CohortDataDAOGroupChat,
+    'compiled': CompiledDataDAOGroupChat
+}
+
+def create_simulation(config: Dict[str, Any]) -> DataDAOGroupChat:
+    """Build the simulation engine selected by SIM_CONFIG['engine']"""
+    engine = config['SIM_CONFIG'].get('engine', 'object')
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown simulation engine: {engine}")
+    return ENGINES[engine](config)
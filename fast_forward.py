@@ -0,0 +1,301 @@
+import io
+import math
+import pickle
+from collections import deque
+from fractions import Fraction
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Per-member quantities carried by a jump, in the columns of _row_values
+QUANTITIES = ('ddt', 'xdai', 'lp_shares', 'fees_collected', 'needs_liquidity', 'unclaimed_fees')
+# Pool and pie scalars moved along their trend
+SCALARS = ('ddt_reserve', 'xdai_reserve', 'fee_per_share', 'pie_ddt')
+
+_TYPE_STRIDE = 1 << 40  # Wave keys are type_code * _TYPE_STRIDE + entry step
+_SMALL = 1e-9  # Observables below this are treated as zero when scaling errors
+
+
+def entry_period(sim_config: Dict[str, Any]) -> int:
+    """Steps after which the entry schedule repeats its per-type wave sizes.
+
+    Each type gets agents_per_entry * proportion agents per wave, rounded
+    on the running total, so the sizes cycle over the denominators of
+    those fractions. Twice their lcm also covers round-half-to-even.
+    """
+    waves = 1
+    for proportion in sim_config['proportions'].values():
+        fraction = Fraction(sim_config['agents_per_entry'] * proportion).limit_denominator(1000)
+        waves = waves * fraction.denominator // math.gcd(waves, fraction.denominator)
+    return 2 * waves * sim_config['entry_steps']
+
+
+class FastForward:
+    """Advances an array engine many steps at once while its trends are smooth.
+
+    Every period (entry waves after which the entry schedule repeats) the
+    engine's state is snapshotted. A snapshot holds the observables (price,
+    reserves and per-type average xDAI), the pool and pie scalars, and
+    every entry wave's per-member balances and LP holdings. From the last
+    three snapshots, the observables' change and curvature per period give
+    the number of periods J a straight-line extrapolation stays within
+    tolerance of. When J is at least 2, a jump:
+
+    - enters the J periods' agents exactly as stepping would,
+    - moves each wave in both snapshots on by J times its change over the
+      last period, cut short where a falling balance would run out, so a
+      casual user's sales also stop when its dDT does,
+    - sets each younger wave to the wave of the same age at the last
+      snapshot, so what happens early in an agent's life stays at that
+      age. Moving these along the change between two different waves
+      would also carry any earlier jump's error forward, J times over,
+    - moves the reserves, pie and fee index along their trend, carries
+      every LP's uncollected fees forward with its wave and fills the
+      skipped steps' metric rows by linear interpolation.
+
+    The period after a jump is stepped exactly and its observables are
+    compared with the trend. Snapshots restart there, so every jump
+    extrapolates from three exactly stepped periods. An error above
+    tolerance undoes the jump: the state saved before it is restored and
+    its stretch is stepped exactly, as is `warmup` steps past the check,
+    and the longest jump halves. Otherwise the longest jump doubles.
+    Skipped steps record no journal rows, per-agent metrics or checkpoints.
+    """
+    def __init__(self, sim_config: Dict[str, Any]):
+        self.period = entry_period(sim_config)
+        self.entry_steps = sim_config['entry_steps']
+        self.tolerance = sim_config.get('fast_forward_tolerance', 0.01)
+        self.warmup = sim_config.get('fast_forward_warmup', 500)
+        self.max_periods = max(sim_config.get('fast_forward_max_steps', 100_000) // self.period, 1)
+        if not self.tolerance > 0:
+            raise ValueError(f"fast_forward_tolerance must be positive, got {self.tolerance}")
+        self.limit = 4  # Longest jump in periods, adapted by each check
+        self.exact_until = self.warmup  # No jumps before this step
+        self.snapshots = deque(maxlen=3)
+        self.pending = None  # (jump record, predicted observables, saved state) awaiting the next period's check
+        self.jumps = []  # One dict per jump
+        self.skipped_steps = 0
+        self._periods = 0  # Jump length chosen by ready()
+
+    def observe(self, sim, averages: Dict[str, float]) -> Optional[bool]:
+        """Snapshot the state at the end of each period, and check the last jump.
+
+        Returns whether the jump passed its check, or None when no check was due.
+        """
+        if sim.current_step % self.period:
+            return None
+        observables = self._observables(sim, averages)
+        passed = None
+        if self.pending is not None:
+            record, predicted, saved = self.pending
+            scale = np.maximum(np.abs(predicted), _SMALL)
+            record['error'] = float(np.max(np.abs(observables - predicted) / scale))
+            self.pending = None
+            if record['error'] > self.tolerance:
+                self.limit = max(self.limit // 2, 2)
+                self.exact_until = sim.current_step + self.warmup
+                self.snapshots.clear()
+                # Go back to before the jump; the caller steps on from sim.current_step
+                self._restore(sim, saved)
+                self.skipped_steps -= record['steps']
+                return False
+            self.limit = min(self.limit * 2, self.max_periods)
+            passed = True
+        self.snapshots.append(self._snapshot(sim, averages, observables))
+        return passed
+
+    def ready(self, sim, end: int) -> bool:
+        """Whether to jump at the current step, which must end a snapshotted period"""
+        step = sim.current_step
+        if (step % self.period or step < self.exact_until or len(self.snapshots) < 3
+                or self.snapshots[-1]['step'] != step):
+            return False
+        # Young waves copy waves from the later half of the run, past the
+        # start-up transient, and the jump must fit before end
+        periods = min(self.limit, step // (2 * self.period), (end - step) // self.period)
+        oldest, previous, last = (snapshot['observables'] for snapshot in self.snapshots)
+        curvature = np.abs(last - 2 * previous + oldest)
+        scale = np.maximum(np.abs(last), _SMALL)
+        # A straight line drifts from a parabola by J(J+1)/2 times its curvature
+        bent = curvature > 0
+        if bent.any():
+            bound = np.sqrt(2 * self.tolerance * scale[bent] / curvature[bent]).min()
+            periods = min(periods, int(bound))
+        self._periods = periods
+        return periods >= 2
+
+    def jump(self, sim, end: int) -> Dict[str, float]:
+        """Advance by the periods ready() chose; returns the last skipped step's averages"""
+        periods = self._periods
+        start = sim.current_step
+        steps = periods * self.period
+        previous, last = self.snapshots[-2], self.snapshots[-1]
+        saved = self._save(sim)
+
+        # Agents enter as they would have
+        for step in range(start, start + steps, self.entry_steps):
+            sim.current_step = sim.journal.step = step
+            sim._enter_agents()
+        sim.current_step = start + steps
+
+        # Waves in both snapshots move along their own trend. Younger ones take
+        # the state of the wave of their age.
+        n = sim.size
+        codes = sim.type_code[:n].astype(np.int64)
+        joined = sim.joined[:n]
+        sourced = joined >= previous['step']  # Entered after the previous snapshot
+        source = np.where(sourced, joined - steps, joined)
+        values = self._lookup(last, codes, source)
+        trend = values - self._lookup(previous, codes, source, fallback=values)
+        trend[sourced] = 0
+        trend[:, QUANTITIES.index('needs_liquidity')] = 0
+        trend[:, QUANTITIES.index('unclaimed_fees')] = 0  # Owed fees are carried forward as they are
+        # A wave stops where its first falling balance runs out, and with it
+        # what that balance paid for, as users stop spending what they lack
+        falling = trend < 0
+        room = np.where(falling, values / np.where(falling, -periods * trend, 1), np.inf).min(axis=1)
+        trend *= np.clip(room, 0, 1)[:, None]
+        values = np.maximum(values + periods * trend, 0)
+        self._set_rows(sim, values)
+
+        # Pool and pie move along their trend, with every LP's fees settled
+        scalars = np.maximum(last['scalars'] + periods * (last['scalars'] - previous['scalars']), 0)
+        self._set_scalars(sim, scalars)
+        sim._after_jump()
+
+        averages = sim._average_xdai_by_type()
+        self._fill_metrics(sim, steps, sim._metrics_row(averages))
+        self.skipped_steps += steps
+        record = {'step': start, 'steps': steps, 'error': float('nan')}
+        self.jumps.append(record)
+
+        # The next period is stepped exactly and checked against the trend
+        observables = self._observables(sim, averages)
+        self.pending = (record, observables + (last['observables'] - previous['observables']), saved)
+        self.snapshots.clear()
+        return averages
+
+    def get_jump_data(self) -> 'pd.DataFrame':
+        """First step, length and checked relative error of every jump"""
+        import pandas as pd
+        return pd.DataFrame(self.jumps, columns=['step', 'steps', 'error'])
+
+    def _shared(self, sim) -> Dict[str, Any]:
+        """Objects a saved state refers to instead of copying: the run's own, and this one"""
+        return {'sim': sim, 'fast_forward': self, 'reporter': sim.reporter, 'profiler': sim.profiler}
+
+    def _save(self, sim) -> bytes:
+        """Pickle the simulation's state, as a checkpoint would, to undo a jump"""
+        shared = {id(obj): name for name, obj in self._shared(sim).items()}
+        buffer = io.BytesIO()
+        pickler = pickle.Pickler(buffer, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = lambda obj: shared.get(id(obj))
+        pickler.dump(sim.__dict__)
+        return buffer.getvalue()
+
+    def _restore(self, sim, saved: bytes):
+        """Put back a state from _save, with metrics on disk rolled back to it"""
+        unpickler = pickle.Unpickler(io.BytesIO(saved))
+        unpickler.persistent_load = self._shared(sim).__getitem__
+        state = unpickler.load()
+        sim.__dict__.clear()
+        sim.__dict__.update(state)
+        for sink in (sim.metrics, sim.agent_metrics):
+            if sink is not None:
+                sink.rollback()
+
+    def _observables(self, sim, averages: Dict[str, float]) -> np.ndarray:
+        pool = sim.liquidity_pool
+        return np.array([pool.get_price(), pool.ddt_reserve, pool.xdai_reserve] + list(averages.values()))
+
+    def _snapshot(self, sim, averages: Dict[str, float], observables: np.ndarray) -> Dict[str, Any]:
+        """Observables, scalars and per-member means of every (type, entry step) wave"""
+        n = sim.size
+        keys = sim.type_code[:n].astype(np.int64) * _TYPE_STRIDE + sim.joined[:n]
+        waves, inverse = np.unique(keys, return_inverse=True)
+        members = sim._members(np.arange(n)).astype(float)
+        weights = np.bincount(inverse, weights=members, minlength=len(waves))
+        values = self._row_values(sim, members)
+        means = np.stack([np.bincount(inverse, weights=values[:, q] * members, minlength=len(waves))
+                          for q in range(len(QUANTITIES))], axis=1) / np.maximum(weights, 1e-300)[:, None]
+        pool = sim.liquidity_pool
+        return {
+            'step': sim.current_step,
+            'observables': observables,
+            'scalars': np.array([pool.ddt_reserve, pool.xdai_reserve, pool.fee_per_share, sim.the_pie.total_ddt]),
+            'waves': waves,
+            'means': means,
+            'row': sim._metrics_row(averages)
+        }
+
+    def _row_values(self, sim, members: np.ndarray) -> np.ndarray:
+        n = sim.size
+        pool = sim.liquidity_pool
+        values = np.zeros((n, len(QUANTITIES)))
+        values[:, 0] = sim.ddt[:n]
+        values[:, 1] = sim.xdai[:n]
+        lp_rows = sim._provider_rows()
+        providers = np.flatnonzero(lp_rows >= 0)
+        values[providers, 2] = np.frombuffer(pool.shares)[lp_rows[providers]] / members[providers]
+        values[providers, 3] = np.frombuffer(pool.fees_collected)[lp_rows[providers]] / members[providers]
+        values[:, 4] = sim.needs_liquidity[:n]
+        # Fees owed and not yet collected, settled up to the current fee index
+        rows = lp_rows[providers]
+        owed = np.frombuffer(pool.unclaimed_fees)[rows] + np.frombuffer(pool.shares)[rows] * (
+            pool.fee_per_share - np.frombuffer(pool.fee_checkpoints)[rows])
+        values[providers, 5] = owed / members[providers]
+        return values
+
+    def _lookup(self, snapshot: Dict[str, Any], codes: np.ndarray, joined: np.ndarray,
+                fallback: np.ndarray = None) -> np.ndarray:
+        """Means of the latest wave of each row's type that joined at or before joined
+
+        Rows whose type had no such wave take its earliest wave, or
+        fallback when the snapshot has no wave of the type at all.
+        """
+        waves, means = snapshot['waves'], snapshot['means']
+        found = np.searchsorted(waves, codes * _TYPE_STRIDE + joined, side='right') - 1
+        earliest = np.searchsorted(waves, codes * _TYPE_STRIDE)
+        own_type = (found >= 0) & (waves[np.maximum(found, 0)] // _TYPE_STRIDE == codes)
+        found = np.where(own_type, found, earliest)
+        known = (found < len(waves)) & (waves[np.minimum(found, len(waves) - 1)] // _TYPE_STRIDE == codes)
+        values = np.zeros((len(codes), len(QUANTITIES))) if fallback is None else fallback.copy()
+        values[known] = means[found[known]]
+        return values
+
+    def _set_rows(self, sim, values: np.ndarray):
+        n = sim.size
+        pool = sim.liquidity_pool
+        members = sim._members(np.arange(n)).astype(float)
+        sim.ddt[:n] = values[:, 0]
+        sim.xdai[:n] = values[:, 1]
+        sim.needs_liquidity[:n] = values[:, 4] > 0.5
+        # LPs hold their wave's shares; degens that joined in the jump get rows in the share table
+        lp_rows = sim._provider_rows(register=True)
+        providers = np.flatnonzero(lp_rows >= 0)
+        rows = lp_rows[providers]
+        np.frombuffer(pool.shares)[rows] = values[providers, 2] * members[providers]
+        np.frombuffer(pool.fees_collected)[rows] = values[providers, 3] * members[providers]
+        np.frombuffer(pool.unclaimed_fees)[rows] = values[providers, 5] * members[providers]
+
+    def _set_scalars(self, sim, scalars: np.ndarray):
+        pool = sim.liquidity_pool
+        pool.ddt_reserve, pool.xdai_reserve, pool.fee_per_share, sim.the_pie.total_ddt = scalars.tolist()
+        # LPs' owed fees were set with their rows, settled up to the new index
+        np.frombuffer(pool.fee_checkpoints)[:] = pool.fee_per_share
+        pool.total_fees = float(np.frombuffer(pool.unclaimed_fees).sum())
+        pool.total_shares = float(np.frombuffer(pool.shares).sum())
+
+    def _fill_metrics(self, sim, steps: int, row: List[float]):
+        """Metric rows of the skipped steps, interpolated up to the state after the jump"""
+        before = np.array(self.snapshots[-1]['row'], dtype=float)
+        after = np.array(row, dtype=float)
+        fractions = np.arange(1, steps + 1) / steps
+        block = before + fractions[:, None] * (after - before)
+        columns = {}
+        for k, name in enumerate(sim.metrics.dtype.names):
+            column = block[:, k]
+            columns[name] = np.rint(column) if sim.metrics.dtype[name].kind == 'i' else column
+        sim.metrics.record_many(columns)
@@ -0,0 +1,212 @@
+from array import array
+from typing import TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Action codes stored in the journal's action column
+ACTIONS = [
+    'provide_liquidity',
+    'sell_ddt',
+    'reinvest_fees',
+    'buy_and_spend_ddt',
+    'buy_ddt',
+    'spend_ddt',
+    'receive_pie_share',
+    'sell_pie_share',
+    'sell_excess_ddt',
+    'pie_receive_ddt'  # ThePie receiving spent dDT; balances are the pie's
+]
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+# Column name -> array typecode
+COLUMNS = {
+    'agent': 'q',
+    'action': 'B',
+    'ddt': 'd',
+    'xdai': 'd',
+    'ddt_balance': 'd',
+    'xdai_balance': 'd',
+    'step': 'q'
+}
+
+RETENTION_MODES = ('full', 'ring', 'aggregates')
+
+
+class TransactionJournal:
+    """Append-only transaction log shared by all agents and ThePie.
+
+    Rows are stored in typed column arrays instead of one dict per
+    transaction. Retention modes:
+      full        keep every row
+      ring        keep only the last `capacity` rows
+      aggregates  keep no rows, only per-action counts and totals
+    Per-action aggregates are maintained in every mode.
+    """
+    def __init__(self, retention: str = 'full', capacity: int = 1_000_000):
+        if retention not in RETENTION_MODES:
+            raise ValueError(f"Unknown journal retention mode: {retention}")
+        if retention == 'ring' and capacity <= 0:
+            raise ValueError("Ring journal needs a positive capacity")
+        self.retention = retention
+        self.capacity = capacity
+        self.step = 0  # Written into every row, set by the simulation loop
+        self.agent_names = []
+        self.agent_ids = {}
+
+        if retention == 'ring':
+            self.columns = {name: array(code, bytes(array(code).itemsize * capacity))
+                            for name, code in COLUMNS.items()}
+        else:
+            self.columns = {name: array(code) for name, code in COLUMNS.items()}
+        self.rows = 0  # Rows ever recorded
+        self.position = 0  # Next ring slot
+
+        self.action_counts = [0] * len(ACTIONS)
+        self.action_ddt = [0.0] * len(ACTIONS)
+        self.action_xdai = [0.0] * len(ACTIONS)
+
+    def register(self, agent) -> int:
+        """Assign agent an id and route its record_transaction calls here"""
+        agent_id = self.register_name(agent.name)
+        agent.agent_id = agent_id
+        agent.journal = self
+        return agent_id
+
+    def register_name(self, name: str) -> int:
+        agent_id = self.agent_ids.get(name)
+        if agent_id is None:
+            agent_id = self.agent_ids[name] = len(self.agent_names)
+            self.agent_names.append(name)
+        return agent_id
+
+    def record(self, agent_id: int, action: str, ddt: float, xdai: float,
+               ddt_balance: float, xdai_balance: float):
+        code = ACTION_CODES[action]
+        self.action_counts[code] += 1
+        self.action_ddt[code] += ddt
+        self.action_xdai[code] += xdai
+        self.rows += 1
+
+        if self.retention == 'full':
+            columns = self.columns
+            columns['agent'].append(agent_id)
+            columns['action'].append(code)
+            columns['ddt'].append(ddt)
+            columns['xdai'].append(xdai)
+            columns['ddt_balance'].append(ddt_balance)
+            columns['xdai_balance'].append(xdai_balance)
+            columns['step'].append(self.step)
+        elif self.retention == 'ring':
+            columns = self.columns
+            i = self.position
+            columns['agent'][i] = agent_id
+            columns['action'][i] = code
+            columns['ddt'][i] = ddt
+            columns['xdai'][i] = xdai
+            columns['ddt_balance'][i] = ddt_balance
+            columns['xdai_balance'][i] = xdai_balance
+            columns['step'][i] = self.step
+            self.position = (i + 1) % self.capacity
+
+    def record_many(self, agent_ids: np.ndarray, action: str, ddt, xdai,
+                    ddt_balance, xdai_balance):
+        """Record one action for many agents at once; scalars are broadcast"""
+        count = len(agent_ids)
+        if count == 0:
+            return
+        values = self._columns(count, agent_ids, ACTION_CODES[action], ddt, xdai, ddt_balance, xdai_balance)
+
+        code = ACTION_CODES[action]
+        self.action_counts[code] += count
+        self.action_ddt[code] += float(values['ddt'].sum())
+        self.action_xdai[code] += float(values['xdai'].sum())
+        self._append(values, count)
+
+    def totals(self) -> np.ndarray:
+        """Per-action counts, dDT and xDAI totals as a (3, len(ACTIONS)) array"""
+        return np.array([self.action_counts, self.action_ddt, self.action_xdai], dtype=float)
+
+    def record_block(self, count: int, totals: np.ndarray, agent_ids=None, actions=None,
+                     ddt=None, xdai=None, ddt_balance=None, xdai_balance=None):
+        """Record count rows accumulated outside the journal, e.g. by a compiled step.
+
+        totals is totals() with the rows added in order, so the aggregates
+        match recording them one by one. The row columns are only needed
+        when the journal keeps rows.
+        """
+        self.action_counts = [int(total) for total in totals[0]]
+        self.action_ddt = totals[1].tolist()
+        self.action_xdai = totals[2].tolist()
+        if count == 0:
+            return
+        if self.retention == 'aggregates':
+            self.rows += count
+        else:
+            self._append(self._columns(count, agent_ids, actions, ddt, xdai, ddt_balance, xdai_balance), count)
+
+    def _columns(self, count: int, agent_ids, actions, ddt, xdai, ddt_balance, xdai_balance) -> dict:
+        """One array of count values per column; scalars are broadcast"""
+        values = {
+            'agent': agent_ids,
+            'action': actions,
+            'ddt': ddt,
+            'xdai': xdai,
+            'ddt_balance': ddt_balance,
+            'xdai_balance': xdai_balance,
+            'step': self.step
+        }
+        return {name: np.asarray(value, dtype=COLUMNS[name]) if np.ndim(value)
+                else np.full(count, value, dtype=COLUMNS[name])
+                for name, value in values.items()}
+
+    def _append(self, values: dict, count: int):
+        """Store count rows given as one array per column"""
+        self.rows += count
+        if self.retention == 'full':
+            for name, column in self.columns.items():
+                column.frombytes(np.ascontiguousarray(values[name]).tobytes())
+        elif self.retention == 'ring':
+            # Only the last `capacity` rows can survive the write
+            keep = min(count, self.capacity)
+            slots = (self.position + count - keep + np.arange(keep)) % self.capacity
+            for name, column in self.columns.items():
+                np.frombuffer(column, dtype=COLUMNS[name])[slots] = values[name][-keep:]
+            self.position = (self.position + count) % self.capacity
+
+    def __len__(self) -> int:
+        """Number of rows currently retained"""
+        if self.retention == 'full':
+            return self.rows
+        if self.retention == 'ring':
+            return min(self.rows, self.capacity)
+        return 0
+
+    def to_dataframe(self) -> 'pd.DataFrame':
+        """Export the retained rows, oldest first"""
+        import pandas as pd
+        data = {}
+        for name, column in self.columns.items():
+            values = np.frombuffer(column, dtype=COLUMNS[name]) if len(column) else np.zeros(0, COLUMNS[name])
+            if self.retention == 'ring':
+                if self.rows < self.capacity:
+                    values = values[:self.rows]
+                else:
+                    values = np.roll(values, -self.position)
+            elif self.retention == 'aggregates':
+                values = values[:0]
+            data[name] = values.copy()
+
+        data['agent'] = pd.Categorical.from_codes(data['agent'], categories=self.agent_names)
+        data['action'] = pd.Categorical.from_codes(data['action'], categories=ACTIONS)
+        return pd.DataFrame(data)
+
+    def aggregates(self) -> 'pd.DataFrame':
+        """Per-action transaction counts and dDT/xDAI totals"""
+        import pandas as pd
+        return pd.DataFrame({
+            'count': self.action_counts,
+            'ddt': self.action_ddt,
+            'xdai': self.action_xdai
+        }, index=pd.Index(ACTIONS, name='action'))
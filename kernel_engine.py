@@ -0,0 +1,126 @@
+from typing import Dict, Any
+import numpy as np
+from autogen_agents import PowerUserAgent
+from liquidity_pool import LiquidityPool
+from vectorized_engine import VectorizedDataDAOGroupChat, compare_engines, AGENT_TYPES, TYPE_CODES, DEGEN
+
+
+class CompiledDataDAOGroupChat(VectorizedDataDAOGroupChat):
+    """Vectorized engine whose whole step runs as one compiled kernel.
+
+    Agents' steps, pie distribution and swaps happen in step_kernel.step,
+    compiled with Numba, while entry of new agents, metrics, checkpoints
+    and reporting stay in Python and run once per step. The kernel
+    covers the reference scenario: the constant-product curve with
+    step_mode='sequential'. Without Numba, or outside that scenario, the
+    vectorized engine's Python path runs instead; `compiled` tells which.
+    """
+    ARRAYS = VectorizedDataDAOGroupChat.ARRAYS + ('lp_row',)
+
+    def __init__(self, config: Dict[str, Any]):
+        self.lp_row = np.zeros(0, dtype=np.int64)  # Degens' rows in the pool's LP share table
+        self.xdai_sums = np.zeros(len(AGENT_TYPES))  # Running per-type totals, kept as balances change
+        super().__init__(config)
+        import step_kernel
+        self.compiled = (step_kernel.NUMBA_AVAILABLE and type(self.liquidity_pool) is LiquidityPool
+                         and self.step_mode == 'sequential')
+        self.pie_types = np.array([TYPE_CODES[agent_type] for agent_type in self.the_pie.distribution_ratios])
+        self.pie_ratios = np.array(list(self.the_pie.distribution_ratios.values()), dtype=float)
+        self._index_pie_groups()
+
+    def _index_pie_groups(self):
+        """Concatenate the pie groups' members for the kernel"""
+        groups = [self.type_members[agent_type] for agent_type in self.the_pie.distribution_ratios]
+        self.pie_members = np.concatenate(groups).astype(np.int64)
+        self.pie_offsets = np.cumsum([0] + [len(group) for group in groups])
+
+    def _add_agents(self, agent_type: str, count: int):
+        start = self.size
+        super()._add_agents(agent_type, count)
+        self.lp_row[start:self.size] = -1
+        self.xdai_sums[TYPE_CODES[agent_type]] += self.xdai[start:self.size].sum()
+        if TYPE_CODES[agent_type] == DEGEN:
+            # Rows start with no shares, so registering early changes no
+            # balances and the kernel never has to grow the share table
+            for i in range(start, self.size):
+                self.lp_row[i] = self.liquidity_pool.provider_row(self.names[i])
+        elif hasattr(self, 'pie_members'):
+            self._index_pie_groups()
+
+    def immigrate(self, agent_type: str, ddt: np.ndarray, xdai: np.ndarray):
+        start = self.size
+        self._add_agents(agent_type, len(ddt))
+        self.xdai_sums[TYPE_CODES[agent_type]] += xdai.sum() - self.xdai[start:self.size].sum()
+        self.ddt[start:self.size] = ddt
+        self.xdai[start:self.size] = xdai
+
+    async def _step_agents(self):
+        if not self.compiled:
+            await super()._step_agents()
+            return
+
+        import step_kernel
+        n = self.size
+        pool = self.liquidity_pool
+        state = np.array([getattr(pool, field) for field in step_kernel.POOL_FIELDS]
+                         + [self.the_pie.total_ddt], dtype=float)
+        capacity = n * step_kernel.ROWS_PER_AGENT if self.journal.retention != 'aggregates' else 0
+        log = (np.empty(capacity, dtype=np.int64), np.empty(capacity, dtype=np.uint8), np.empty((4, capacity)))
+        totals = self.journal.totals()
+
+        rows = step_kernel.step(
+            self.type_code[:n], self.ddt[:n], self.xdai[:n], self.spend[:n], self.reinvest_rate[:n],
+            self.needs_liquidity[:n], self.sell_threshold[:n], self.lp_row[:n],
+            state, pool.fee_rate, PowerUserAgent.max_price,
+            np.frombuffer(pool.shares), np.frombuffer(pool.fee_checkpoints),
+            np.frombuffer(pool.unclaimed_fees), np.frombuffer(pool.fees_collected),
+            self.pie_types, self.pie_ratios, self.pie_members, self.pie_offsets, log, totals, self.xdai_sums)
+
+        for field, value in zip(step_kernel.POOL_FIELDS, state.tolist()):
+            setattr(pool, field, value)
+        self.the_pie.total_ddt = float(state[step_kernel.PIE_DDT])
+        agents, actions, values = log
+        self.journal.record_block(rows, totals, self.agent_id[agents[:rows]], actions[:rows],
+                                  *values[:, :rows])
+
+    def _compact(self, dropped: np.ndarray):
+        super()._compact(dropped)
+        self._index_pie_groups()
+        self._sum_xdai()
+
+    def _provider_rows(self, register: bool = False) -> np.ndarray:
+        # Degens are registered when they are added
+        return self.lp_row[:self.size].copy()
+
+    def _after_jump(self):
+        self._sum_xdai()
+
+    def _sum_xdai(self):
+        """Recount the per-type xDAI totals after rows are dropped or rewritten"""
+        types = self.type_code[:self.size]
+        self.xdai_sums = np.bincount(types, weights=self.xdai[:self.size], minlength=len(AGENT_TYPES))
+
+    def _distribute_rewards(self):
+        # The kernel distributes the pie as part of the step
+        if not self.compiled:
+            super()._distribute_rewards()
+
+    def _average_xdai_by_type(self) -> Dict[str, float]:
+        if not self.compiled:
+            return super()._average_xdai_by_type()
+        return {
+            agent_type: float(self.xdai_sums[TYPE_CODES[agent_type]] / len(self.type_members[agent_type]))
+            if len(self.type_members[agent_type]) else 0
+            for agent_type in self.total_agents.keys()
+        }
+
+
+if __name__ == "__main__":
+    from config import CONFIG
+
+    steps = 300
+    diffs = compare_engines(CONFIG, steps, CompiledDataDAOGroupChat)
+    for column, diff in diffs.items():
+        print(f"{column}: max relative difference {diff:.2e}")
+    worst = max(diffs.values())
+    print(f"Parity over {steps} steps: {'OK' if worst < 1e-9 else 'FAILED'} ({worst:.2e})")
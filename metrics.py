@@ -0,0 +1,199 @@
+import importlib.util
+import os
+import shutil
+from typing import Dict, Any, Iterator, Optional, Tuple, TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+FORMATS = ('csv', 'parquet')
+
+
+class MetricsSink:
+    """Row-oriented metrics buffer that flushes to disk in chunks.
+
+    Rows are written into a preallocated structured array of chunk_size
+    rows. When it fills up the chunk is either kept in memory (path=None,
+    the default) or appended to disk and dropped, so memory stays bounded
+    however long the run is. CSV chunks are appended to one file, Parquet
+    chunks are written as numbered files in a directory (needs pyarrow).
+    """
+    def __init__(self, columns: Dict[str, Any], path: Optional[str] = None,
+                 format: str = 'csv', chunk_size: int = 10000):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown metrics format: {format}")
+        if format == 'parquet' and path and importlib.util.find_spec('pyarrow') is None:
+            raise ImportError("Parquet metrics output requires pyarrow")
+        self.dtype = np.dtype([(name, dtype) for name, dtype in columns.items()])
+        self.path = path
+        self.format = format
+        self.chunk_size = chunk_size
+        self.buffer = np.zeros(chunk_size, dtype=self.dtype)
+        self.filled = 0
+        self.rows = 0  # Rows ever recorded
+        self.chunks = []  # Completed chunks when kept in memory
+        self.chunks_written = 0
+        self.bytes_written = 0  # CSV file size after the last flush
+
+        if path:
+            self._reset_disk(path)
+
+    def record(self, *values):
+        """Record one row, values in column order"""
+        self.buffer[self.filled] = values
+        self.filled += 1
+        self.rows += 1
+        if self.filled == self.chunk_size:
+            self.flush()
+
+    def record_many(self, values: Dict[str, Any]):
+        """Record a block of rows given as column -> array (scalars broadcast)"""
+        count = max(np.size(value) for value in values.values())
+        block = np.zeros(count, dtype=self.dtype)
+        for name, value in values.items():
+            block[name] = value
+
+        start = 0
+        while start < count:
+            take = min(count - start, self.chunk_size - self.filled)
+            self.buffer[self.filled:self.filled + take] = block[start:start + take]
+            self.filled += take
+            self.rows += take
+            start += take
+            if self.filled == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        """Move the buffered rows to memory or disk and reset the buffer"""
+        if self.filled == 0:
+            return
+        chunk = self.buffer[:self.filled].copy()
+        self.filled = 0
+        if self.path is None:
+            self.chunks.append(chunk)
+        else:
+            self._write(chunk)
+
+    def _write(self, chunk: np.ndarray):
+        import pandas as pd
+        if self.format == 'csv':
+            pd.DataFrame(chunk).to_csv(self.path, mode='a', header=self.chunks_written == 0, index=False)
+            self.bytes_written = os.path.getsize(self.path)
+        else:
+            pd.DataFrame(chunk).to_parquet(os.path.join(self.path, f"chunk_{self.chunks_written:06d}.parquet"),
+                                           index=False)
+        self.chunks_written += 1
+
+    def _reset_disk(self, path: str):
+        if self.format == 'csv':
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            os.makedirs(path, exist_ok=True)
+            for name in self._parquet_files_after(path, 0):
+                os.remove(os.path.join(path, name))
+
+    def truncate(self, rows: int):
+        """Drop the rows recorded after the first rows; rows already on disk cannot be dropped"""
+        drop = self.rows - rows
+        if drop <= self.filled:
+            self.filled -= drop
+        elif self.path is None:
+            # Keep the first rows of the chunks held in memory; the buffer restarts empty
+            kept, chunks = 0, []
+            for chunk in self.chunks + [self.buffer[:self.filled].copy()]:
+                if kept < rows:
+                    chunks.append(chunk[:rows - kept])
+                    kept += len(chunks[-1])
+            self.chunks = chunks
+            self.filled = 0
+        else:
+            raise ValueError(f"Cannot drop {drop} rows, some are already written to {self.path}")
+        self.rows = rows
+
+    def rollback(self):
+        """Drop anything on disk written after this sink's state was saved"""
+        if self.path is None:
+            return
+        if self.format == 'csv':
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.bytes_written:
+                os.truncate(self.path, self.bytes_written)
+        else:
+            for name in self._parquet_files_after(self.path, self.chunks_written):
+                os.remove(os.path.join(self.path, name))
+
+    def relocate(self, path: str):
+        """Continue writing to a new path, starting from a copy of the rows flushed so far"""
+        self._reset_disk(path)
+        if self.path is None:
+            # Move the chunks held in memory to disk
+            chunks, self.chunks = self.chunks, []
+            self.path = path
+            for chunk in chunks:
+                self._write(chunk)
+            return
+
+        if self.format == 'csv':
+            with open(self.path, 'rb') as src, open(path, 'wb') as dst:
+                dst.write(src.read(self.bytes_written))
+        else:
+            for i in range(self.chunks_written):
+                name = f"chunk_{i:06d}.parquet"
+                shutil.copyfile(os.path.join(self.path, name), os.path.join(path, name))
+        self.path = path
+
+    @staticmethod
+    def _parquet_files_after(path: str, first: int):
+        return [name for name in os.listdir(path)
+                if name.startswith('chunk_') and name.endswith('.parquet')
+                and int(name[6:12]) >= first]
+
+    def iter_arrays(self, every: int = 1) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Lazily yield (step indices, rows) chunk by chunk, keeping every n-th row"""
+        offset = 0
+        for chunk in self._with_buffer():
+            positions = np.arange(offset, offset + len(chunk))
+            keep = positions % every == 0
+            offset += len(chunk)
+            yield positions[keep], chunk[keep]
+
+    def iter_chunks(self, every: int = 1) -> Iterator['pd.DataFrame']:
+        """Lazily yield the recorded rows chunk by chunk as DataFrames"""
+        import pandas as pd
+        for index, rows in self.iter_arrays(every):
+            yield pd.DataFrame(rows, index=index)
+
+    def read_array(self, every: int = 1) -> np.ndarray:
+        """All recorded rows as one structured array, or every n-th row"""
+        chunks = [rows for _, rows in self.iter_arrays(every)]
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=self.dtype)
+
+    def read(self, every: int = 1) -> 'pd.DataFrame':
+        """Read all recorded rows back, or every n-th row for a downsampled view"""
+        import pandas as pd
+        chunks = list(self.iter_chunks(every))
+        if not chunks:
+            return pd.DataFrame(np.zeros(0, dtype=self.dtype))
+        return pd.concat(chunks)
+
+    def _with_buffer(self):
+        yield from self._stored_chunks()
+        if self.filled:
+            yield self.buffer[:self.filled].copy()
+
+    def _stored_chunks(self) -> Iterator[np.ndarray]:
+        if self.path is None:
+            yield from self.chunks
+            return
+        if self.chunks_written == 0:
+            return
+        import pandas as pd
+        if self.format == 'csv':
+            frames = pd.read_csv(self.path, chunksize=self.chunk_size, float_precision='round_trip',
+                                 dtype={name: self.dtype[name] for name in self.dtype.names})
+        else:
+            frames = (pd.read_parquet(os.path.join(self.path, f"chunk_{i:06d}.parquet"))
+                      for i in range(self.chunks_written))
+        for frame in frames:
+            yield frame.to_records(index=False).astype(self.dtype)
@@ -0,0 +1,345 @@
+"""Several data DAOs simulated side by side.
+
+Each DAO is a full simulation, on any engine, with its own dDT token,
+LiquidityPool and ThePie, and runs as a shard. Shards step independently
+and only synchronise every sync_every steps, when agents migrate between
+DAOs and convert their dDT through a SwapRouter. Between synchronisations
+the shards can run in parallel threads or worker processes, so total
+throughput scales with cores.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple, TYPE_CHECKING
+import numpy as np
+from config import CONFIG, MULTI_DAO_CONFIG
+from engines import create_simulation
+from liquidity_pool import LiquidityPool, SWAP_STATE, create_pool
+from metrics import MetricsSink
+from randomness import RandomStreams
+from sweep import apply_overrides, AGENT_TYPES
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+XDAI = 'xDAI'  # Router token of the shared quote currency; DAOs' dDT tokens go by DAO name
+
+# Degens' liquidity stays in their DAO's pool, so they never migrate
+MIGRANT_TYPES = ('organization', 'power_user', 'active_user', 'casual_user')
+
+PARALLEL_MODES = ('serial', 'thread', 'process')
+
+# Applied before each DAO's own overrides; shards report nothing themselves
+MULTI_DAO_DEFAULTS = {
+    'SIM_CONFIG.reporter': 'silent'
+}
+
+# (pool index, 'sell' base for quote or 'buy' base with quote)
+Path = Tuple[Tuple[int, str], ...]
+
+
+class SwapRouter:
+    """Best-output swaps across a graph of pools.
+
+    Each pool trades a base token, its dDT side, against a quote token, its
+    xDAI side. Every DAO's own pool pairs its dDT with XDAI, and bridge
+    pools pair two DAOs' dDT directly. A swap follows whichever simple path
+    of at most max_hops pools quotes the most out.
+    """
+    def __init__(self, max_hops: int = 3):
+        self.max_hops = max_hops
+        self.pools: List[Tuple[str, str, LiquidityPool]] = []
+        self._paths = {}
+
+    def add_pool(self, base: str, quote: str, pool: LiquidityPool):
+        self.pools.append((base, quote, pool))
+        self._paths.clear()
+
+    def paths(self, token_in: str, token_out: str) -> List[Path]:
+        """Every simple path from token_in to token_out"""
+        key = (token_in, token_out)
+        if key not in self._paths:
+            found = []
+
+            def extend(token, visited, legs):
+                if token == token_out:
+                    found.append(tuple(legs))
+                    return
+                if len(legs) == self.max_hops:
+                    return
+                for index, (base, quote, _) in enumerate(self.pools):
+                    for side, source, target in (('sell', base, quote), ('buy', quote, base)):
+                        if source == token and target not in visited:
+                            extend(target, visited | {target}, legs + [(index, side)])
+
+            extend(token_in, {token_in}, [])
+            self._paths[key] = found
+        return self._paths[key]
+
+    def quote_path(self, path: Path, amount_in: float) -> float:
+        # A simple path uses each pool once, so quoting leg by leg is exact
+        for index, side in path:
+            amount_in = self.pools[index][2].quote(amount_in, side)
+        return amount_in
+
+    def best_path(self, token_in: str, token_out: str, amount_in: float) -> Tuple[float, Path]:
+        """(amount out, path) of the best route; (0, ()) when there is none"""
+        best = (0.0, ())
+        for path in self.paths(token_in, token_out):
+            amount_out = self.quote_path(path, amount_in)
+            if amount_out > best[0]:
+                best = (amount_out, path)
+        return best
+
+    def swap(self, token_in: str, token_out: str, amount_in: float) -> Tuple[float, Path]:
+        """Swap amount_in along the best route and return (amount out, path)"""
+        if token_in == token_out:
+            return amount_in, ()
+        _, path = self.best_path(token_in, token_out, amount_in)
+        amount = amount_in if path else 0.0
+        for index, side in path:
+            pool = self.pools[index][2]
+            amount = pool.sell_ddt(amount) if side == 'sell' else pool.buy_ddt(amount)
+        return amount, path
+
+
+class Shard:
+    """One DAO's simulation and the calls the coordinator makes on it"""
+    def __init__(self, config: Dict[str, Any]):
+        self.sim = create_simulation(config)
+
+    def run(self, steps: int):
+        asyncio.run(self.sim.simulate(steps))
+
+    def status(self) -> Tuple[Tuple[float, ...], Dict[str, int]]:
+        """The pool's swap state and the live agents per type"""
+        pool = self.sim.liquidity_pool
+        return tuple(getattr(pool, field) for field in SWAP_STATE), self.sim.active_agents()
+
+    def emigrate(self, counts: Dict[str, int]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        return {agent_type: self.sim.emigrate(agent_type, count) for agent_type, count in counts.items() if count}
+
+    def arrive(self, pool_state: Tuple[float, ...], arrivals: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        """Apply the cross-DAO swaps made on this DAO's pool and add the arriving agents"""
+        pool = self.sim.liquidity_pool
+        for field, value in zip(SWAP_STATE, pool_state):
+            setattr(pool, field, value)
+        if self.sim.scheduler is not None:
+            self.sim.scheduler.check_pool()
+        for agent_type, (ddt, xdai) in arrivals.items():
+            self.sim.immigrate(agent_type, ddt, xdai)
+
+    def data(self) -> np.ndarray:
+        return self.sim.metrics.read_array()
+
+
+def _serve(connection, config: Dict[str, Any]):
+    """Worker process loop: run Shard calls sent over connection until None arrives"""
+    shard = Shard(config)
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        method, args = message
+        try:
+            connection.send((True, getattr(shard, method)(*args)))
+        except Exception as error:
+            connection.send((False, error))
+
+
+class ProcessShard:
+    """A Shard living in its own worker process, driven over a pipe"""
+    def __init__(self, config: Dict[str, Any], context):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child, config), daemon=True)
+        self.process.start()
+        child.close()
+
+    def send(self, method: str, *args):
+        self.connection.send((method, args))
+
+    def recv(self):
+        ok, result = self.connection.recv()
+        if not ok:
+            raise result
+        return result
+
+    def close(self):
+        self.connection.send(None)
+        self.process.join()
+
+
+class MultiDAOSimulation:
+    """Several DAO simulations linked by migrating agents and a SwapRouter.
+
+    config['daos'] maps each DAO's name to dotted-path overrides of the
+    base config, as in sweep.py; DAO i is seeded with i unless its
+    overrides set SIM_CONFIG.seed. Every sync_every steps each organization
+    and user moves to another DAO with probability migration_rate:
+    organizations to the DAO whose dDT is cheapest, users to one drawn at
+    random. Migrants' dDT is converted into the destination's dDT by the
+    router, one swap per (source, destination, type) group. Draws come from
+    the coordinator's own 'exchange' stream, apart from the shards' streams
+    even when the seeds match, and are keyed by step and DAO, so serial,
+    thread and process runs are identical.
+    """
+    def __init__(self, config: Dict[str, Any] = MULTI_DAO_CONFIG, base_config: Dict[str, Any] = CONFIG):
+        self.parallel = config.get('parallel', 'serial')
+        if self.parallel not in PARALLEL_MODES:
+            raise ValueError(f"Unknown parallel mode: {self.parallel}")
+        self.names = list(config['daos'])
+        self.sync_every = config.get('sync_every', 10)
+        self.migration_rate = config.get('migration_rate', 0.0)
+        self.random = RandomStreams(config.get('seed', 0))
+        self.current_step = 0
+
+        configs = [
+            apply_overrides(base_config, {**MULTI_DAO_DEFAULTS, 'SIM_CONFIG.seed': index, **overrides})
+            for index, overrides in enumerate(config['daos'].values())
+        ]
+
+        # The coordinator's copies of the DAOs' pools, brought up to date at
+        # every synchronisation, and the bridge pools, which only it holds
+        self.router = SwapRouter(config.get('max_hops', 3))
+        self.pools = [create_pool(dao_config['SIM_CONFIG']) for dao_config in configs]
+        for name, pool in zip(self.names, self.pools):
+            self.router.add_pool(name, XDAI, pool)
+        bridge_fee_rate = config.get('bridge_fee_rate', base_config['SIM_CONFIG']['fee_rate'])
+        for base, quote, base_reserve, quote_reserve in config.get('bridges', []):
+            self.router.add_pool(base, quote, LiquidityPool(bridge_fee_rate, base_reserve, quote_reserve))
+
+        self.migrations = MetricsSink({
+            'step': 'i8', 'source': 'i8', 'target': 'i8', 'agent_type': 'i8', 'agents': 'i8',
+            'ddt_in': 'f8', 'ddt_out': 'f8', 'xdai': 'f8', 'hops': 'i8'
+        })
+
+        self.executor = None
+        if self.parallel == 'process':
+            context = multiprocessing.get_context()
+            self.shards = [ProcessShard(dao_config, context) for dao_config in configs]
+        else:
+            self.shards = [Shard(dao_config) for dao_config in configs]
+            if self.parallel == 'thread':
+                self.executor = ThreadPoolExecutor(max_workers=len(self.shards))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Stop the worker processes or threads"""
+        if self.parallel == 'process':
+            for shard in self.shards:
+                shard.close()
+        elif self.executor is not None:
+            self.executor.shutdown()
+
+    def _call_all(self, method: str, args: List[tuple] = None) -> list:
+        """Call a Shard method on every shard, in parallel unless serial"""
+        args = args or [()] * len(self.shards)
+        if self.parallel == 'process':
+            for shard, shard_args in zip(self.shards, args):
+                shard.send(method, *shard_args)
+            return [shard.recv() for shard in self.shards]
+        if self.executor is not None:
+            return list(self.executor.map(lambda shard, shard_args: getattr(shard, method)(*shard_args),
+                                          self.shards, args))
+        return [getattr(shard, method)(*shard_args) for shard, shard_args in zip(self.shards, args)]
+
+    def run(self, steps: int):
+        """Step every DAO for steps steps, synchronising every sync_every steps"""
+        end = self.current_step + steps
+        while self.current_step < end:
+            chunk = min(self.sync_every - self.current_step % self.sync_every, end - self.current_step)
+            self._call_all('run', [(chunk,)] * len(self.shards))
+            self.current_step += chunk
+            if self.current_step % self.sync_every == 0 and self.migration_rate and len(self.shards) > 1:
+                self._exchange()
+
+    def _exchange(self):
+        """Move migrating agents between DAOs, routing their dDT across pools"""
+        statuses = self._call_all('status')
+        for pool, (state, _) in zip(self.pools, statuses):
+            for field, value in zip(SWAP_STATE, state):
+                setattr(pool, field, value)
+
+        counts = []
+        for index, (_, active) in enumerate(statuses):
+            draws = self.random.generator('exchange', self.current_step, index)
+            leaving = draws.binomial([active[agent_type] for agent_type in MIGRANT_TYPES], self.migration_rate)
+            counts.append(dict(zip(MIGRANT_TYPES, leaving.tolist())))
+        departures = self._call_all('emigrate', [(shard_counts,) for shard_counts in counts])
+
+        prices = np.array([pool.get_price() for pool in self.pools])
+        arrivals = [{} for _ in self.shards]
+        for source, migrants in enumerate(departures):
+            for agent_type, (ddt, xdai) in migrants.items():
+                targets = self._destinations(source, agent_type, len(ddt), prices)
+                for target in np.unique(targets).tolist():
+                    moving = targets == target
+                    moved = self._move(source, target, agent_type, ddt[moving], xdai[moving])
+                    arrived = arrivals[target].setdefault(agent_type, [])
+                    arrived.append(moved)
+
+        states = [tuple(getattr(pool, field) for field in SWAP_STATE) for pool in self.pools]
+        self._call_all('arrive', [
+            (state, {agent_type: tuple(np.concatenate(parts) for parts in zip(*groups))
+                     for agent_type, groups in shard_arrivals.items()})
+            for state, shard_arrivals in zip(states, arrivals)
+        ])
+
+    def _destinations(self, source: int, agent_type: str, count: int, prices: np.ndarray) -> np.ndarray:
+        """Destination DAO of each migrant"""
+        others = np.array([index for index in range(len(self.shards)) if index != source])
+        if agent_type == 'organization':
+            # Organizations buy dDT, so they move where it is cheapest
+            return np.full(count, others[np.argmin(prices[others])])
+        draws = self.random.generator('exchange', self.current_step, source, AGENT_TYPES.index(agent_type))
+        return draws.choice(others, count)
+
+    def _move(self, source: int, target: int, agent_type: str, ddt: np.ndarray,
+              xdai: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Convert a group of migrants' dDT into the target DAO's dDT in one routed swap"""
+        ddt_in = float(ddt.sum())
+        ddt_out, path = self.router.swap(self.names[source], self.names[target], ddt_in) if ddt_in else (0.0, ())
+        self.migrations.record(self.current_step, source, target, AGENT_TYPES.index(agent_type), len(ddt),
+                               ddt_in, ddt_out, float(xdai.sum()), len(path))
+        return (ddt * (ddt_out / ddt_in) if ddt_in else ddt), xdai
+
+    def get_simulation_data(self) -> Dict[str, 'pd.DataFrame']:
+        """Each DAO's per-step metrics, by DAO name"""
+        import pandas as pd
+        return {name: pd.DataFrame(data) for name, data in zip(self.names, self._call_all('data'))}
+
+    def get_migration_data(self) -> 'pd.DataFrame':
+        """One row per group of migrants moved together; source and target index the DAO names"""
+        return self.migrations.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the DAOs of config.MULTI_DAO_CONFIG side by side")
+    parser.add_argument('--steps', type=int, default=MULTI_DAO_CONFIG.get('steps', 500))
+    parser.add_argument('--parallel', choices=PARALLEL_MODES, default=MULTI_DAO_CONFIG.get('parallel', 'serial'))
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with MultiDAOSimulation({**MULTI_DAO_CONFIG, 'parallel': args.parallel}) as multi:
+        multi.run(args.steps)
+        data = multi.get_simulation_data()
+        migrations = multi.get_migration_data()
+    elapsed = time.perf_counter() - started
+
+    print(f"{len(data)} DAOs, {args.steps} steps in {elapsed:.2f}s ({args.parallel})")
+    for name, frame in data.items():
+        final = frame.iloc[-1]
+        agents = sum(int(final[f'active_{agent_type}s']) for agent_type in AGENT_TYPES)
+        print(f"{name}: price ${final['price']:.4f}, {agents} agents")
+    print(f"{int(migrations['agents'].sum()) if len(migrations) else 0} agents migrated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+import cProfile
+import json
+import pstats
+import tracemalloc
+from time import perf_counter
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
+from metrics import MetricsSink
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Phases of one simulated step, in the order simulate() runs them
+PHASES = ('fast_forward', 'entry', 'agents', 'pie', 'exits', 'metrics', 'report', 'checkpoint')
+
+# Pool entry points that trade or move liquidity, timed together as 'pool'
+POOL_METHODS = ('add_liquidity', 'collect_fees', 'buy_ddt', 'buy_exact_ddt', 'buy_exact_ddt_many',
+                'sell_ddt', 'sell_ddt_many', 'sell_ddt_runs')
+
+LEVELS = ('phases', 'detail')
+PYTHON_PROFILERS = ('cprofile', 'tracemalloc')
+TOP_ENTRIES = 25  # Functions or allocation sites listed when no profile_path is set
+
+
+class _NoPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+class _Timed:
+    """Stands in for a method, adding its wall time and calls to a [seconds, calls] counter"""
+    __slots__ = ('counter', 'method')
+
+    def __init__(self, counter: list, method):
+        self.counter = counter
+        self.method = method
+
+    def __call__(self, *args, **kwargs):
+        started = perf_counter()
+        result = self.method(*args, **kwargs)
+        counter = self.counter
+        counter[0] += perf_counter() - started
+        counter[1] += 1
+        return result
+
+
+class Profiler:
+    """Receives simulation phases; the base class times nothing.
+
+    With python='cprofile' or 'tracemalloc' every simulate() call runs
+    under that profiler. Its stats go to <path>.pstats or the allocation
+    hot spots to <path>.allocations.txt, or are printed without a path.
+    """
+    times_agents = False  # Whether engines should step agents through step_agents()
+
+    def __init__(self, python: Optional[str] = None, path: Optional[str] = None):
+        if python not in (None,) + PYTHON_PROFILERS:
+            raise ValueError(f"Unknown Python profiler: {python}")
+        self.python = python
+        self.path = path
+        self._cprofile = None
+        self._tracing = False  # Whether tracemalloc was started here
+
+    def instrument(self, sim):
+        pass
+
+    def phase(self, name: str):
+        return _NO_PHASE
+
+    def begin_step(self):
+        pass
+
+    def end_step(self, step: int):
+        pass
+
+    def hold(self):
+        """Keep the steps profiled from now on apart until release()"""
+
+    def release(self, keep: bool):
+        """Keep the held steps, or drop them when a fast-forward check undid them"""
+
+    def start(self, sim):
+        if self.python == 'cprofile':
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        elif self.python == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    def finish(self, sim):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            if self.path:
+                self._cprofile.dump_stats(f"{self.path}.pstats")
+            else:
+                pstats.Stats(self._cprofile).sort_stats('cumulative').print_stats(TOP_ENTRIES)
+            self._cprofile = None
+        elif self.python == 'tracemalloc' and tracemalloc.is_tracing():
+            top = tracemalloc.take_snapshot().statistics('lineno')[:TOP_ENTRIES]
+            if self._tracing:
+                tracemalloc.stop()
+                self._tracing = False
+            lines = [str(stat) for stat in top]
+            if self.path:
+                with open(f"{self.path}.allocations.txt", 'w') as f:
+                    f.write('\n'.join(lines) + '\n')
+            else:
+                print('\n'.join(lines))
+
+    def __getstate__(self):
+        # An active cProfile cannot be pickled into a checkpoint
+        state = self.__dict__.copy()
+        state['_cprofile'] = None
+        return state
+
+
+class PhaseProfiler(Profiler):
+    """Wall time and call counts per step phase, agent type and pool trade.
+
+    simulate() times each of PHASES, which costs a few microseconds per
+    step. With detail=True the object engine also times every agent's
+    step() under its agent type, the array engines time their per-type
+    trade handlers (PROFILED_METHODS), and pool trades are timed as
+    'pool' whoever makes them. Pool time therefore also counts in the
+    phase and agent type it happened in. Detail costs under a microsecond
+    per agent step and pool trade, which can slow the object engine by
+    about half. Each step's totals are one row of a MetricsSink, read
+    back as per-step data, a summary table or a Chrome trace that
+    speedscope also opens.
+    """
+    def __init__(self, agent_types: List[str], detail: bool = False, python: Optional[str] = None,
+                 path: Optional[str] = None, chunk_size: int = 10000):
+        super().__init__(python, path)
+        self.times_agents = detail
+        self.agent_types = list(agent_types)
+        self.labels = list(PHASES) + self.agent_types + ['pool']
+        columns = {'step': 'i8', 'start': 'f8', 'step_time': 'f8'}
+        for name in PHASES:
+            columns[f'{name}_start'] = 'f8'
+        for label in self.labels:
+            columns[f'{label}_time'] = 'f8'
+            columns[f'{label}_calls'] = 'i8'
+        self.steps = MetricsSink(columns, chunk_size=chunk_size)
+        self.counters = {label: [0.0, 0] for label in self.labels}  # This step's [seconds, calls] per label
+        self.starts = dict.fromkeys(PHASES, 0.0)
+        self.origin = None  # perf_counter() when profiling started; trace times are relative to it
+        self._step_started = 0.0
+        self._name = None
+        self._phase_started = 0.0
+        self._held = None  # Rows recorded before the held steps
+
+    def instrument(self, sim):
+        """With detail, time the pool's trades and the engine's PROFILED_METHODS on these instances"""
+        if not self.times_agents:
+            return
+        pool = sim.liquidity_pool
+        for name in POOL_METHODS:
+            setattr(pool, name, _Timed(self.counters['pool'], getattr(pool, name)))
+        for name, label in sim.PROFILED_METHODS.items():
+            setattr(sim, name, _Timed(self.counters[label], getattr(sim, name)))
+
+    async def step_agents(self, agents: List):
+        """Step agents in order, timing each under its agent type"""
+        counters = self.counters
+        for agent in agents:
+            started = perf_counter()
+            await agent.step()
+            counter = counters[agent.agent_type]
+            counter[0] += perf_counter() - started
+            counter[1] += 1
+
+    async def step_agent(self, agent):
+        await self.step_agents((agent,))
+
+    def phase(self, name: str):
+        self._name = name
+        return self
+
+    def __enter__(self):
+        self._phase_started = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        ended = perf_counter()
+        self.starts[self._name] = self._phase_started - self._step_started
+        counter = self.counters[self._name]
+        counter[0] += ended - self._phase_started
+        counter[1] += 1
+        return False
+
+    def start(self, sim):
+        if self.origin is None:
+            self.origin = perf_counter()
+        super().start(sim)
+
+    def begin_step(self):
+        self._step_started = perf_counter()
+
+    def end_step(self, step: int):
+        row = [step, self._step_started - self.origin, perf_counter() - self._step_started]
+        row.extend(self.starts[name] for name in PHASES)
+        for counter in self.counters.values():
+            row.extend(counter)
+            counter[0] = 0.0
+            counter[1] = 0
+        self.steps.record(*row)
+
+    def hold(self):
+        if self._held is None:
+            self._held = self.steps.rows
+
+    def release(self, keep: bool):
+        if self._held is not None and not keep:
+            self.steps.truncate(self._held)
+        self._held = None
+
+    def get_step_data(self, every: int = 1) -> 'pd.DataFrame':
+        """Per-step timings in seconds: each label's time and calls, and each phase's start within its step"""
+        return self.steps.read(every)
+
+    def summary(self) -> 'pd.DataFrame':
+        """Total and per-call wall time of every phase, agent type and the pool over all profiled steps"""
+        import pandas as pd
+        data = self.steps.read_array()
+        total = data['step_time'].sum()
+        rows = []
+        for label in self.labels:
+            kind = 'phase' if label in PHASES else 'pool' if label == 'pool' else 'agent_type'
+            seconds, calls = float(data[f'{label}_time'].sum()), int(data[f'{label}_calls'].sum())
+            rows.append({
+                'name': label,
+                'kind': kind,
+                'calls': calls,
+                'seconds': seconds,
+                'per_call_us': seconds / calls * 1e6 if calls else 0.0,
+                'share': seconds / total if total else 0.0
+            })
+        rows.append({'name': 'step', 'kind': 'total', 'calls': len(data), 'seconds': float(total),
+                     'per_call_us': total / len(data) * 1e6 if len(data) else 0.0, 'share': 1.0})
+        return pd.DataFrame(rows)
+
+    def trace_events(self, every: int = 1) -> List[Dict[str, Any]]:
+        """Chrome trace events: each step with its phases on one track and pool trades on another.
+
+        Agent types' times are laid out back to back inside the agents
+        phase, and a step's pool time from the start of the step, so they
+        show where the time went rather than when each call ran.
+        """
+        events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': 0, 'tid': 0, 'args': {'name': 'simulation'}},
+            {'name': 'thread_name', 'ph': 'M', 'pid': 0, 'tid': 1, 'args': {'name': 'pool trades'}}
+        ]
+
+        def add(name: str, category: str, start: float, seconds: float, tid: int = 0, **args):
+            events.append({'name': name, 'cat': category, 'ph': 'X', 'pid': 0, 'tid': tid,
+                           'ts': start * 1e6, 'dur': seconds * 1e6, 'args': args})
+
+        for row in self.steps.read_array(every).tolist():
+            record = dict(zip(self.steps.dtype.names, row))
+            step, start = record['step'], record['start']
+            add(f"step {step}", 'step', start, record['step_time'], step=step)
+            for name in PHASES:
+                if not record[f'{name}_calls']:
+                    continue
+                phase_start = start + record[f'{name}_start']
+                add(name, 'phase', phase_start, record[f'{name}_time'], step=step)
+                if name == 'agents':
+                    offset = phase_start
+                    for agent_type in self.agent_types:
+                        if record[f'{agent_type}_calls']:
+                            add(agent_type, 'agent_type', offset, record[f'{agent_type}_time'],
+                                step=step, calls=record[f'{agent_type}_calls'])
+                            offset += record[f'{agent_type}_time']
+            if record['pool_calls']:
+                add('pool', 'pool', start, record['pool_time'], tid=1, step=step, calls=record['pool_calls'])
+        return events
+
+    def write_trace(self, path: str, every: int = 1):
+        """Write a Chrome trace (chrome://tracing, Perfetto or speedscope) of every n-th step"""
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.trace_events(every), 'displayTimeUnit': 'ms'}, f)
+
+    def finish(self, sim):
+        super().finish(sim)
+        self.steps.flush()
+        if self.path:
+            self.write_trace(f"{self.path}.trace.json")
+
+
+def create_profiler(sim_config: Dict[str, Any], agent_types: List[str]) -> Profiler:
+    """Build the profiler selected by SIM_CONFIG['profile'] and ['profile_python']"""
+    level = sim_config.get('profile')
+    python = sim_config.get('profile_python')
+    path = sim_config.get('profile_path')
+    if level is None:
+        return Profiler(python, path)
+    if level not in LEVELS:
+        raise ValueError(f"Unknown profile level: {level}")
+    return PhaseProfiler(agent_types, level == 'detail', python, path)
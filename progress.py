@@ -0,0 +1,153 @@
+import json
+import sys
+import time
+from typing import Dict, Any
+
+
+class Reporter:
+    """Receives simulation progress; the base class reports nothing.
+
+    step() is called once per simulated step with the per-type averages
+    already computed for the step's metrics, so reporters never rescan
+    agents. Between hold() and release() output is held back, so that
+    steps a fast-forward check undoes are never reported.
+    """
+    _held = None  # Held back (stream, text) pairs
+
+    def hold(self):
+        if self._held is None:
+            self._held = []
+
+    def release(self, keep: bool):
+        """Write the held output, or drop it"""
+        held, self._held = self._held or [], None
+        if keep:
+            for stream, text in held:
+                stream.write(text)
+
+    def _write(self, text: str, stream=None):
+        stream = stream or sys.stdout
+        if self._held is not None:
+            self._held.append((stream, text))
+        else:
+            stream.write(text)
+
+    def _print(self, text: str = ''):
+        self._write(text + '\n')
+
+    def start(self, sim, steps: int):
+        pass
+
+    def step(self, sim, step: int, steps: int, averages: Dict[str, float]):
+        pass
+
+    def finish(self, sim):
+        pass
+
+
+class SilentReporter(Reporter):
+    """Reports nothing"""
+
+
+class PrintReporter(Reporter):
+    """Prints every step and a summary every summary_every steps"""
+    def __init__(self, summary_every: int = 10):
+        self.summary_every = summary_every
+
+    def step(self, sim, step: int, steps: int, averages: Dict[str, float]):
+        self._print(f"Step {step + 1}/{steps}")
+        if (step + 1) % self.summary_every == 0:
+            self.print_summary(sim, step, averages)
+
+    def print_summary(self, sim, step: int, averages: Dict[str, float]):
+        active = sim.active_agents()
+        total = sum(active.values())
+        self._print(f"\nStep {step + 1} Summary:")
+        self._print(f"Current token price: ${sim.liquidity_pool.get_price():.2f}")
+
+        self._print("\nAgent Distribution:")
+        for agent_type, count in active.items():
+            percentage = (count / total * 100) if total > 0 else 0
+            target_percentage = sim.proportions[agent_type] * 100
+            diff = percentage - target_percentage
+            self._print(f"Active {agent_type}s: {count} ({percentage:.1f}% vs target {target_percentage:.1f}%, diff: {diff:+.1f}%)")
+
+        # Print average xDAI holdings for each agent type
+        self._print("\nAverage xDAI Holdings per Agent:")
+        for agent_type, avg_xdai in averages.items():
+            self._print(f"{agent_type}: {avg_xdai:.2f} xDAI")
+        self._print("")
+
+
+class ThrottledReporter(Reporter):
+    """Prints one progress line at most every `interval` seconds"""
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+
+    def start(self, sim, steps: int):
+        self.started = self.last = time.monotonic()
+
+    def step(self, sim, step: int, steps: int, averages: Dict[str, float]):
+        now = time.monotonic()
+        if now - self.last >= self.interval or step + 1 == steps:
+            self.last = now
+            rate = (step + 1) / max(now - self.started, 1e-9)
+            self._print(f"Step {step + 1}/{steps} ({rate:.1f} steps/s): "
+                  f"price ${sim.liquidity_pool.get_price():.4f}, "
+                  f"{sum(sim.active_agents().values())} agents")
+
+
+class JsonLinesReporter(Reporter):
+    """Streams one JSON event per `every` steps to a file or stream"""
+    def __init__(self, path: str = None, every: int = 1, stream=None):
+        self.path = path
+        self.every = every
+        self.stream = stream
+
+    def start(self, sim, steps: int):
+        self.output = open(self.path, 'a') if self.path else (self.stream or sys.stdout)
+        self._emit({'event': 'start', 'steps': steps})
+
+    def step(self, sim, step: int, steps: int, averages: Dict[str, float]):
+        if (step + 1) % self.every and step + 1 != steps:
+            return
+        self._emit({
+            'event': 'step',
+            'step': step + 1,
+            'steps': steps,
+            'price': sim.liquidity_pool.get_price(),
+            'lp_ddt_reserve': sim.liquidity_pool.ddt_reserve,
+            'lp_xdai_reserve': sim.liquidity_pool.xdai_reserve,
+            'pie_ddt': sim.the_pie.total_ddt,
+            'agents': sim.active_agents(),
+            'avg_xdai': averages
+        })
+
+    def finish(self, sim):
+        self._emit({'event': 'finish'})
+        if self.path:
+            self.output.close()
+        self.output = None
+
+    def _emit(self, event: Dict[str, Any]):
+        self._write(json.dumps(event) + '\n', self.output)
+
+
+REPORTERS = {
+    'print': PrintReporter,
+    'silent': SilentReporter,
+    'throttled': ThrottledReporter,
+    'jsonl': JsonLinesReporter
+}
+
+
+def create_reporter(sim_config: Dict[str, Any]) -> Reporter:
+    """Build the reporter selected by SIM_CONFIG['reporter']"""
+    kind = sim_config.get('reporter', 'print')
+    if kind == 'throttled':
+        return ThrottledReporter(interval=sim_config.get('report_interval', 5.0))
+    if kind == 'jsonl':
+        return JsonLinesReporter(path=sim_config.get('report_path'), every=sim_config.get('report_every', 1))
+    if kind not in REPORTERS:
+        raise ValueError(f"Unknown reporter: {kind}")
+    return REPORTERS[kind]()
@@ -0,0 +1,200 @@
+import argparse
+import glob
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple, Union, TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from matplotlib.figure import Figure
+
+AGENT_TYPES = ['degen_user', 'organization', 'power_user', 'active_user', 'casual_user']
+MAX_POINTS = 2000  # Points kept per plotted series
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `threshold` representative points"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        # Keep the point forming the largest triangle with the last kept
+        # point and the next bucket's average
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y: np.ndarray, buckets: int) -> np.ndarray:
+    """Indices of the minimum and maximum of each of `buckets` equal slices"""
+    n = len(y)
+    if buckets * 2 >= n:
+        return np.arange(n)
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    picks = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        chunk = y[lo:hi]
+        picks.extend((lo + int(np.argmin(chunk)), lo + int(np.argmax(chunk))))
+    return np.unique(picks)
+
+
+def downsample(x: np.ndarray, y: np.ndarray, max_points: int = MAX_POINTS) -> Tuple[np.ndarray, np.ndarray]:
+    """Min/max-preserving LTTB downsampling (MinMaxLTTB).
+
+    Each bucket's extremes are preselected first so spikes survive, then
+    LTTB picks max_points of them; the global min and max are always kept.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) <= max_points:
+        return x, y
+    candidates = minmax_indices(y, max_points * 2)
+    keep = candidates[lttb(x[candidates], y[candidates], max_points)]
+    keep = np.union1d(keep, [int(np.argmin(y)), int(np.argmax(y))])
+    return x[keep], y[keep]
+
+
+def plot_simulation(data: 'pd.DataFrame', title: Optional[str] = None,
+                    max_points: int = MAX_POINTS) -> 'Figure':
+    """The four-panel results figure, drawn with the non-interactive Agg backend"""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(15, 10))
+    FigureCanvasAgg(fig)
+    steps = data.index.to_numpy()
+    axes = fig.subplots(2, 2)
+
+    def plot(ax, column, label=None):
+        ax.plot(*downsample(steps, data[column].to_numpy(), max_points), label=label)
+
+    # Price over time
+    plot(axes[0, 0], 'price')
+    axes[0, 0].set(title='dDT Price Over Time', xlabel='Step', ylabel='Price (xDAI)')
+
+    # LP Reserves over time
+    plot(axes[0, 1], 'lp_dDT_reserve', 'dDT')
+    plot(axes[0, 1], 'lp_xDAI_reserve', 'xDAI')
+    axes[0, 1].set(title='LP Reserves Over Time', xlabel='Step', ylabel='Amount')
+    axes[0, 1].legend()
+
+    # xDAI balances over time
+    for agent_type in AGENT_TYPES:
+        plot(axes[1, 0], f'xdai_{agent_type}', agent_type)
+    axes[1, 0].set(title='Average xDAI Holdings per Agent Type', xlabel='Step', ylabel='xDAI per Agent')
+    axes[1, 0].legend()
+
+    # Agent counts over time
+    for agent_type in AGENT_TYPES:
+        plot(axes[1, 1], f'active_{agent_type}s', agent_type)
+    axes[1, 1].set(title='Agent Counts Over Time', xlabel='Step', ylabel='Count')
+    axes[1, 1].legend()
+
+    if title:
+        fig.suptitle(title)
+    fig.tight_layout()
+    return fig
+
+
+def save_simulation_plot(data: 'pd.DataFrame', path: str, dpi: int = 300, max_points: int = MAX_POINTS):
+    plot_simulation(data, max_points=max_points).savefig(path, dpi=dpi, bbox_inches='tight')
+
+
+def _load(source: Union[str, 'pd.DataFrame']) -> 'pd.DataFrame':
+    if isinstance(source, str):
+        import pandas as pd
+        return pd.read_csv(source)
+    return source
+
+
+def render_page(label: str, source: Union[str, 'pd.DataFrame'], dpi: int, max_points: int) -> bytes:
+    """Render one run's page to PNG bytes; runs inside a worker process"""
+    buffer = io.BytesIO()
+    fig = plot_simulation(_load(source), title=label, max_points=max_points)
+    fig.savefig(buffer, format='png', dpi=dpi)
+    return buffer.getvalue()
+
+
+def render_report(runs: Dict[str, Union[str, 'pd.DataFrame']], output: str, dpi: int = 150,
+                  max_points: int = MAX_POINTS, workers: Optional[int] = None):
+    """Render many runs into one multi-page PDF, one page per run.
+
+    Runs are given as label -> metrics CSV path (or DataFrame). Pages are
+    loaded, downsampled and rasterised in parallel worker processes; the
+    main process only stitches the pages together.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.image import imread
+
+    labels = list(runs)
+    args = [(label, runs[label], dpi, max_points) for label in labels]
+    if workers == 1 or len(runs) == 1:
+        pages = [render_page(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            pages = list(pool.map(render_page, *zip(*args)))
+
+    with PdfPages(output) as pdf:
+        for page in pages:
+            image = imread(io.BytesIO(page), format='png')
+            height, width = image.shape[:2]
+            fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+            fig.figimage(image)
+            pdf.savefig(fig, dpi=dpi)
+
+
+def sweep_runs(results_path: str, metrics_dir: str) -> Dict[str, str]:
+    """label -> metrics CSV for every sweep run whose metrics were kept"""
+    runs = {}
+    with open(results_path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            path = os.path.join(metrics_dir, f"{record['run_id']}.csv")
+            if os.path.exists(path):
+                overrides = ', '.join(f"{key.split('.')[-1]}={value}" for key, value in record['overrides'].items())
+                runs[f"{overrides} seed={record['seed']}".strip(', ')] = path
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render simulation metrics into a multi-page PDF report")
+    parser.add_argument('metrics', nargs='*', help="Metrics CSV files (SIM_CONFIG['metrics_path'] output)")
+    parser.add_argument('--sweep', help="Sweep results file; pages are labelled with each run's overrides")
+    parser.add_argument('--metrics-dir', default='sweep_metrics', help="Per-run metrics written by sweep.py")
+    parser.add_argument('--out', default='simulation_report.pdf')
+    parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--max-points', type=int, default=MAX_POINTS)
+    parser.add_argument('--workers', type=int, help="Worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    runs = {}
+    if args.sweep:
+        runs.update(sweep_runs(args.sweep, args.metrics_dir))
+    for pattern in args.metrics:
+        for path in sorted(glob.glob(pattern)):
+            runs[os.path.basename(path)] = path
+    if not runs:
+        parser.error("no runs to render")
+
+    render_report(runs, args.out, dpi=args.dpi, max_points=args.max_points, workers=args.workers)
+    print(f"Wrote {len(runs)} pages to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,36 @@
+import argparse
 import asyncio
-import matplotlib.pyplot as plt
-from autogen_agents import DataDAOGroupChat
+from engines import create_simulation
 from config import CONFIG
+from profiling import LEVELS, PYTHON_PROFILERS
+from report import save_simulation_plot
 
-async def main():
+async def main(args):
     # Initialize the simulation
-    sim = DataDAOGroupChat(CONFIG)
+    sim_config = CONFIG['SIM_CONFIG']
+    sim_config.update(profile=args.profile, profile_python=args.profile_python, profile_path=args.profile_path)
+    sim = create_simulation(CONFIG)
     
     # Run the simulation
-    await sim.simulate(CONFIG['SIM_CONFIG']['total_steps'])
+    await sim.simulate(sim_config['total_steps'])
     
     # Get simulation data
     sim_data = sim.get_simulation_data()
     
-    # Create figure with subplots
-    plt.figure(figsize=(15, 10))
+    # Render the results headlessly; long runs are downsampled before plotting
+    save_simulation_plot(sim_data, 'simulation_results.png', dpi=300)
+    print("Saved plot to simulation_results.png")
     
-    # Price over time
-    plt.subplot(2, 2, 1)
-    plt.plot(sim_data['price'])
-    plt.title('dDT Price Over Time')
-    plt.xlabel('Step')
-    plt.ylabel('Price (xDAI)')
-    
-    # LP Reserves over time
-    plt.subplot(2, 2, 2)
-    plt.plot(sim_data['lp_dDT_reserve'], label='dDT')
-    plt.plot(sim_data['lp_xDAI_reserve'], label='xDAI')
-    plt.title('LP Reserves Over Time')
-    plt.xlabel('Step')
-    plt.ylabel('Amount')
-    plt.legend()
-    
-    # xDAI balances over time
-    plt.subplot(2, 2, 3)
-    agent_types = ['degen_user', 'organization', 'power_user', 'active_user', 'casual_user']
-    for agent_type in agent_types:
-        plt.plot(sim_data[f'xdai_{agent_type}'], label=agent_type)
-    plt.title('Average xDAI Holdings per Agent Type')
-    plt.xlabel('Step')
-    plt.ylabel('xDAI per Agent')
-    plt.legend()
-    
-    # Agent counts over time
-    plt.subplot(2, 2, 4)
-    for agent_type in agent_types:
-        plt.plot(sim_data[f'active_{agent_type}s'], label=agent_type)
-    plt.title('Agent Counts Over Time')
-    plt.xlabel('Step')
-    plt.ylabel('Count')
-    plt.legend()
-    
-    plt.tight_layout()
-    
-    # Save the plot
-    plt.savefig('simulation_results.png', dpi=300, bbox_inches='tight')
-    
-    # Display the plot
-    plt.show()
+    if args.profile:
+        print(sim.profiler.summary().to_string(index=False))
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Run the simulation configured in config.py")
+    parser.add_argument('--profile', choices=LEVELS, default=CONFIG['SIM_CONFIG'].get('profile'),
+                        help="Time each step's phases, or with 'detail' also agent types and pool trades")
+    parser.add_argument('--profile-python', choices=PYTHON_PROFILERS,
+                        default=CONFIG['SIM_CONFIG'].get('profile_python'),
+                        help="Run the simulation under cProfile or tracemalloc")
+    parser.add_argument('--profile-path', default=CONFIG['SIM_CONFIG'].get('profile_path'),
+                        help="Write <path>.trace.json, .pstats or .allocations.txt instead of printing")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,152 @@
+import heapq
+from typing import List
+
+
+class Scheduler:
+    """Steps only the agents that are awake, in join order.
+
+    An agent that has nothing to do goes to sleep until a wake-up step
+    (a timing wheel bucketed by step), until the pool price falls to a
+    threshold, until pool fees accrue, or until an event such as a pie
+    share wakes it explicitly. Sleeping agents cost nothing per step, so a
+    step's cost is proportional to the number of awake agents.
+
+    Waking an agent early is always safe, because its step re-checks its
+    own conditions; the scheduler only guarantees never to skip a turn at
+    which the agent would have acted. Pool conditions are therefore
+    re-checked after every stepped agent and after the pie distribution,
+    and an agent woken mid-step still acts this step if its turn has not
+    come yet.
+    """
+    def __init__(self, liquidity_pool):
+        self.liquidity_pool = liquidity_pool
+        self.step = 0
+        self.cursor = -1  # Join index being stepped, -1 between steps
+        self.awake = []  # Awake flag per join index
+        self.generation = []  # Bumped on every sleep so stale wake-ups are ignored
+        self.queue = []  # Heap of join indices still to step this step
+        self.next_awake = []  # Join indices to step next step
+        self.timers = {}  # Step -> [(index, generation)] due then
+        self.price_watchers = []  # Heap of (-price threshold, index, generation)
+        self.fee_watchers = []  # [(index, generation)] woken when fees accrue
+        self.fee_mark = liquidity_pool.fee_per_share  # fee_per_share the fee watchers saw
+        self._slept = False
+        self.profiler = None  # PhaseProfiler timing each agent's step, when profiling
+
+    def add(self, agent) -> int:
+        """Register a newly joined agent; it is awake from the next step on"""
+        index = len(self.awake)
+        agent.scheduler = self
+        agent.schedule_index = index
+        self.awake.append(True)
+        self.generation.append(0)
+        self.next_awake.append(index)
+        return index
+
+    def __len__(self) -> int:
+        """Number of agents awake for the next step"""
+        return len(self.next_awake) + len(self.queue)
+
+    def sleep(self, index: int):
+        """Put an agent to sleep until wake() is called for it"""
+        self.awake[index] = False
+        self.generation[index] += 1
+        self._slept = True
+
+    def sleep_until(self, index: int, step: int):
+        """Sleep until the given step"""
+        self.sleep(index)
+        self.timers.setdefault(step, []).append((index, self.generation[index]))
+
+    def sleep_until_price(self, index: int, price: float):
+        """Sleep until the pool price is at or below price"""
+        self.sleep(index)
+        heapq.heappush(self.price_watchers, (-price, index, self.generation[index]))
+        if len(self.price_watchers) > 2 * len(self.awake) + 64:
+            # Drop entries of agents woken some other way since
+            self.price_watchers = [entry for entry in self.price_watchers
+                                   if entry[2] == self.generation[entry[1]] and not self.awake[entry[1]]]
+            heapq.heapify(self.price_watchers)
+
+    def sleep_until_fees(self, index: int):
+        """Sleep until the pool accrues new fees"""
+        self.sleep(index)
+        if not self.fee_watchers:
+            self.fee_mark = self.liquidity_pool.fee_per_share
+        self.fee_watchers.append((index, self.generation[index]))
+
+    def wake(self, index: int, generation: int = None):
+        if self.awake[index] or (generation is not None and generation != self.generation[index]):
+            return
+        self.awake[index] = True
+        if index > self.cursor >= 0:
+            # Its turn in this step is still to come
+            heapq.heappush(self.queue, index)
+        else:
+            self.next_awake.append(index)
+
+    def check_pool(self):
+        """Wake agents whose price or fee condition now holds"""
+        pool = self.liquidity_pool
+        if self.price_watchers:
+            price = pool.get_price()
+            while self.price_watchers and -self.price_watchers[0][0] >= price:
+                _, index, generation = heapq.heappop(self.price_watchers)
+                self.wake(index, generation)
+
+        if self.fee_watchers and pool.fee_per_share != self.fee_mark:
+            self.fee_mark = pool.fee_per_share
+            watchers, self.fee_watchers = self.fee_watchers, []
+            for index, generation in watchers:
+                self.wake(index, generation)
+
+    def compact(self, kept: List[int], agents: List):
+        """Forget agents that left between steps.
+
+        kept lists the join indices that stay, in order, and agents the
+        compacted agent list; survivors are renumbered by their position.
+        """
+        index_of = {old: new for new, old in enumerate(kept)}
+        self.awake = [self.awake[old] for old in kept]
+        self.generation = [self.generation[old] for old in kept]
+        self.next_awake = [index_of[old] for old in self.next_awake if old in index_of]
+        self.timers = {step: [(index_of[old], generation) for old, generation in entries if old in index_of]
+                       for step, entries in self.timers.items()}
+        self.price_watchers = [(price, index_of[old], generation)
+                               for price, old, generation in self.price_watchers if old in index_of]
+        heapq.heapify(self.price_watchers)
+        self.fee_watchers = [(index_of[old], generation)
+                             for old, generation in self.fee_watchers if old in index_of]
+        for index, agent in enumerate(agents):
+            agent.schedule_index = index
+
+    async def run(self, agents: List):
+        """Step the awake agents in join order"""
+        for index, generation in self.timers.pop(self.step, ()):
+            self.wake(index, generation)
+
+        # Agents woken mid-step join self.queue and are merged in join order
+        order = sorted(self.next_awake)
+        self.next_awake = []
+        queue = self.queue = []
+        for index in order:
+            while queue and queue[0] < index:
+                await self._step_agent(agents, heapq.heappop(queue))
+            await self._step_agent(agents, index)
+        while queue:
+            await self._step_agent(agents, heapq.heappop(queue))
+
+        self.cursor = -1
+        self.step += 1
+
+    async def _step_agent(self, agents: List, index: int):
+        self.cursor = index
+        self._slept = False
+        if self.profiler is None:
+            await agents[index].step()
+        else:
+            await self.profiler.step_agent(agents[index])
+        if not self._slept:
+            self.next_awake.append(index)
+        if self.price_watchers or self.fee_watchers:
+            self.check_pool()
@@ -0,0 +1,417 @@
+"""Local simulation service with an on-disk result cache.
+
+Runs are requested as dotted-path overrides of CONFIG (as in sweep.py),
+a seed and a number of steps, and executed in a pool of worker
+processes. Each finished run is cached under a hash of its full config,
+its seed, the source code and its steps, so a repeated request returns
+immediately. Every cached run also keeps a checkpoint of its final
+state: a request for more steps of a cached config and seed continues
+from the longest cached run instead of step 0. The cache is bounded in
+bytes and evicts the least recently used runs.
+
+    python service.py run --set SIM_CONFIG.fee_rate=0.01 --steps 3000
+    python service.py serve --port 8765
+    curl -X POST localhost:8765/runs -d '{"overrides": {"SIM_CONFIG.fee_rate": 0.01}, "steps": 3000}'
+"""
+import argparse
+import asyncio
+import copy
+import functools
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Tuple
+from checkpoint import load_checkpoint, save_checkpoint
+from config import CONFIG, SERVICE_CONFIG
+from engines import create_simulation
+from sweep import apply_overrides, code_version, summarize
+
+# Applied before each request's own overrides. Runs keep their metrics in
+# memory so the checkpoint carries them, and report nothing themselves.
+SERVICE_DEFAULTS = {
+    'SIM_CONFIG.journal_retention': 'aggregates',
+    'SIM_CONFIG.reporter': 'silent',
+    'SIM_CONFIG.metrics_path': None,
+    'SIM_CONFIG.agent_metrics_path': None,
+    'SIM_CONFIG.checkpoint_every': 0,
+    'SIM_CONFIG.profile': None,
+    'SIM_CONFIG.profile_python': None
+}
+
+# Files of one cache entry
+RESULT_FILE = 'result.json'
+METRICS_FILE = 'metrics.csv'
+CHECKPOINT_FILE = 'final.ckpt'
+
+# Run keys as run_key() makes them; anything else never names an entry
+KEY_PATTERN = re.compile(r'[0-9a-f]{20}-[0-9]+')
+
+
+def lineage(config: Dict[str, Any]) -> str:
+    """Hash of everything that decides a run's trajectory except its length.
+
+    Runs of one lineage differ only in steps, so each is a prefix of the
+    longer ones. The config is hashed as canonical JSON, which includes
+    its seed; total_steps is left out since the request gives the steps.
+    Fast-forward runs are the exception: a jump is cut short by the end
+    of the run, so they are never continued from a shorter one.
+    """
+    config = copy.deepcopy(config)
+    config['SIM_CONFIG'].pop('total_steps', None)
+    key = json.dumps({'config': config, 'code': code_version()}, sort_keys=True, default=repr)
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def run_key(config: Dict[str, Any], steps: int) -> str:
+    """Cache key of a run: its lineage and steps"""
+    return f"{lineage(config)}-{steps}"
+
+
+class ResultCache:
+    """Finished runs on disk, one directory per run key.
+
+    An entry holds the run's result record (RESULT_FILE), its per-step
+    simulation data (METRICS_FILE) and a checkpoint of its final state
+    (CHECKPOINT_FILE). Entries are written to a temporary directory and
+    renamed into place, so readers never see a partial entry. Reading an
+    entry touches its directory, and evict() removes entries by oldest
+    touch until the cache fits max_bytes.
+    """
+    def __init__(self, directory: str, max_bytes: int):
+        if max_bytes <= 0:
+            raise ValueError(f"cache_max_bytes must be positive, got {max_bytes}")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str, *names: str) -> str:
+        return os.path.join(self.directory, key, *names)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The cached result record of key, or None"""
+        try:
+            with open(self.path(key, RESULT_FILE)) as f:
+                result = json.load(f)
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            return None
+        return result
+
+    def longest_prefix(self, config: Dict[str, Any], steps: int) -> Optional[Tuple[str, int]]:
+        """The cached run of config's lineage with the most steps below steps, as (key, steps)"""
+        best = None
+        for entry in glob.glob(self.path(f"{lineage(config)}-*")):
+            key = os.path.basename(entry)
+            cached_steps = key.rpartition('-')[2]
+            if not cached_steps.isdigit() or not os.path.exists(os.path.join(entry, CHECKPOINT_FILE)):
+                continue
+            if int(cached_steps) < steps and (best is None or int(cached_steps) > best[1]):
+                best = (key, int(cached_steps))
+        return best
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Every complete entry's key, size in bytes and last use, least recently used first"""
+        entries = []
+        for entry in glob.glob(self.path('*')):
+            if not os.path.exists(os.path.join(entry, RESULT_FILE)):
+                continue  # Being written
+            size = sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+            entries.append({'key': os.path.basename(entry), 'bytes': size, 'used': os.path.getmtime(entry)})
+        return sorted(entries, key=lambda entry: entry['used'])
+
+    def evict(self, keep: frozenset = frozenset()) -> List[str]:
+        """Remove least recently used entries, except those in keep, until the cache fits"""
+        entries = self.entries()
+        total = sum(entry['bytes'] for entry in entries)
+        evicted = []
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry['key'] in keep:
+                continue
+            shutil.rmtree(self.path(entry['key']), ignore_errors=True)
+            total -= entry['bytes']
+            evicted.append(entry['key'])
+        return evicted
+
+    def clear(self):
+        for entry in self.entries():
+            shutil.rmtree(self.path(entry['key']), ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self.entries()
+        return {'directory': self.directory, 'entries': len(entries),
+                'bytes': sum(entry['bytes'] for entry in entries), 'max_bytes': self.max_bytes}
+
+
+def run_entry(config: Dict[str, Any], steps: int, key: str, directory: str,
+              prefix: Optional[str] = None) -> Dict[str, Any]:
+    """Run one simulation and store it as cache entry key; executed inside a worker process.
+
+    With prefix, the run continues from that entry's final checkpoint.
+    Returns the run's result record.
+    """
+    started = time.perf_counter()
+    if prefix is not None:
+        sim = load_checkpoint(os.path.join(directory, prefix, CHECKPOINT_FILE))
+    else:
+        sim = create_simulation(config)
+    resumed_from = sim.current_step
+    asyncio.run(sim.simulate(steps - resumed_from))
+
+    result = {
+        'key': key,
+        'steps': steps,
+        'seed': config['SIM_CONFIG'].get('seed', 0),
+        'resumed_from': resumed_from,
+        'seconds': time.perf_counter() - started,
+        'summary': summarize(sim)
+    }
+    if sim.stats is not None:
+        result['distributions'] = sim.stats.to_dict()
+
+    # Written aside and renamed into place; a concurrent identical run keeps the first
+    tmp_path = os.path.join(directory, f".{key}.{os.getpid()}.tmp")
+    os.makedirs(tmp_path, exist_ok=True)
+    sim.get_simulation_data().to_csv(os.path.join(tmp_path, METRICS_FILE), index=False)
+    save_checkpoint(sim, os.path.join(tmp_path, CHECKPOINT_FILE))
+    with open(os.path.join(tmp_path, RESULT_FILE), 'w') as f:
+        json.dump(result, f)
+    try:
+        os.replace(tmp_path, os.path.join(directory, key))
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return result
+
+
+class SimulationService:
+    """Runs requested simulations in worker processes, through a ResultCache.
+
+    submit() returns a Future of the run's result record. A cached run
+    resolves at once, with 'cached' set. A run already in progress is
+    shared by every request for it. Otherwise the run starts from the
+    longest cached run of its lineage, if any, which is kept from eviction
+    until the new run is stored. Fast-forward runs always start from step 0.
+    """
+    def __init__(self, cache: ResultCache, base_config: Dict[str, Any] = CONFIG,
+                 max_workers: Optional[int] = None):
+        self.cache = cache
+        self.base_config = base_config
+        self.executor = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count())
+        self.running = {}  # Run key -> Future
+        self.prefixes = {}  # Run key -> key of the cached run it continues
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def config(self, overrides: Dict[str, Any], seed: Optional[int] = None) -> Dict[str, Any]:
+        """The full config of a request; raises KeyError for unknown override paths"""
+        config = apply_overrides(self.base_config, {**SERVICE_DEFAULTS, **overrides})
+        if seed is not None:
+            config['SIM_CONFIG']['seed'] = seed
+        return config
+
+    def key(self, overrides: Dict[str, Any], seed: Optional[int] = None, steps: Optional[int] = None) -> str:
+        config = self.config(overrides, seed)
+        return run_key(config, steps or config['SIM_CONFIG']['total_steps'])
+
+    def submit(self, overrides: Dict[str, Any], seed: Optional[int] = None,
+               steps: Optional[int] = None) -> Future:
+        """Request a run of base_config with dotted-path overrides; steps defaults to total_steps"""
+        config = self.config(overrides, seed)
+        steps = steps or config['SIM_CONFIG']['total_steps']
+        if steps <= 0:
+            raise ValueError(f"steps must be positive, got {steps}")
+        key = run_key(config, steps)
+        with self._lock:
+            if key in self.running:
+                return self.running[key]
+            result = self.cache.get(key)
+            if result is not None:
+                future = Future()
+                future.set_result({**result, 'cached': True})
+                return future
+            prefix = None
+            if not config['SIM_CONFIG'].get('fast_forward', False):
+                # Fast-forward jumps depend on where the run ends, so a prefix is no shortcut
+                prefix = self.cache.longest_prefix(config, steps)
+            if prefix is not None:
+                self.prefixes[key] = prefix[0]
+                os.utime(self.cache.path(prefix[0]))
+            future = self.executor.submit(run_entry, config, steps, key, self.cache.directory,
+                                          prefix[0] if prefix else None)
+            self.running[key] = future
+        future.add_done_callback(functools.partial(self._finished, key))
+        return future
+
+    def run(self, overrides: Dict[str, Any], seed: Optional[int] = None,
+            steps: Optional[int] = None) -> Dict[str, Any]:
+        """submit() and wait for the result record"""
+        result = self.submit(overrides, seed, steps).result()
+        return {'cached': False, **result}
+
+    def status(self, key: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """('done', result), ('running', None) or ('unknown', None) for a run key"""
+        if not KEY_PATTERN.fullmatch(key):
+            return 'unknown', None
+        with self._lock:
+            if key in self.running:
+                return 'running', None
+        result = self.cache.get(key)
+        return ('done', result) if result is not None else ('unknown', None)
+
+    def _finished(self, key: str, future: Future):
+        with self._lock:
+            del self.running[key]
+            self.prefixes.pop(key, None)
+            keep = frozenset(self.running) | frozenset(self.prefixes.values()) | {key}
+            self.cache.evict(keep)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """JSON API of a SimulationService, set as the server's service attribute.
+
+    POST /runs                 {"overrides": {...}, "seed": 0, "steps": 2000, "wait": true}
+    GET  /runs/<key>           result record, or 202 while running
+    GET  /runs/<key>/metrics   per-step simulation data as CSV
+    GET  /cache                cache size and entry count
+    """
+    def do_POST(self):
+        if self.path.rstrip('/') != '/runs':
+            return self._send_json(404, {'error': f"Unknown path {self.path}"})
+        service = self.server.service
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            arguments = (request.get('overrides', {}), request.get('seed'), request.get('steps'))
+            key = service.key(*arguments)
+            future = service.submit(*arguments)
+        except (KeyError, TypeError, ValueError) as error:
+            return self._send_json(400, {'error': str(error)})
+        if request.get('wait', True):
+            try:
+                result = future.result()
+            except Exception as error:
+                return self._send_json(500, {'error': repr(error)})
+            return self._send_json(200, {'cached': False, **result})
+        if future.done() and future.exception() is None:
+            return self._send_json(200, {'cached': False, **future.result()})
+        return self._send_json(202, {'key': key, 'status': 'running'})
+
+    def do_GET(self):
+        service = self.server.service
+        parts = [part for part in self.path.split('/') if part]
+        if parts == ['cache']:
+            return self._send_json(200, service.cache.stats())
+        if len(parts) in (2, 3) and parts[0] == 'runs' and KEY_PATTERN.fullmatch(parts[1]):
+            status, result = service.status(parts[1])
+            if status == 'running':
+                return self._send_json(202, {'key': parts[1], 'status': status})
+            if status == 'unknown':
+                return self._send_json(404, {'key': parts[1], 'status': status})
+            if len(parts) == 2:
+                return self._send_json(200, {'cached': True, **result})
+            if parts[2] == 'metrics':
+                return self._send_file(service.cache.path(parts[1], METRICS_FILE), 'text/csv')
+        self._send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def _send_json(self, code: int, body: Dict[str, Any]):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_file(self, path: str, content_type: str):
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+        except FileNotFoundError:
+            return self._send_json(404, {'error': 'Evicted'})
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def serve(service: SimulationService, host: str = '127.0.0.1', port: int = 8765):
+    """Serve the JSON API until interrupted"""
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.service = service
+    print(f"Serving simulations on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def parse_setting(text: str) -> Tuple[str, Any]:
+    """Parse KEY=VALUE, reading VALUE as JSON where it parses and as a string otherwise"""
+    key, _, value = text.partition('=')
+    try:
+        return key, json.loads(value)
+    except json.JSONDecodeError:
+        return key, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run config.CONFIG variants through a cached local service")
+    parser.add_argument('--cache-dir', default=SERVICE_CONFIG['cache_dir'])
+    parser.add_argument('--cache-max-bytes', type=int, default=SERVICE_CONFIG['cache_max_bytes'])
+    parser.add_argument('--workers', type=int, default=SERVICE_CONFIG.get('workers'),
+                        help="Worker processes (default: one per core)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help="Run one config variant and print its summary")
+    run_parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                            help="Dotted config path and value, e.g. SIM_CONFIG.fee_rate=0.01")
+    run_parser.add_argument('--seed', type=int)
+    run_parser.add_argument('--steps', type=int)
+    serve_parser = commands.add_parser('serve', help="Serve the JSON API")
+    serve_parser.add_argument('--host', default=SERVICE_CONFIG['host'])
+    serve_parser.add_argument('--port', type=int, default=SERVICE_CONFIG['port'])
+    cache_parser = commands.add_parser('cache', help="Show or clear the cache")
+    cache_parser.add_argument('--clear', action='store_true')
+    args = parser.parse_args()
+
+    cache = ResultCache(args.cache_dir, args.cache_max_bytes)
+    if args.command == 'cache':
+        if args.clear:
+            cache.clear()
+        print(json.dumps(cache.stats()))
+        return
+    with SimulationService(cache, max_workers=args.workers) as service:
+        if args.command == 'serve':
+            serve(service, args.host, args.port)
+            return
+        result = service.run(dict(parse_setting(setting) for setting in args.set), args.seed, args.steps)
+        if result['cached']:
+            source = 'cached'
+        elif result['resumed_from']:
+            source = f"resumed from step {result['resumed_from']} in {result['seconds']:.2f}s"
+        else:
+            source = f"ran in {result['seconds']:.2f}s"
+        print(f"Run {result['key']}: {result['steps']} steps, seed {result['seed']}, {source}")
+        for name, value in result['summary'].items():
+            print(f"{name}: {value:.6g}")
+        print(f"Per-step data: {cache.path(result['key'], METRICS_FILE)}")
+
+
+if __name__ == "__main__":
+    main()
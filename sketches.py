@@ -0,0 +1,186 @@
+import math
+from typing import Dict, Any, List
+import numpy as np
+
+# Balances tracked by DistributionStats, with the quantiles recorded per step
+BALANCES = ('ddt', 'xdai')
+QUANTILES = (0.1, 0.5, 0.9)
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative accuracy, after DDSketch.
+
+    Positive values fall into logarithmic buckets whose bounds grow by a
+    factor of gamma = (1 + a) / (1 - a), so every quantile is returned
+    within relative accuracy a of a value in the data. Values at or below
+    min_value share bucket 0 and are reported as 0; values above max_value
+    fall into the last bucket. Bucket counts are plain weights, so values
+    can be removed as well as added, and two sketches with the same
+    parameters merge by adding their counts. With the defaults the bucket
+    array has about 2,400 entries.
+    """
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-9, max_value: float = 1e12):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative_accuracy must be between 0 and 1, got {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._inverse_log_gamma = 1 / math.log(self.gamma)
+        self._min_key = math.ceil(math.log(min_value) * self._inverse_log_gamma)
+        self.buckets = math.ceil(math.log(max_value) * self._inverse_log_gamma) - self._min_key + 2
+        self.counts = np.zeros(self.buckets)
+        # Value reported for each bucket, the midpoint of its bounds in relative terms
+        keys = np.arange(1, self.buckets) + self._min_key - 1
+        self.values = np.concatenate([[0.0], 2 * self.gamma ** keys / (self.gamma + 1)])
+
+    def key(self, value: float) -> int:
+        """Bucket of one value"""
+        if value <= self.min_value:
+            return 0
+        return min(math.ceil(math.log(value) * self._inverse_log_gamma) - self._min_key + 1, self.buckets - 1)
+
+    def keys(self, values: np.ndarray) -> np.ndarray:
+        """Buckets of an array of values"""
+        values = np.asarray(values, dtype=float)
+        positive = values > self.min_value
+        keys = np.zeros(values.shape, dtype=np.int64)
+        keys[positive] = np.ceil(np.log(values[positive]) * self._inverse_log_gamma) - self._min_key + 1
+        return np.minimum(keys, self.buckets - 1)
+
+    def add(self, values, weights=1.0):
+        self.add_keys(self.keys(np.atleast_1d(values)), weights)
+
+    def remove(self, values, weights=1.0):
+        self.add_keys(self.keys(np.atleast_1d(values)), -np.asarray(weights, dtype=float))
+
+    def add_keys(self, keys: np.ndarray, weights=1.0):
+        """Add weight to buckets; negative weights remove"""
+        weights = np.broadcast_to(np.asarray(weights, dtype=float), np.shape(keys))
+        self.counts += np.bincount(keys, weights=weights, minlength=self.buckets)
+
+    def _check_compatible(self, other: 'QuantileSketch'):
+        if (self.relative_accuracy, self.min_value, self.max_value) != \
+                (other.relative_accuracy, other.min_value, other.max_value):
+            raise ValueError("Only sketches with the same accuracy and range can be merged")
+
+    def merge(self, other: 'QuantileSketch'):
+        """Add other's values to this sketch"""
+        self._check_compatible(other)
+        self.counts += other.counts
+
+    @property
+    def count(self) -> float:
+        return float(self.counts.sum())
+
+    def quantile(self, q):
+        """Value at quantile q (scalar or array), or NaN when the sketch is empty"""
+        cumulative = np.cumsum(self.counts)
+        total = cumulative[-1]
+        if total <= 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else float('nan')
+        ranks = np.asarray(q, dtype=float) * (total - 1)
+        found = self.values[np.minimum(np.searchsorted(cumulative, ranks, side='right'), self.buckets - 1)]
+        return found if np.ndim(q) else float(found)
+
+    def gini(self) -> float:
+        """Gini coefficient of the bucketed values, or NaN when empty or all zero"""
+        weighted = self.counts * self.values
+        total, weighted_total = self.counts.sum(), weighted.sum()
+        if total <= 0 or weighted_total <= 0:
+            return float('nan')
+        # Each bucket's value times the weight below it minus the weight above it
+        below = np.cumsum(self.counts) - self.counts
+        above = total - below - self.counts
+        return float((weighted * (below - above)).sum() / (total * weighted_total))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serialisable form with only the non-empty buckets"""
+        keys = np.flatnonzero(self.counts)
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'min_value': self.min_value,
+            'max_value': self.max_value,
+            'keys': keys.tolist(),
+            'counts': self.counts[keys].tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'QuantileSketch':
+        sketch = cls(data['relative_accuracy'], data['min_value'], data['max_value'])
+        sketch.counts[data['keys']] = data['counts']
+        return sketch
+
+
+class DistributionStats:
+    """Per-type QuantileSketches of agents' dDT and xDAI balances.
+
+    Engines keep the sketches current as balances change, so reading the
+    distribution costs O(types * buckets) per step however many agents
+    there are. The object engine moves an agent between buckets whenever
+    its balance is set. The array engines remember each row's buckets and
+    update only the rows whose bucket changed. Stats from several runs
+    merge into one pooled distribution.
+    """
+    def __init__(self, agent_types: List[str], relative_accuracy: float = 0.01):
+        self.agent_types = list(agent_types)
+        self.sketches = {(balance, agent_type): QuantileSketch(relative_accuracy)
+                         for balance in BALANCES for agent_type in self.agent_types}
+        self._sketch = next(iter(self.sketches.values()))  # For bucket keys; all share parameters
+
+    def columns(self) -> List[str]:
+        """Metric columns, in the order row() returns them"""
+        return [f'{balance}_{agent_type}_{statistic}'
+                for balance in BALANCES for agent_type in self.agent_types
+                for statistic in [f'p{round(q * 100)}' for q in QUANTILES] + ['gini']]
+
+    def row(self) -> List[float]:
+        values = []
+        for balance in BALANCES:
+            for agent_type in self.agent_types:
+                sketch = self.sketches[balance, agent_type]
+                values.extend(sketch.quantile(np.array(QUANTILES)).tolist())
+                values.append(sketch.gini())
+        return values
+
+    def key(self, value: float) -> int:
+        return self._sketch.key(value)
+
+    def keys(self, values: np.ndarray) -> np.ndarray:
+        return self._sketch.keys(values)
+
+    def move(self, balance: str, agent_type: str, old: float, new: float):
+        """One agent's balance changed from old to new"""
+        old_key, new_key = self.key(old), self.key(new)
+        if old_key != new_key:
+            counts = self.sketches[balance, agent_type].counts
+            counts[old_key] -= 1
+            counts[new_key] += 1
+
+    def add(self, balance: str, agent_type: str, value: float, weight: float = 1.0):
+        self.sketches[balance, agent_type].counts[self.key(value)] += weight
+
+    def add_keys(self, balance: str, type_codes: np.ndarray, keys: np.ndarray, weights):
+        """Add weights to buckets, for rows of the given type codes (indices into agent_types)"""
+        weights = np.broadcast_to(np.asarray(weights, dtype=float), np.shape(keys))
+        for code in np.unique(type_codes).tolist():
+            rows = type_codes == code
+            self.sketches[balance, self.agent_types[code]].add_keys(keys[rows], weights[rows])
+
+    def merge(self, other: 'DistributionStats'):
+        for key, sketch in self.sketches.items():
+            sketch.merge(other.sketches[key])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {f'{balance}.{agent_type}': sketch.to_dict()
+                for (balance, agent_type), sketch in self.sketches.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'DistributionStats':
+        agent_types = list(dict.fromkeys(name.split('.', 1)[1] for name in data))
+        first = next(iter(data.values()))
+        stats = cls(agent_types, first['relative_accuracy'])
+        for name, sketch in data.items():
+            balance, agent_type = name.split('.', 1)
+            stats.sketches[balance, agent_type] = QuantileSketch.from_dict(sketch)
+        return stats
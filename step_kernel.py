@@ -0,0 +1,252 @@
+"""Per-step update of the reference scenario as one compiled kernel.
+
+Agents' steps, pie distribution and constant-product swaps run over
+plain arrays in the exact order and arithmetic of the object engine.
+The functions are compiled with Numba when it is installed and stay
+plain Python otherwise; NUMBA_AVAILABLE tells which. The step releases
+the GIL, so shards stepping in threads overlap (see multi_dao).
+"""
+import numpy as np
+from journal import ACTION_CODES
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        return lambda function: function
+
+# Agent type codes, as in vectorized_engine
+DEGEN, ORGANIZATION, POWER, ACTIVE, CASUAL = range(5)
+
+# Slots of the pool state array
+DDT_RESERVE, XDAI_RESERVE, TOTAL_FEES, TOTAL_SHARES, FEE_PER_SHARE, PIE_DDT = range(6)
+POOL_FIELDS = ('ddt_reserve', 'xdai_reserve', 'total_fees', 'total_shares', 'fee_per_share')
+
+# Most journal rows one agent can write in a step
+ROWS_PER_AGENT = 5
+
+PROVIDE_LIQUIDITY = ACTION_CODES['provide_liquidity']
+SELL_DDT = ACTION_CODES['sell_ddt']
+REINVEST_FEES = ACTION_CODES['reinvest_fees']
+BUY_AND_SPEND_DDT = ACTION_CODES['buy_and_spend_ddt']
+BUY_DDT = ACTION_CODES['buy_ddt']
+SPEND_DDT = ACTION_CODES['spend_ddt']
+RECEIVE_PIE_SHARE = ACTION_CODES['receive_pie_share']
+SELL_PIE_SHARE = ACTION_CODES['sell_pie_share']
+SELL_EXCESS_DDT = ACTION_CODES['sell_excess_ddt']
+PIE_RECEIVE_DDT = ACTION_CODES['pie_receive_ddt']
+
+
+@njit(cache=True, inline='always')
+def _log(log, totals, row, agent, action, ddt, xdai, ddt_balance, xdai_balance):
+    totals[0, action] += 1
+    totals[1, action] += ddt
+    totals[2, action] += xdai
+    log_agents, log_actions, log_values = log
+    if row >= len(log_agents):
+        # Aggregates only
+        return row + 1
+    log_agents[row] = agent
+    log_actions[row] = action
+    log_values[0, row] = ddt
+    log_values[1, row] = xdai
+    log_values[2, row] = ddt_balance
+    log_values[3, row] = xdai_balance
+    return row + 1
+
+
+@njit(cache=True, inline='always')
+def _set_xdai(xdai, xdai_sums, code, i, value):
+    # Keep the running per-type sum in step with the balance, as the agents' setter does
+    xdai_sums[code] += value - xdai[i]
+    xdai[i] = value
+
+
+@njit(cache=True, inline='always')
+def _accrue_fee(pool, fee):
+    if pool[TOTAL_SHARES] > 0:
+        pool[TOTAL_FEES] += fee
+        pool[FEE_PER_SHARE] += fee / pool[TOTAL_SHARES]
+    else:
+        pool[XDAI_RESERVE] += fee
+
+
+@njit(cache=True, inline='always')
+def _settle(pool, shares, fee_checkpoints, unclaimed_fees, row):
+    unclaimed_fees[row] += shares[row] * (pool[FEE_PER_SHARE] - fee_checkpoints[row])
+    fee_checkpoints[row] = pool[FEE_PER_SHARE]
+
+
+@njit(cache=True, inline='always')
+def _add_liquidity(pool, shares, fee_checkpoints, unclaimed_fees, row, ddt_amount, xdai_amount):
+    if pool[DDT_RESERVE] == 0:
+        new_shares = ddt_amount
+    else:
+        new_shares = ddt_amount * (pool[TOTAL_SHARES] / pool[DDT_RESERVE])
+    pool[DDT_RESERVE] += ddt_amount
+    pool[XDAI_RESERVE] += xdai_amount
+    _settle(pool, shares, fee_checkpoints, unclaimed_fees, row)
+    shares[row] += new_shares
+    pool[TOTAL_SHARES] += new_shares
+
+
+@njit(cache=True, inline='always')
+def _collect_fees(pool, shares, fee_checkpoints, unclaimed_fees, fees_collected, row):
+    if row < 0:
+        return 0.0
+    _settle(pool, shares, fee_checkpoints, unclaimed_fees, row)
+    fees = unclaimed_fees[row]
+    unclaimed_fees[row] = 0
+    fees_collected[row] += fees
+    pool[TOTAL_FEES] -= fees
+    return fees
+
+
+@njit(cache=True, inline='always')
+def _sell(pool, fee_rate, ddt_amount):
+    if pool[XDAI_RESERVE] == 0 or ddt_amount == 0:
+        return 0.0
+    k = pool[DDT_RESERVE] * pool[XDAI_RESERVE]
+    new_ddt_reserve = pool[DDT_RESERVE] + ddt_amount
+    new_xdai_reserve = k / new_ddt_reserve
+    xdai_out = pool[XDAI_RESERVE] - new_xdai_reserve
+    fee = xdai_out * fee_rate
+    pool[DDT_RESERVE] = new_ddt_reserve
+    pool[XDAI_RESERVE] = new_xdai_reserve
+    _accrue_fee(pool, fee)
+    return xdai_out - fee
+
+
+@njit(cache=True, inline='always')
+def _buy_exact_cost(pool, fee_rate, ddt_amount):
+    """xDAI that buys exactly ddt_amount dDT, or inf if the pool cannot supply it"""
+    if ddt_amount == 0:
+        return 0.0
+    if ddt_amount >= pool[DDT_RESERVE]:
+        return np.inf
+    k = pool[DDT_RESERVE] * pool[XDAI_RESERVE]
+    return (k / (pool[DDT_RESERVE] - ddt_amount) - pool[XDAI_RESERVE]) / (1 - fee_rate)
+
+
+@njit(cache=True, inline='always')
+def _buy_exact(pool, fee_rate, ddt_amount):
+    if ddt_amount == 0:
+        return 0.0
+    k = pool[DDT_RESERVE] * pool[XDAI_RESERVE]
+    new_ddt_reserve = pool[DDT_RESERVE] - ddt_amount
+    new_xdai_reserve = k / new_ddt_reserve
+    xdai_in = (new_xdai_reserve - pool[XDAI_RESERVE]) / (1 - fee_rate)
+    pool[DDT_RESERVE] = new_ddt_reserve
+    pool[XDAI_RESERVE] = new_xdai_reserve
+    _accrue_fee(pool, xdai_in * fee_rate)
+    return xdai_in
+
+
+@njit(cache=True, inline='always')
+def _distribute_pie(ddt, xdai, pool, fee_rate, pie_types, pie_ratios, pie_members, pie_offsets,
+                    log, totals, rows, xdai_sums):
+    total_distribution = pool[PIE_DDT] * 0.7
+    pool[PIE_DDT] -= total_distribution
+    for g in range(len(pie_types)):
+        group_size = pie_offsets[g + 1] - pie_offsets[g]
+        if group_size == 0:
+            continue
+        per_agent_share = total_distribution * pie_ratios[g] / group_size
+        for i in pie_members[pie_offsets[g]:pie_offsets[g + 1]]:
+            if pie_types[g] == POWER:
+                # Power users keep their pie share for service usage
+                ddt[i] += per_agent_share
+                rows = _log(log, totals, rows, i, RECEIVE_PIE_SHARE, per_agent_share, 0.0, ddt[i], xdai[i])
+            else:
+                xdai_received = _sell(pool, fee_rate, per_agent_share)
+                if xdai_received > 0:
+                    _set_xdai(xdai, xdai_sums, pie_types[g], i, xdai[i] + xdai_received)
+                    rows = _log(log, totals, rows, i, SELL_PIE_SHARE,
+                                per_agent_share, xdai_received, ddt[i], xdai[i])
+    return rows
+
+
+@njit(cache=True, nogil=True)
+def step(type_code, ddt, xdai, spend, reinvest_rate, needs_liquidity, sell_threshold, lp_row,
+         pool, fee_rate, max_price, shares, fee_checkpoints, unclaimed_fees, fees_collected,
+         pie_types, pie_ratios, pie_members, pie_offsets, log, totals, xdai_sums):
+    """Step every agent in join order, then distribute the pie.
+
+    Pie group g of pie_types gets ratio pie_ratios[g], shared by the agents
+    pie_members[pie_offsets[g]:pie_offsets[g + 1]].
+
+    pool holds the pool reserves, fee accounting and ThePie's dDT and is
+    updated in place, as are the agent and LP share arrays. Journal rows
+    are added to totals (TransactionJournal.totals) and, if log has room,
+    written to log: agent ids, action codes and a 4-row array of dDT, xDAI,
+    dDT balance and xDAI balance. xdai_sums holds each agent type's total
+    xDAI and is updated as balances change. Returns the number of rows.
+    """
+    rows = 0
+    for i in range(len(type_code)):
+        code = type_code[i]
+        if code == DEGEN:
+            if needs_liquidity[i] and ddt[i] >= 10 and xdai[i] >= 10:
+                _add_liquidity(pool, shares, fee_checkpoints, unclaimed_fees, lp_row[i], 10.0, 10.0)
+                needs_liquidity[i] = False
+                ddt[i] -= 10
+                _set_xdai(xdai, xdai_sums, code, i, xdai[i] - 10)
+                rows = _log(log, totals, rows, i, PROVIDE_LIQUIDITY, 10.0, 10.0, ddt[i], xdai[i])
+                if ddt[i] >= 90:
+                    xdai_received = _sell(pool, fee_rate, 90.0)
+                    ddt[i] -= 90
+                    _set_xdai(xdai, xdai_sums, code, i, xdai[i] + xdai_received)
+                    rows = _log(log, totals, rows, i, SELL_DDT, 90.0, xdai_received, ddt[i], xdai[i])
+
+            fees = _collect_fees(pool, shares, fee_checkpoints, unclaimed_fees, fees_collected, lp_row[i])
+            if fees > 0:
+                reinvest_amount = fees * reinvest_rate[i]
+                if reinvest_amount > 0:
+                    _add_liquidity(pool, shares, fee_checkpoints, unclaimed_fees, lp_row[i],
+                                   reinvest_amount, reinvest_amount)
+                    rows = _log(log, totals, rows, i, REINVEST_FEES,
+                                reinvest_amount, reinvest_amount, ddt[i], xdai[i])
+                _set_xdai(xdai, xdai_sums, code, i, xdai[i] + fees * (1 - reinvest_rate[i]))
+
+        elif code == ORGANIZATION:
+            if xdai[i] >= _buy_exact_cost(pool, fee_rate, spend[i]):
+                xdai_paid = _buy_exact(pool, fee_rate, spend[i])
+                _set_xdai(xdai, xdai_sums, code, i, xdai[i] - xdai_paid)
+                pool[PIE_DDT] += spend[i]
+                rows = _log(log, totals, rows, i, PIE_RECEIVE_DDT, spend[i], 0.0, pool[PIE_DDT], 0.0)
+                rows = _log(log, totals, rows, i, BUY_AND_SPEND_DDT, spend[i], xdai_paid, ddt[i], xdai[i])
+
+        elif code == POWER and ddt[i] < spend[i]:
+            price = 1.0 if pool[DDT_RESERVE] == 0 else pool[XDAI_RESERVE] / pool[DDT_RESERVE]
+            if price <= max_price and xdai[i] >= _buy_exact_cost(pool, fee_rate, spend[i]):
+                xdai_paid = _buy_exact(pool, fee_rate, spend[i])
+                _set_xdai(xdai, xdai_sums, code, i, xdai[i] - xdai_paid)
+                ddt[i] += spend[i]
+                rows = _log(log, totals, rows, i, BUY_DDT, spend[i], xdai_paid, ddt[i], xdai[i])
+                ddt[i] -= spend[i]
+                pool[PIE_DDT] += spend[i]
+                rows = _log(log, totals, rows, i, PIE_RECEIVE_DDT, spend[i], 0.0, pool[PIE_DDT], 0.0)
+                rows = _log(log, totals, rows, i, SPEND_DDT, spend[i], 0.0, ddt[i], xdai[i])
+
+        elif ddt[i] >= spend[i]:
+            # Active, casual and power users spending their own dDT
+            ddt[i] -= spend[i]
+            pool[PIE_DDT] += spend[i]
+            rows = _log(log, totals, rows, i, PIE_RECEIVE_DDT, spend[i], 0.0, pool[PIE_DDT], 0.0)
+            rows = _log(log, totals, rows, i, SPEND_DDT, spend[i], 0.0, ddt[i], xdai[i])
+            excess_ddt = spend[i] * 9
+            if code == CASUAL and ddt[i] >= excess_ddt and ddt[i] >= sell_threshold[i] - spend[i]:
+                xdai_received = _sell(pool, fee_rate, excess_ddt)
+                if xdai_received > 0:
+                    ddt[i] -= excess_ddt
+                    _set_xdai(xdai, xdai_sums, code, i, xdai[i] + xdai_received)
+                    rows = _log(log, totals, rows, i, SELL_EXCESS_DDT,
+                                excess_ddt, xdai_received, ddt[i], xdai[i])
+
+    if pool[PIE_DDT] != 0:
+        rows = _distribute_pie(ddt, xdai, pool, fee_rate, pie_types, pie_ratios, pie_members, pie_offsets,
+                               log, totals, rows, xdai_sums)
+    return rows
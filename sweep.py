@@ -0,0 +1,264 @@
+import argparse
+import asyncio
+import copy
+import functools
+import glob
+import hashlib
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
+from config import CONFIG
+from engines import create_simulation
+from sketches import DistributionStats
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+AGENT_TYPES = ['degen_user', 'organization', 'power_user', 'active_user', 'casual_user']
+
+# Applied before each run's own overrides; summaries don't need journal rows
+SWEEP_DEFAULTS = {
+    'SIM_CONFIG.journal_retention': 'aggregates',
+    'SIM_CONFIG.reporter': 'silent'
+}
+
+
+# SIM_CONFIG settings that have defaults and may be absent from CONFIG
+OPTIONAL_KEYS = {'report_interval', 'report_path', 'report_every'}
+
+
+def apply_overrides(config: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of config with dotted-path overrides applied.
+
+    e.g. {'SIM_CONFIG.fee_rate': 0.01, 'AGENT_CONFIGS.active_user.daily_spend': 2}
+    """
+    config = copy.deepcopy(config)
+    for path, value in overrides.items():
+        *parents, key = path.split('.')
+        target = config
+        for parent in parents:
+            target = target[parent]
+        if key not in target and key not in OPTIONAL_KEYS:
+            raise KeyError(f"Unknown config key: {path}")
+        target[key] = value
+    return config
+
+
+def grid(space: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Every combination of the listed values"""
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+
+
+def random_sample(space: Dict[str, Any], samples: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Draw override sets at random.
+
+    A list value is sampled uniformly from its entries, a (low, high) tuple
+    uniformly from the interval.
+    """
+    rng = random.Random(seed)
+    points = []
+    for _ in range(samples):
+        point = {}
+        for key, values in space.items():
+            if isinstance(values, tuple):
+                point[key] = rng.uniform(*values)
+            else:
+                point[key] = rng.choice(values)
+        points.append(point)
+    return points
+
+
+@functools.lru_cache(maxsize=None)
+def code_version() -> str:
+    """Hash of the simulation's Python sources, so edits invalidate earlier runs"""
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def run_id(overrides: Dict[str, Any], seed: int, steps: int, base_config: Dict[str, Any] = CONFIG) -> str:
+    """Stable id of one run, used to skip completed runs on resume
+
+    Hashes the resolved config rather than just the overrides, and the
+    source code, so after editing config.py or the simulation a resumed
+    sweep reruns its runs instead of mixing old and new results.
+    """
+    config = apply_overrides(base_config, {**SWEEP_DEFAULTS, **overrides})
+    config['SIM_CONFIG']['seed'] = seed
+    key = json.dumps({'config': config, 'steps': steps, 'code': code_version()}, sort_keys=True, default=repr)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def summarize(sim) -> Dict[str, Any]:
+    """Condense a finished run's simulation data into one row"""
+    data = sim.metrics.read_array()
+    final = data[-1]
+    summary = {
+        'final_price': final['price'],
+        'min_price': data['price'].min(),
+        'max_price': data['price'].max(),
+        'mean_price': data['price'].mean(),
+        'final_lp_dDT_reserve': final['lp_dDT_reserve'],
+        'final_lp_xDAI_reserve': final['lp_xDAI_reserve'],
+        'pie_ddt': sim.the_pie.total_ddt
+    }
+    for agent_type in AGENT_TYPES:
+        summary[f'final_active_{agent_type}s'] = final[f'active_{agent_type}s']
+        summary[f'final_xdai_{agent_type}'] = final[f'xdai_{agent_type}']
+    if sim.stats is not None:
+        for column in sim.stats.columns():
+            summary[f'final_{column}'] = final[column]
+    return {key: float(value) for key, value in summary.items()}
+
+
+def run_one(overrides: Dict[str, Any], seed: int, steps: int, base_config: Dict[str, Any],
+            metrics_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Run a single simulation; executed inside a worker process.
+
+    Returns the run's fields of its results record: its summary, plus its
+    final balance sketches when distribution_stats is on. With metrics_dir
+    the run's per-step metrics are kept as <metrics_dir>/<run_id>.csv for
+    report.py.
+    """
+    config = apply_overrides(base_config, {**SWEEP_DEFAULTS, **overrides})
+    config['SIM_CONFIG']['seed'] = seed
+    if metrics_dir:
+        config['SIM_CONFIG']['metrics_path'] = os.path.join(metrics_dir, f"{run_id(overrides, seed, steps, base_config)}.csv")
+    sim = create_simulation(config)
+    asyncio.run(sim.simulate(steps))
+    fields = {'summary': summarize(sim)}
+    if sim.stats is not None:
+        fields['distributions'] = sim.stats.to_dict()
+    return fields
+
+
+def load_results(path: str) -> 'pd.DataFrame':
+    """Load a sweep results file into one table, one row per run"""
+    import pandas as pd
+    rows = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    rows.append({'run_id': record['run_id'], 'seed': record['seed'],
+                                 **record['overrides'], **record['summary']})
+    return pd.DataFrame(rows)
+
+
+def merge_distributions(path: str, run_ids: Optional[List[str]] = None) -> Optional[DistributionStats]:
+    """Pool the final balance distributions of a sweep's runs (all, or run_ids).
+
+    Only runs made with distribution_stats on carry sketches; returns None
+    when none of the selected runs do.
+    """
+    merged = None
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if 'distributions' not in record or (run_ids is not None and record['run_id'] not in run_ids):
+                    continue
+                stats = DistributionStats.from_dict(record['distributions'])
+                if merged is None:
+                    merged = stats
+                else:
+                    merged.merge(stats)
+    return merged
+
+
+def completed_runs(path: str) -> set:
+    """run_ids already recorded in a results file"""
+    done = set()
+    if os.path.exists(path):
+        with open(path) as f:
+            done = {json.loads(line)['run_id'] for line in f if line.strip()}
+    return done
+
+
+def run_sweep(points: List[Dict[str, Any]], seeds: List[int], steps: int, results_path: str,
+              base_config: Dict[str, Any] = CONFIG, max_workers: Optional[int] = None,
+              metrics_dir: Optional[str] = None) -> 'pd.DataFrame':
+    """Fan (overrides, seed) runs out over a process pool.
+
+    Each finished run is appended to results_path as one JSON line. Runs
+    already present in the file are skipped, so an interrupted sweep resumes
+    where it stopped.
+    """
+    done = completed_runs(results_path)
+    pending = [
+        (overrides, seed) for overrides in points for seed in seeds
+        if run_id(overrides, seed, steps, base_config) not in done
+    ]
+    print(f"Sweep: {len(points) * len(seeds)} runs, {len(pending)} pending")
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool, \
+            open(results_path, 'a') as results:
+        futures = {
+            pool.submit(run_one, overrides, seed, steps, base_config, metrics_dir): (overrides, seed)
+            for overrides, seed in pending
+        }
+        for completed, future in enumerate(as_completed(futures), 1):
+            overrides, seed = futures[future]
+            record = {
+                'run_id': run_id(overrides, seed, steps, base_config),
+                'seed': seed,
+                'steps': steps,
+                'overrides': overrides,
+                **future.result()
+            }
+            results.write(json.dumps(record) + '\n')
+            results.flush()
+            print(f"Completed {completed}/{len(pending)}: {overrides} seed={seed}")
+
+    return load_results(results_path)
+
+
+def parse_param(text: str):
+    """Parse KEY=v1,v2,... (grid values) or KEY=low:high (sampling range)"""
+    key, _, values = text.partition('=')
+    if ':' in values and ',' not in values:
+        low, high = values.split(':')
+        return key, (float(low), float(high))
+    return key, [json.loads(value) for value in values.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo parameter sweep over config.CONFIG")
+    parser.add_argument('--param', action='append', default=[], metavar='KEY=VALUES',
+                        help="Dotted config path with comma-separated values or a low:high range, "
+                             "e.g. SIM_CONFIG.fee_rate=0.001,0.003")
+    parser.add_argument('--samples', type=int, help="Draw this many random points instead of the full grid")
+    parser.add_argument('--seeds', type=int, default=1, help="Number of seeds per point")
+    parser.add_argument('--steps', type=int, default=CONFIG['SIM_CONFIG']['total_steps'])
+    parser.add_argument('--workers', type=int, help="Worker processes (default: one per core)")
+    parser.add_argument('--out', default='sweep_results.jsonl', help="Results file; reused to resume")
+    parser.add_argument('--metrics-dir', help="Keep each run's per-step metrics here for report.py")
+    args = parser.parse_args()
+
+    space = dict(parse_param(param) for param in args.param)
+    if args.samples:
+        points = random_sample(space, args.samples)
+    else:
+        if any(isinstance(values, tuple) for values in space.values()):
+            parser.error("low:high ranges need --samples")
+        points = grid(space)
+
+    results = run_sweep(points, list(range(args.seeds)), args.steps, args.out, max_workers=args.workers,
+                        metrics_dir=args.metrics_dir)
+    print(results.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,555 @@
+import asyncio
+from typing import Dict, Any, List, Tuple
+import numpy as np
+from autogen_agents import DataDAOGroupChat, PowerUserAgent
+from batch_auction import BatchAuction
+from progress import SilentReporter
+from sketches import BALANCES
+
+# Type codes used in the agent arrays
+AGENT_TYPES = ['degen_user', 'organization', 'power_user', 'active_user', 'casual_user']
+DEGEN, ORGANIZATION, POWER, ACTIVE, CASUAL = range(len(AGENT_TYPES))
+TYPE_CODES = {agent_type: code for code, agent_type in enumerate(AGENT_TYPES)}
+
+
+class VectorizedDataDAOGroupChat(DataDAOGroupChat):
+    """Struct-of-arrays version of DataDAOGroupChat.
+
+    Agent balances, spend rates and type codes live in NumPy arrays and each
+    agent type is stepped as one batched operation. Actions that touch the
+    LiquidityPool are replayed in join order, so the price path matches the
+    object engine, which stays the reference implementation.
+
+    With step_mode='batch_auction' nothing trades in join order: every
+    swap of the step, pie share sales included, is queued in a
+    BatchAuction and cleared with one pool swap at a uniform price.
+    """
+    # Per-row arrays, grown together
+    ARRAYS = ('agent_id', 'type_code', 'joined', 'ddt', 'xdai', 'spend', 'reinvest_rate', 'needs_liquidity',
+              'sell_threshold', 'ddt_key', 'xdai_key')
+    STEP_MODES = ('sequential', 'batch_auction')
+    FAST_FORWARD = True
+    # Pool-trading handlers timed per agent type by detailed profiling; bulk spending is only in 'agents'
+    PROFILED_METHODS = {
+        '_step_degen': 'degen_user',
+        '_step_organizations': 'organization',
+        '_step_power_buyer': 'power_user',
+        '_step_casual_seller': 'casual_user'
+    }
+
+    def __init__(self, config: Dict[str, Any]):
+        self.size = 0
+        self.names = []
+        self.agent_id = np.zeros(0, dtype=np.int64)  # Journal id of each row
+        self.type_code = np.zeros(0, dtype=np.int8)
+        self.joined = np.zeros(0, dtype=np.int64)  # Step each row entered at
+        self.ddt = np.zeros(0)
+        self.xdai = np.zeros(0)
+        self.spend = np.zeros(0)  # daily_spend, or daily_ddt_buy for organizations
+        self.reinvest_rate = np.zeros(0)
+        self.needs_liquidity = np.zeros(0, dtype=bool)  # Degens that have not provided liquidity yet
+        self.sell_threshold = np.zeros(0)  # Casual users' dDT before spending that triggers a sale
+        # Sketch bucket each row's balances were counted in, -1 if not yet
+        self.ddt_key = np.zeros(0, dtype=np.int64)
+        self.xdai_key = np.zeros(0, dtype=np.int64)
+        self.type_members = {agent_type: np.zeros(0, dtype=np.int64) for agent_type in AGENT_TYPES}
+        super().__init__(config)
+        self.auction = BatchAuction() if self.step_mode == 'batch_auction' else None
+
+    def _members(self, ids: np.ndarray) -> np.ndarray:
+        """Agents each row stands for"""
+        return np.ones(len(ids))
+
+    def _grow(self, needed: int):
+        capacity = len(self.ddt)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, 2 * capacity, 64)
+        for attr in self.ARRAYS:
+            old = getattr(self, attr)
+            new = np.zeros(new_capacity, dtype=old.dtype)
+            new[:capacity] = old
+            setattr(self, attr, new)
+
+    def _add_agents(self, agent_type: str, count: int):
+        """Add specified number of agents of given type"""
+        if count <= 0:
+            return
+
+        config = self.config['AGENT_CONFIGS'][agent_type]
+        code = TYPE_CODES[agent_type]
+        start, end = self.size, self.size + count
+        self._grow(end)
+
+        # Mirror the starting balances the agent classes set up
+        initial_ddt = config['initial_ddt'] if code != ORGANIZATION else 0
+        initial_xdai = config['initial_xdai'] if code in (DEGEN, ORGANIZATION, POWER) else 0
+        spend_key = 'daily_ddt_buy' if code == ORGANIZATION else 'daily_spend'
+        parameters = self._draw_parameters(agent_type, count)
+        self.type_code[start:end] = code
+        self.joined[start:end] = self.current_step
+        self.ddt[start:end] = initial_ddt
+        self.xdai[start:end] = initial_xdai
+        self.spend[start:end] = parameters.get(spend_key, config.get(spend_key, 0))
+        self.reinvest_rate[start:end] = config.get('reinvest_rate', 0)
+        self.needs_liquidity[start:end] = code == DEGEN
+        self.sell_threshold[start:end] = parameters.get('sell_threshold', config.get('sell_threshold', 0))
+        self.ddt_key[start:end] = -1
+        self.xdai_key[start:end] = -1
+
+        for i in range(start, end):
+            name = f"{agent_type}_{self.total_agents[agent_type]}"
+            self.names.append(name)
+            self.agent_id[i] = self.journal.register_name(name)
+            self.total_agents[agent_type] += 1
+        self.type_members[agent_type] = np.concatenate(
+            [self.type_members[agent_type], np.arange(start, end)])
+        self.size = end
+
+    async def _step_agents(self):
+        """Step every agent type as one batched operation"""
+        n = self.size
+        types = self.type_code[:n]
+        ddt = self.ddt[:n]
+        spend = self.spend[:n]
+
+        # Spending own dDT only touches the agent and ThePie, so it can be
+        # applied to every active, power and casual user at once.
+        spenders = ((types == ACTIVE) | (types == POWER) | (types == CASUAL)) & (ddt >= spend)
+        spender_ids = np.flatnonzero(spenders)
+        ddt[spender_ids] -= spend[spender_ids]
+        spent = spend[spender_ids] * self._members(spender_ids)
+        pie_before = self.the_pie.total_ddt
+        self.the_pie.total_ddt += spent.sum()
+
+        self._record_many(spender_ids, 'pie_receive_ddt', spent, 0,
+                          pie_before + np.cumsum(spent), 0)
+        self._record_many(spender_ids, 'spend_ddt', spent, 0,
+                          ddt[spender_ids], self.xdai[spender_ids])
+
+        # Everything that trades against the pool is replayed in join order
+        casual_sellers = (spenders & (types == CASUAL) & (ddt >= spend * 9)
+                          & (ddt >= self.sell_threshold[:n] - spend))
+        power_buyers = (types == POWER) & ~spenders
+        if self.auction is not None:
+            self._submit_orders(np.flatnonzero(power_buyers), np.flatnonzero(casual_sellers))
+            return
+        traders = (types == DEGEN) | (types == ORGANIZATION) | power_buyers | casual_sellers
+        trader_ids = np.flatnonzero(traders)
+        codes = types[trader_ids].tolist()
+        trader_ids = trader_ids.tolist()
+        self._snapshot_rows()
+        k = 0
+        while k < len(trader_ids):
+            i, code = trader_ids[k], codes[k]
+            if code == ORGANIZATION:
+                # Consecutive organizations fill their orders in one pass
+                end = k + 1
+                while end < len(trader_ids) and codes[end] == ORGANIZATION:
+                    end += 1
+                self._step_organizations(trader_ids[k:end])
+                k = end
+                continue
+            if code == DEGEN:
+                self._step_degen(i)
+            elif code == POWER:
+                self._step_power_buyer(i)
+            else:
+                self._step_casual_seller(i)
+            k += 1
+        self._write_rows()
+
+    def _snapshot_rows(self):
+        """Copy the columns trades use into lists for a one-agent-at-a-time replay
+
+        Indexing a NumPy array one element at a time costs more than the
+        trade itself, so handlers work on these lists of Python numbers
+        and _write_rows puts the balances back in bulk.
+        """
+        n = self.size
+        self.id_rows = self.agent_id[:n].tolist()
+        self.ddt_rows = self.ddt[:n].tolist()
+        self.xdai_rows = self.xdai[:n].tolist()
+        self.spend_rows = self.spend[:n].tolist()
+        self.reinvest_rows = self.reinvest_rate[:n].tolist()
+        self.needs_rows = self.needs_liquidity[:n].tolist()
+        self.member_rows = self._members(np.arange(n)).tolist()
+
+    def _write_rows(self):
+        n = self.size
+        self.ddt[:n] = self.ddt_rows
+        self.xdai[:n] = self.xdai_rows
+        self.needs_liquidity[:n] = self.needs_rows
+
+    def _step_degen(self, i: int):
+        pool = self.liquidity_pool
+        ddt, xdai = self.ddt_rows, self.xdai_rows
+        if self.needs_rows[i] and ddt[i] >= 10 and xdai[i] >= 10:
+            self.needs_rows[i] = False
+            pool.add_liquidity(10, 10, self.names[i])
+            ddt[i] -= 10
+            xdai[i] -= 10
+            self._record(i, 'provide_liquidity', 10, 10)
+            if ddt[i] >= 90:
+                xdai_received = pool.sell_ddt(90)
+                ddt[i] -= 90
+                xdai[i] += xdai_received
+                self._record(i, 'sell_ddt', 90, xdai_received)
+        self._collect_fees(i)
+
+    def _collect_fees(self, i: int):
+        name = self.names[i]
+        fees = float(self.liquidity_pool.collect_fees(name))
+        if fees > 0:
+            reinvest_amount = fees * self.reinvest_rows[i]
+            if reinvest_amount > 0:
+                self.liquidity_pool.add_liquidity(reinvest_amount, reinvest_amount, name)
+                self._record(i, 'reinvest_fees', reinvest_amount, reinvest_amount)
+            self.xdai_rows[i] += fees * (1 - self.reinvest_rows[i]) / self.member_rows[i]
+
+    def _step_organizations(self, ids: List[int]):
+        """Organizations stepping back to back, as one aggregated order when all can pay"""
+        pool = self.liquidity_pool
+        ddt, xdai = self.ddt_rows, self.xdai_rows
+        if len(ids) > 1:
+            amounts = np.array([self.spend_rows[i] for i in ids])
+            filled = np.cumsum(amounts)
+            quotes = pool.quote_many(filled, 'buy_exact')
+            costs = np.diff(quotes, prepend=0).tolist()
+            if np.isfinite(quotes[-1]) and all(xdai[i] >= cost for i, cost in zip(ids, costs)):
+                costs = pool.buy_exact_ddt_many(amounts)
+                for i, cost in zip(ids, costs.tolist()):
+                    xdai[i] -= cost
+                pie_before = self.the_pie.total_ddt
+                self.the_pie.total_ddt += filled[-1]
+                self._record_many(ids, 'pie_receive_ddt', amounts, 0, pie_before + filled, 0)
+                self._record_many(ids, 'buy_and_spend_ddt', amounts, costs,
+                                  [ddt[i] for i in ids], [xdai[i] for i in ids])
+                return
+        for i in ids:
+            self._step_organization(i)
+
+    def _step_organization(self, i: int):
+        spend = self.spend_rows[i]
+        xdai_needed = self.liquidity_pool.quote(spend, 'buy_exact')
+        if self.xdai_rows[i] >= xdai_needed:
+            xdai_paid = self.liquidity_pool.buy_exact_ddt(spend)
+            self.xdai_rows[i] -= xdai_paid
+            self._pie_receive(i, spend)
+            self._record(i, 'buy_and_spend_ddt', spend, xdai_paid)
+
+    def _step_power_buyer(self, i: int):
+        current_price = self.liquidity_pool.get_price()
+        if current_price <= PowerUserAgent.max_price:
+            ddt, xdai, spend = self.ddt_rows, self.xdai_rows, self.spend_rows[i]
+            xdai_needed = self.liquidity_pool.quote(spend, 'buy_exact')
+            if xdai[i] >= xdai_needed:
+                xdai_paid = self.liquidity_pool.buy_exact_ddt(spend)
+                xdai[i] -= xdai_paid
+                ddt[i] += spend
+                self._record(i, 'buy_ddt', spend, xdai_paid)
+                ddt[i] -= spend
+                self._pie_receive(i, spend)
+                self._record(i, 'spend_ddt', spend, 0)
+
+    def _step_casual_seller(self, i: int):
+        excess_ddt = self.spend_rows[i] * 9
+        xdai_received = self.liquidity_pool.sell_ddt(excess_ddt)
+        if xdai_received > 0:
+            self.ddt_rows[i] -= excess_ddt
+            self.xdai_rows[i] += xdai_received
+            self._record(i, 'sell_excess_ddt', excess_ddt, xdai_received)
+
+    def _submit_orders(self, power_buyers: np.ndarray, casual_sellers: np.ndarray):
+        """Queue this step's swaps in the batch auction.
+
+        Liquidity is provided and fees collected right away, as neither
+        swaps. Sellers hand over their dDT when they submit. Buyers submit
+        only if they can pay the price of the whole buy side filling
+        against the pool, which bounds the clearing price from above.
+        """
+        pool = self.liquidity_pool
+        types = self.type_code[:self.size]
+        degens = np.flatnonzero(types == DEGEN)
+        providers = degens[self.needs_liquidity[degens] & (self.ddt[degens] >= 10) & (self.xdai[degens] >= 10)]
+        members = self._members(providers)
+        for i, provided in zip(providers, 10 * members):
+            pool.add_liquidity(provided, provided, self.names[i])
+        self.needs_liquidity[providers] = False
+        self.ddt[providers] -= 10
+        self.xdai[providers] -= 10
+        self._record_many(providers, 'provide_liquidity', 10 * members, 10 * members,
+                          self.ddt[providers], self.xdai[providers])
+        first_sellers = providers[self.ddt[providers] >= 90]
+        self.ddt[first_sellers] -= 90
+        self.auction.sell('sell_ddt', first_sellers, 90 * self._members(first_sellers))
+        self._snapshot_rows()
+        for i in degens.tolist():
+            self._collect_fees(i)
+        self._write_rows()
+
+        self.ddt[casual_sellers] -= self.spend[casual_sellers] * 9
+        self.auction.sell('sell_excess_ddt', casual_sellers,
+                          self.spend[casual_sellers] * 9 * self._members(casual_sellers))
+
+        organizations = np.flatnonzero(types == ORGANIZATION)
+        if pool.get_price() > PowerUserAgent.max_price:
+            power_buyers = power_buyers[:0]
+        wanted = (self.spend[organizations] * self._members(organizations)).sum() \
+            + (self.spend[power_buyers] * self._members(power_buyers)).sum()
+        if wanted == 0:
+            return
+        worst_price = pool.quote(wanted, 'buy_exact') / wanted
+        for action, buyers in (('buy_and_spend_ddt', organizations), ('buy_ddt', power_buyers)):
+            buyers = buyers[self.xdai[buyers] >= self.spend[buyers] * worst_price]
+            amounts = self.spend[buyers] * self._members(buyers)
+            pie_before = self.the_pie.total_ddt
+            self.the_pie.total_ddt += amounts.sum()
+            self._record_many(buyers, 'pie_receive_ddt', amounts, 0,
+                              pie_before + np.cumsum(amounts), 0)
+            if action == 'buy_ddt':
+                # Power users spend what they buy straight away
+                self._record_many(buyers, 'spend_ddt', amounts, 0,
+                                  self.ddt[buyers], self.xdai[buyers])
+            self.auction.buy(action, buyers, amounts)
+
+    def _clear_auction(self):
+        """Clear the batch auction and settle every order at its price"""
+        price, buys, sells = self.auction.clear(self.liquidity_pool)
+        for action, ids, amounts in buys:
+            self.xdai[ids] -= amounts * price / self._members(ids)
+            self._record_many(ids, action, amounts, amounts * price, self.ddt[ids], self.xdai[ids])
+        for action, ids, amounts in sells:
+            if price == 0:
+                # Nothing filled; sellers keep their dDT
+                self.ddt[ids] += amounts / self._members(ids)
+                continue
+            self.xdai[ids] += amounts * price / self._members(ids)
+            self._record_many(ids, action, amounts, amounts * price, self.ddt[ids], self.xdai[ids])
+
+    def _record(self, i: int, action: str, ddt: float, xdai: float):
+        """Journal a trade made during a replay, with the balances on its lists"""
+        self.journal.record(self.id_rows[i], action, float(ddt), float(xdai),
+                            self.ddt_rows[i], self.xdai_rows[i])
+
+    def _record_many(self, ids: np.ndarray, action: str, ddt, xdai, ddt_balance, xdai_balance):
+        self.journal.record_many(self.agent_id[ids], action, ddt, xdai, ddt_balance, xdai_balance)
+
+    def _pie_receive(self, i: int, amount: float):
+        self.the_pie.total_ddt += amount
+        self.journal.record(self.id_rows[i], 'pie_receive_ddt', float(amount), 0,
+                            float(self.the_pie.total_ddt), 0)
+
+    def _distribute_rewards(self):
+        self._share_pie()
+        if self.auction is not None:
+            self._clear_auction()
+
+    def _share_pie(self):
+        pie = self.the_pie
+        if pie.total_ddt == 0:
+            return
+
+        total_distribution = pie.total_ddt * 0.7
+        pie.total_ddt -= total_distribution
+
+        for agent_type, ratio in pie.distribution_ratios.items():
+            members = self.type_members[agent_type]
+            if not len(members):
+                continue
+            per_agent_share = total_distribution * ratio / len(members)
+            if agent_type == 'power_user':
+                # Power users keep their pie share for service usage
+                self.ddt[members] += per_agent_share
+                self._record_many(members, 'receive_pie_share', per_agent_share, 0,
+                                  self.ddt[members], self.xdai[members])
+            elif self.auction is not None:
+                self.auction.sell('sell_pie_share', members, per_agent_share)
+            elif pie.settlement == 'batched':
+                proceeds = self.liquidity_pool.sell_ddt_many(per_agent_share, len(members))
+                sold = proceeds > 0
+                sellers = members[sold]
+                self.xdai[sellers] += proceeds[sold]
+                self._record_many(sellers, 'sell_pie_share', per_agent_share, proceeds[sold],
+                                  self.ddt[sellers], self.xdai[sellers])
+            else:
+                # Active and casual users sell their share immediately; each
+                # sale only changes the seller's balance, written back in bulk
+                proceeds = np.array([self.liquidity_pool.sell_ddt(per_agent_share) for _ in range(len(members))])
+                sold = proceeds > 0
+                sellers = members[sold]
+                self.xdai[sellers] += proceeds[sold]
+                self._record_many(sellers, 'sell_pie_share', per_agent_share, proceeds[sold],
+                                  self.ddt[sellers], self.xdai[sellers])
+
+    def _retire_agents(self):
+        self._remove(self._leaving())
+
+    def _remove(self, leaving: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Record and remove leaving members per row and compact the arrays
+
+        Returns the leaving members' dDT and xDAI balances, one entry per member.
+        """
+        rows = np.flatnonzero(leaving)
+        if not len(rows):
+            return np.zeros(0), np.zeros(0)
+        balances = np.repeat(self.ddt[rows], leaving[rows]), np.repeat(self.xdai[rows], leaving[rows])
+        self.exits.record_many({
+            'step': self.current_step,
+            'agent': self.agent_id[rows],
+            'members': leaving[rows],
+            'ddt': self.ddt[rows],
+            'xdai': self.xdai[rows]
+        })
+        if self.stats is not None:
+            # Take the members out of the buckets they were last counted in
+            counted = rows[self.ddt_key[rows] >= 0]
+            for balance in BALANCES:
+                self.stats.add_keys(balance, self.type_code[counted], getattr(self, f'{balance}_key')[counted],
+                                    -leaving[counted])
+        exited = np.bincount(self.type_code[rows], weights=leaving[rows], minlength=len(AGENT_TYPES))
+        for agent_type in AGENT_TYPES:
+            self.exited[agent_type] += int(exited[TYPE_CODES[agent_type]])
+        self._compact(rows[self._remove_members(rows, leaving[rows]) == 0])
+        return balances
+
+    def _leaving(self) -> np.ndarray:
+        """Members of each row leaving at the end of this step
+
+        Mirrors the object engine: active and casual users that can no
+        longer spend exit, and with churn_rate every other agent churns on
+        its own draw from the 'churn' stream, taken in join order.
+        """
+        n = self.size
+        types = self.type_code[:n]
+        members = self._members(np.arange(n))
+        leaving = np.zeros(n, dtype=np.int64)
+        if self.exit_rule == 'exhausted':
+            exhausted = ((types == ACTIVE) | (types == CASUAL)) & (self.ddt[:n] < self.spend[:n])
+            leaving[exhausted] = members[exhausted]
+        if self.churn_rate:
+            churned = self._churn(members)
+            churned[types == DEGEN] = 0
+            leaving = np.maximum(leaving, churned)
+        return leaving
+
+    def _churn(self, members: np.ndarray) -> np.ndarray:
+        """Members of each row that churn this step"""
+        draws = self.random.generator('churn', self.current_step).random(len(members))
+        return (draws < self.churn_rate).astype(np.int64)
+
+    def emigrate(self, agent_type: str, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        rows = self.type_members[agent_type]
+        members = self._members(rows).astype(np.int64)
+        count = min(count, int(members.sum()))
+        leaving = np.zeros(self.size, dtype=np.int64)
+        if count:
+            leaving[rows] = self._pick_members(members, count, self._migration_draws(agent_type))
+        return self._remove(leaving)
+
+    def _pick_members(self, members: np.ndarray, count: int, draws: np.random.Generator) -> np.ndarray:
+        """Spread count randomly chosen members over rows of the given sizes"""
+        picked = np.zeros(len(members), dtype=np.int64)
+        picked[draws.choice(len(members), count, replace=False)] = 1
+        return picked
+
+    def immigrate(self, agent_type: str, ddt: np.ndarray, xdai: np.ndarray):
+        start = self.size
+        self._add_agents(agent_type, len(ddt))
+        self.ddt[start:self.size] = ddt
+        self.xdai[start:self.size] = xdai
+
+    def _remove_members(self, rows: np.ndarray, leaving: np.ndarray) -> np.ndarray:
+        """Take leaving members out of rows; returns the members left in each"""
+        return self._members(rows) - leaving
+
+    def _compact(self, dropped: np.ndarray):
+        """Drop rows, keeping the rest in join order"""
+        keep = np.setdiff1d(np.arange(self.size), dropped)
+        for attr in self.ARRAYS:
+            array = getattr(self, attr)
+            array[:len(keep)] = array[keep]
+        self.names = [self.names[i] for i in keep.tolist()]
+        self.size = len(keep)
+        types = self.type_code[:self.size]
+        for agent_type in AGENT_TYPES:
+            self.type_members[agent_type] = np.flatnonzero(types == TYPE_CODES[agent_type])
+
+    def _refresh_stats(self):
+        """Move the rows whose balance changed bucket since the last refresh"""
+        n = self.size
+        types = self.type_code[:n]
+        weights = self._members(np.arange(n))
+        for balance in BALANCES:
+            counted = getattr(self, f'{balance}_key')[:n]
+            keys = self.stats.keys(getattr(self, balance)[:n])
+            changed = np.flatnonzero(keys != counted)
+            moved = changed[counted[changed] >= 0]
+            self.stats.add_keys(balance, types[moved], counted[moved], -weights[moved])
+            self.stats.add_keys(balance, types[changed], keys[changed], weights[changed])
+            counted[changed] = keys[changed]
+
+    def _provider_rows(self, register: bool = False) -> np.ndarray:
+        """Each row's row in the pool's LP share table, -1 if none
+
+        With register, degens that have provided liquidity but have no row
+        yet, as after a fast-forward jump, are given one.
+        """
+        pool = self.liquidity_pool
+        lp_rows = np.full(self.size, -1, dtype=np.int64)
+        degens = np.flatnonzero(self.type_code[:self.size] == DEGEN)
+        if register:
+            for i in degens[~self.needs_liquidity[degens]].tolist():
+                pool.provider_row(self.names[i])
+        lp_rows[degens] = [pool.provider_rows.get(self.names[i], -1) for i in degens.tolist()]
+        return lp_rows
+
+    def _after_jump(self):
+        """Rebuild anything derived from the arrays after a fast-forward jump set them"""
+
+    def _record_agent_metrics(self, step: int):
+        self.agent_metrics.record_many({
+            'step': step,
+            'agent': self.agent_id[:self.size],
+            'ddt': self.ddt[:self.size],
+            'xdai': self.xdai[:self.size]
+        })
+
+    def _average_xdai_by_type(self) -> Dict[str, float]:
+        types = self.type_code[:self.size]
+        counts = np.bincount(types, minlength=len(AGENT_TYPES))
+        sums = np.bincount(types, weights=self.xdai[:self.size], minlength=len(AGENT_TYPES))
+        return {
+            agent_type: float(sums[TYPE_CODES[agent_type]] / counts[TYPE_CODES[agent_type]])
+            if counts[TYPE_CODES[agent_type]] else 0
+            for agent_type in self.total_agents.keys()
+        }
+
+
+def compare_engines(config: Dict[str, Any], steps: int,
+                    engine: type = VectorizedDataDAOGroupChat) -> Dict[str, float]:
+    """Run the object engine and another engine side by side.
+
+    Returns the largest relative difference per simulation data column.
+    """
+    results = []
+    for engine in (DataDAOGroupChat, engine):
+        sim = engine(config)
+        asyncio.run(sim.simulate(steps, reporter=SilentReporter()))
+        results.append(sim.get_simulation_data())
+
+    reference, candidate = results
+    scale = np.maximum(reference.abs().to_numpy(), 1e-12)
+    diffs = np.abs(reference.to_numpy() - candidate.to_numpy()) / scale
+    return dict(zip(reference.columns, diffs.max(axis=0)))
+
+
+if __name__ == "__main__":
+    from config import CONFIG
+
+    steps = 300
+    diffs = compare_engines(CONFIG, steps)
+    for column, diff in diffs.items():
+        print(f"{column}: max relative difference {diff:.2e}")
+    worst = max(diffs.values())
+    print(f"Parity over {steps} steps: {'OK' if worst < 1e-9 else 'FAILED'} ({worst:.2e})")